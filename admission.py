@@ -0,0 +1,340 @@
+# backend/admission.py
+"""
+Admission control for the API: token-bucket rate limits and per-route
+concurrency caps, both shared by every uvicorn worker on the host.
+
+TokenBuckets   one bucket per client IP and per customer_id, kept in a small
+               SQLite file (ADMISSION_DB). Every check is one BEGIN IMMEDIATE
+               transaction, so all workers draw from the same buckets.
+RouteGate      N concurrency slots per route group, as flock()ed slot files
+               in ADMISSION_DIR. A request that finds every slot busy takes a
+               wait ticket (also a flocked file, so the wait queue is bounded
+               across workers too) and polls for a slot until max_wait. Locks
+               die with their process, so a crashed worker never leaks a slot.
+Admission      the checks run by AdmissionMiddleware (pure ASGI): 429 +
+               Retry-After when a bucket is empty, 503 + Retry-After when a
+               route's slots and wait queue are full. The slot is held until
+               the response (including a stream) ends.
+
+Without fcntl (Windows) slots are only enforced per process.
+"""
+import os
+import json
+import math
+import time
+import random
+import sqlite3
+import asyncio
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+class TokenBuckets:
+    def __init__(self, db_path: str, busy_timeout: float = 0.05, purge_every: float = 60.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._last_purge = 0.0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        # full_at: when the bucket is back at burst; rows past it are the same as no row
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+            " ts REAL NOT NULL, full_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, checks: list) -> tuple:
+        """
+        checks = [(key, rate_per_sec, burst), ...]. Takes one token from every bucket
+        if all of them have one. Returns (None, 0.0) when admitted, else
+        (key of the emptiest bucket, seconds until it has a token).
+        A busy database admits the request rather than stalling the event loop.
+        """
+        if not checks:
+            return None, 0.0
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return None, 0.0
+        try:
+            keys = [c[0] for c in checks]
+            rows = conn.execute(
+                f"SELECT key, tokens, ts FROM buckets WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).fetchall()
+            state = {k: (t, ts) for k, t, ts in rows}
+            updates, worst = [], (None, 0.0)
+            for key, rate, burst in checks:
+                tokens, ts = state.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - ts) * rate)
+                if tokens < 1.0:
+                    wait = (1.0 - tokens) / rate
+                    if wait > worst[1]:
+                        worst = (key, wait)
+                    continue
+                tokens -= 1.0
+                updates.append((key, tokens, now, now + (burst - tokens) / rate))
+            if worst[0] is None:
+                conn.executemany(
+                    "INSERT INTO buckets (key, tokens, ts, full_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, ts = excluded.ts,"
+                    " full_at = excluded.full_at",
+                    updates,
+                )
+            if now - self._last_purge > self.purge_every:
+                self._last_purge = now
+                conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            conn.execute("COMMIT")
+            return worst
+        except sqlite3.OperationalError:
+            conn.execute("ROLLBACK")
+            return None, 0.0
+
+
+class RouteGate:
+    def __init__(self, name: str, slots: int, queue: int, max_wait: float, lock_dir: str):
+        self.name = name
+        self.slots = slots
+        self.queue = queue
+        self.max_wait = max_wait
+        self.lock_dir = lock_dir
+        self._fds = {}   # (kind, index) -> fd, opened lazily in each worker process
+        self._held = set()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    def _try(self, kind: str, n: int):
+        """Index of a free slot / ticket of this kind (now locked by us), or None."""
+        start = random.randrange(n) if n else 0
+        for j in range(n):
+            i = (start + j) % n
+            if (kind, i) in self._held:
+                continue
+            if fcntl is not None:
+                fd = self._fds.get((kind, i))
+                if fd is None:
+                    fd = os.open(os.path.join(self.lock_dir, f"{self.name}.{kind}.{i}"), os.O_RDWR | os.O_CREAT, 0o644)
+                    self._fds[(kind, i)] = fd
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+            self._held.add((kind, i))
+            return i
+        return None
+
+    def _release(self, kind: str, i: int):
+        self._held.discard((kind, i))
+        if fcntl is not None:
+            fcntl.flock(self._fds[(kind, i)], fcntl.LOCK_UN)
+
+    async def acquire(self):
+        """Slot index, or None when the wait queue is full or max_wait passed."""
+        i = self._try("slot", self.slots)
+        if i is not None:
+            self.admitted += 1
+            return i
+        ticket = self._try("wait", self.queue)
+        if ticket is None:
+            self.rejected_full += 1
+            return None
+        self.queued += 1
+        try:
+            deadline = time.monotonic() + self.max_wait
+            delay = 0.002
+            while time.monotonic() < deadline:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.02)
+                i = self._try("slot", self.slots)
+                if i is not None:
+                    self.admitted += 1
+                    return i
+            self.rejected_timeout += 1
+            return None
+        finally:
+            self._release("wait", ticket)
+
+    def release(self, i: int):
+        self._release("slot", i)
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "queue": self.queue,
+            "max_wait": self.max_wait,
+            "in_use_here": sum(1 for k, _ in self._held if k == "slot"),
+            "waiting_here": sum(1 for k, _ in self._held if k == "wait"),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+def parse_gates(spec: str) -> dict:
+    """Parse "orchestrate=16:64:10,nlp=8:16:2" into {name: (slots, queue, max_wait)}."""
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, vals = part.split("=", 1)
+        slots, queue, wait = (vals.split(":") + ["0", "0"])[:3]
+        out[name.strip()] = (int(slots), int(queue), float(wait))
+    return out
+
+
+def _json(status: int, body: dict, retry_after: float) -> tuple:
+    payload = json.dumps(body).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(payload)).encode()),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+    ]
+    return {"type": "http.response.start", "status": status, "headers": headers}, \
+        {"type": "http.response.body", "body": payload}
+
+
+class Admission:
+    """
+    Shared admission state; install with app.add_middleware(AdmissionMiddleware, admission=...).
+
+    routes:          {path: gate name}; requests to other paths are only rate limited.
+    customer_routes: paths whose JSON body names the customer ("customer_id" or "cust_id").
+    customer_paths:  compiled regex with a "cust" group for /crm/{id}-style paths.
+    """
+
+    def __init__(self, buckets: TokenBuckets | None, gates: dict, routes: dict,
+                 ip_rate: tuple, customer_rate: tuple, customer_routes: set = frozenset(),
+                 customer_paths=None, exempt: set = frozenset(), trust_forwarded: bool = False,
+                 max_body: int = 65536):
+        self.buckets = buckets
+        self.gates = gates
+        self.routes = routes
+        self.ip_rate = ip_rate            # (per_sec, burst); per_sec 0 disables
+        self.customer_rate = customer_rate
+        self.customer_routes = customer_routes
+        self.customer_paths = customer_paths
+        self.exempt = exempt
+        self.trust_forwarded = trust_forwarded
+        self.max_body = max_body
+        self.limited_ip = 0
+        self.limited_customer = 0
+
+    def _client_ip(self, scope) -> str:
+        if self.trust_forwarded:
+            for k, v in scope.get("headers") or []:
+                if k == b"x-forwarded-for":
+                    return v.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _customer(self, scope, receive):
+        """(customer_id or None, receive that replays any body we consumed)."""
+        path = scope["path"]
+        if self.customer_paths is not None and scope["method"] == "GET":
+            m = self.customer_paths.match(path)
+            if m:
+                return m.group("cust"), receive
+        if scope["method"] != "POST" or path not in self.customer_routes:
+            return None, receive
+        chunks, size, more = [], 0, True
+        while more:
+            msg = await receive()
+            if msg["type"] != "http.request":
+                return None, receive
+            chunks.append(msg.get("body", b""))
+            size += len(chunks[-1])
+            more = msg.get("more_body", False)
+            if size > self.max_body:
+                break
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": more}
+            return await receive()
+
+        cust = None
+        if not more:
+            try:
+                data = json.loads(body or b"{}")
+                if isinstance(data, dict):
+                    cust = data.get("customer_id") or data.get("cust_id")
+            except ValueError:
+                pass
+        return (str(cust) if cust else None), replay
+
+    async def handle(self, app, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await app(scope, receive, send)
+
+        if self.buckets is not None:
+            checks = []
+            if self.ip_rate[0] > 0:
+                checks.append((f"ip:{self._client_ip(scope)}", *self.ip_rate))
+            if self.customer_rate[0] > 0:
+                cust, receive = await self._customer(scope, receive)
+                if cust:
+                    checks.append((f"cust:{cust}", *self.customer_rate))
+            key, wait = self.buckets.take(checks)
+            if key is not None:
+                per_customer = key.startswith("cust:")
+                if per_customer:
+                    self.limited_customer += 1
+                else:
+                    self.limited_ip += 1
+                start, body = _json(429, {"error": "rate limit exceeded",
+                                          "limit": "customer" if per_customer else "ip"}, wait)
+                await send(start)
+                await send(body)
+                return
+
+        gate = self.gates.get(self.routes.get(scope["path"]))
+        if gate is None:
+            return await app(scope, receive, send)
+        slot = await gate.acquire()
+        if slot is None:
+            start, body = _json(503, {"error": "server busy", "route": gate.name}, gate.max_wait or 1)
+            await send(start)
+            await send(body)
+            return
+        try:
+            await app(scope, receive, send)
+        finally:
+            gate.release(slot)
+
+    def stats(self) -> dict:
+        return {
+            "rate_limited": {"ip": self.limited_ip, "customer": self.limited_customer},
+            "ip_rate": {"per_sec": self.ip_rate[0], "burst": self.ip_rate[1]},
+            "customer_rate": {"per_sec": self.customer_rate[0], "burst": self.customer_rate[1]},
+            "gates": {name: g.stats() for name, g in self.gates.items()},
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, admission: Admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        await self.admission.handle(self.app, scope, receive, send)
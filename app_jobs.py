@@ -0,0 +1,244 @@
+# backend/app_jobs.py
+"""
+Persistent application queue behind POST /applications.
+
+Jobs are rows in a SQLite table (APP_QUEUE_DB). A fixed pool of worker threads
+claims them one at a time. The claim is one BEGIN IMMEDIATE transaction, so
+several uvicorn workers can share the same file and every job runs once.
+Throughput is bounded by the number of workers, not by how long clients are
+willing to hold a connection open.
+
+A running job holds a lease. If the process dies, the lease expires and
+another worker picks the job up again, up to max_attempts.
+
+Submitting an idempotency key again returns its job, except that a failed
+job (e.g. a transient bureau or circuit-breaker error) is queued again with
+the new payload and fresh attempts.
+
+The handler gets an on_stage(stage, info) callback; each call is appended to
+the job's "stages" list, so a client polling the job sees progress (the chat
+UI drives its stepper from it) without holding a connection open.
+
+    q = ApplicationQueue("applications.sqlite", handler=lambda payload, key, on_stage: {...})
+    q.start()
+    job = q.submit({"customer_id": "CUST_1", ...}, idempotency_key)
+    q.get(job["job_id"])   # {"status": "queued" | "running" | "done" | "failed", "stages": [...], ...}
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+
+class QueueFull(Exception):
+    """Too many queued jobs; the client should retry later."""
+
+
+class ApplicationQueue:
+    def __init__(self, db_path: str, handler, workers: int = 4, max_queued: int = 10000,
+                 lease_seconds: float = 300.0, max_attempts: int = 3, poll_seconds: float = 0.5,
+                 keep_seconds: float = 86400.0):
+        self.db_path = db_path
+        self.handler = handler  # handler(payload, idempotency_key, on_stage) -> JSON-able result; raise to fail the job
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.keep_seconds = keep_seconds
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE, status TEXT NOT NULL,"
+            " payload TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL, started REAL, finished REAL, lease_until REAL, stages TEXT)"
+        )
+        if "stages" not in {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN stages TEXT")  # files from before progress was kept
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # --- client side ---
+
+    def submit(self, payload: dict, idempotency_key: str | None = None) -> dict:
+        """Enqueue a job (or return the existing job for the same idempotency key; a failed one is re-queued)."""
+        conn = self._conn()
+        row = None
+        if idempotency_key:
+            row = conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            if row is not None and row["status"] != "failed":
+                return self._public(row)
+        queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        if queued >= self.max_queued:
+            raise QueueFull(f"{queued} applications already queued")
+        if row is not None:
+            # only the status check in the WHERE lets one of several concurrent resubmits re-queue it
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', payload = ?, result = NULL, error = NULL, attempts = 0,"
+                " created = ?, started = NULL, finished = NULL, lease_until = NULL, stages = NULL"
+                " WHERE id = ? AND status = 'failed'",
+                (json.dumps(payload, default=str), time.time(), row["id"]),
+            )
+            self._wake.set()
+            return self.get(row["id"])
+        job_id = uuid.uuid4().hex
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, idempotency_key, status, payload, created) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, idempotency_key, json.dumps(payload, default=str), time.time()),
+            )
+        except sqlite3.IntegrityError:
+            # same key submitted concurrently; the other insert won
+            row = conn.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return self._public(row)
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._public(row) if row is not None else None
+
+    def _public(self, row: sqlite3.Row) -> dict:
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"],
+            "stages": json.loads(row["stages"]) if row["stages"] else [],
+        }
+        if row["status"] == "queued":
+            job["position"] = self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < ?", (row["created"],)
+            ).fetchone()[0]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def stats(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": self.workers, **{r[0]: r[1] for r in rows}}
+
+    # --- worker side ---
+
+    def _claim(self):
+        """Atomically take the oldest queued job (or one whose lease expired)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, payload, idempotency_key, attempts FROM jobs "
+                "WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            if row["attempts"] >= self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                    ("worker lost the job too many times", now, row["id"]),
+                )
+                conn.execute("COMMIT")
+                return self._claim()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, started = ?, lease_until = ?,"
+                " stages = NULL WHERE id = ?",
+                (now, now + self.lease_seconds, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish(self, job_id: str, result=None, error: str | None = None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, lease_until = NULL WHERE id = ?",
+            ("failed" if error else "done", None if error else json.dumps(result, default=str), error,
+             time.time(), job_id),
+        )
+
+    def _stage_recorder(self, job_id: str):
+        """on_stage for one running job: appends {"stage": ..., **info} to its stages column."""
+        stages = []
+
+        def on_stage(stage: str, info: dict):
+            stages.append({"stage": stage, **info})
+            self._conn().execute("UPDATE jobs SET stages = ? WHERE id = ? AND status = 'running'",
+                                 (json.dumps(stages, default=str), job_id))
+        return on_stage
+
+    def purge_finished(self) -> int:
+        """Drop done / failed jobs older than keep_seconds. Returns rows removed."""
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+            (time.time() - self.keep_seconds,),
+        )
+        return cur.rowcount
+
+    def _worker(self):
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except sqlite3.OperationalError:
+                row = None  # database busy; try again after the poll interval
+            if row is None:
+                if time.time() - last_purge > 3600:
+                    last_purge = time.time()
+                    self.purge_finished()
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            try:
+                result = self.handler(json.loads(row["payload"]), row["idempotency_key"],
+                                      self._stage_recorder(row["id"]))
+                self._finish(row["id"], result=result)
+            except Exception as e:
+                self._finish(row["id"], error=str(e)[:2000] or type(e).__name__)
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"app-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+
+def queue_from_env(handler) -> ApplicationQueue:
+    return ApplicationQueue(
+        db_path=os.environ.get("APP_QUEUE_DB") or os.path.join(os.path.dirname(__file__), "applications.sqlite"),
+        handler=handler,
+        workers=int(os.environ.get("APP_WORKERS", "4")),
+        max_queued=int(os.environ.get("APP_QUEUE_MAX", "10000")),
+    )
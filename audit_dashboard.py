@@ -3,7 +3,6 @@ import streamlit as st
 import pandas as pd
 import requests
 from io import StringIO
-import altair as alt
 
 # CONFIG
 BACKEND_BASE = st.sidebar.text_input("Backend base URL", "http://127.0.0.1:8001")
@@ -67,7 +66,8 @@ if fetch:
     if df_counts.empty:
         st.info("No decision counts available yet.")
     else:
-        # bar chart
+        # bar chart (altair is only imported once there is something to draw)
+        import altair as alt
         chart = alt.Chart(df_counts).mark_bar().encode(
             x=alt.X("decision:N", sort="-y"),
             y=alt.Y("count:Q"),
@@ -0,0 +1,135 @@
+# benchmarks/bench_coldstart.py
+"""
+Cold-start time of an API worker.
+
+    python benchmarks/bench_coldstart.py [--runs 5] [--top 12] [--record benchmarks/coldstart.jsonl]
+
+Each run starts a fresh interpreter, so nothing is warm except the OS file cache:
+
+    import      python -X importtime -c "import main": wall time, the heaviest
+                modules main imports and whether pandas / ReportLab got loaded
+    /health     python -m uvicorn main:app on a free port, polled until the
+                first 200 from /health (process spawn to first good response)
+
+Medians over --runs are printed. --record appends them as one JSON line
+(with the git commit and a timestamp), so cold start can be tracked over time.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import datetime
+import statistics
+import subprocess
+import urllib.request
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HEAVY = ["pandas", "numpy", "reportlab", "altair"]
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("ADMISSION", "0")
+    return env
+
+
+def import_run() -> tuple:
+    """(seconds, {module main imports: cumulative seconds}, {heavy module: loaded?}) for one `import main`."""
+    probe = "import sys, json, main; print(json.dumps({m: m in sys.modules for m in %r}))" % HEAVY
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], cwd=BACKEND, env=child_env(),
+                         capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - t0
+    # "import time: self [us] | cumulative | <indent>name", two more spaces per nesting level;
+    # a module's own imports are listed before it, so main's children precede the "main" line
+    top, pending = {}, {}
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            pending[name.strip()] = int(parts[1]) / 1e6
+        elif depth == 0:
+            if name.strip() == "main":
+                top = {"main": int(parts[1]) / 1e6, **pending}
+            pending = {}
+    return elapsed, top, json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def health_run(timeout: float = 60.0) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /health."""
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=BACKEND, env=child_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited: " + proc.stderr.read().decode(errors="replace")[-2000:])
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"/health not up after {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=12, help="heaviest imports of main to list")
+    ap.add_argument("--record", default=None, help="append the result as a JSON line to this file")
+    args = ap.parse_args()
+
+    imports, tops, loaded = [], {}, {}
+    for _ in range(args.runs):
+        elapsed, top, loaded = import_run()
+        imports.append(elapsed)
+        for name, sec in top.items():
+            tops.setdefault(name, []).append(sec)
+    health = [health_run() for _ in range(args.runs)]
+
+    top = sorted(((statistics.median(v), k) for k, v in tops.items()), reverse=True)[:args.top]
+    print(f"import main      median {statistics.median(imports) * 1e3:7.0f} ms  (min {min(imports) * 1e3:.0f}, "
+          f"max {max(imports) * 1e3:.0f}, includes interpreter start)")
+    print(f"first /health    median {statistics.median(health) * 1e3:7.0f} ms  (min {min(health) * 1e3:.0f}, "
+          f"max {max(health) * 1e3:.0f})")
+    print("loaded at import: " + ", ".join(f"{m}={'yes' if v else 'no'}" for m, v in loaded.items()))
+    print("import main and its heaviest imports (cumulative):")
+    for sec, name in top:
+        print(f"  {sec * 1e3:8.1f} ms  {name}")
+
+    if args.record:
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "ts": datetime.datetime.utcnow().isoformat(),
+                "commit": git_commit(),
+                "python": sys.version.split()[0],
+                "runs": args.runs,
+                "import_ms": round(statistics.median(imports) * 1e3, 1),
+                "health_ms": round(statistics.median(health) * 1e3, 1),
+                "loaded": loaded,
+                "top_ms": {name: round(sec * 1e3, 1) for sec, name in top},
+            }) + "\n")
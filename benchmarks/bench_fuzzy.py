@@ -0,0 +1,79 @@
+# benchmarks/bench_fuzzy.py
+"""
+Per-message cost of trigram phrase matching as the vocabulary grows,
+against a linear difflib scan over the same vocabulary.
+
+    python benchmarks/bench_fuzzy.py [--sizes 100,1000,5000,20000]
+"""
+import os
+import sys
+import time
+import random
+import string
+import argparse
+from difflib import get_close_matches
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from fuzzy_index import TrigramIndex, normalize  # noqa: E402
+from nlp_engine import PURPOSES, HESITATION_PHRASES  # noqa: E402
+
+MESSAGES = [
+    "need 2 lakh for my sisters weding",
+    "this emi is too expnsive for me",
+    "educaton loan of 3 lakh over 4 years",
+    "I cant aford that, show lower emi",
+    "want a car loan 5 lakh",
+    "show emi options",
+]
+
+
+def synthetic_phrases(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9))) for _ in range(rnd.randint(1, 3))]
+        out.append(" ".join(words))
+    return out
+
+
+def build(vocab_size: int):
+    idx = TrigramIndex()
+    vocab = list(PURPOSES) + HESITATION_PHRASES + synthetic_phrases(vocab_size)
+    for i, p in enumerate(vocab):
+        idx.add(p, f"label:{i}")
+    return idx, [normalize(p) for p in vocab]
+
+
+def time_per_message(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for m in MESSAGES:
+            fn(m)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES))
+
+
+def difflib_scan(vocab: list):
+    def match(msg):
+        words = normalize(msg).split()
+        for size in (1, 2, 3):
+            for i in range(len(words) - size + 1):
+                get_close_matches(" ".join(words[i:i + size]), vocab, n=1, cutoff=0.8)
+    return match
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,1000,5000,20000")
+    ap.add_argument("--rounds", type=int, default=50)
+    ap.add_argument("--skip-difflib-above", type=int, default=5000)
+    args = ap.parse_args()
+
+    print(f"{'vocab':>8} {'trigram us/msg':>15} {'difflib us/msg':>15}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        idx, vocab = build(size)
+        tri = time_per_message(idx.search, args.rounds)
+        if size <= args.skip_difflib_above:
+            lin = f"{time_per_message(difflib_scan(vocab), max(1, args.rounds // 10)) * 1e6:15.1f}"
+        else:
+            lin = f"{'(skipped)':>15}"
+        print(f"{len(idx):>8} {tri * 1e6:15.1f} {lin}")
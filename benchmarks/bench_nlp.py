@@ -0,0 +1,61 @@
+# benchmarks/bench_nlp.py
+"""
+Golden corpus check + per-message latency for nlp_engine.extract_fields.
+
+    python benchmarks/bench_nlp.py [--iterations 2000]
+
+Cases with an "intent" key also check detect_intent (null = no intent, e.g.
+sentences that must not read as hesitation). Exits non-zero if any golden
+message parses differently from its expectation.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from nlp_engine import extract_fields, detect_intent  # noqa: E402
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "nlp_golden.jsonl")
+
+
+def load_golden(path: str = GOLDEN) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(ln) for ln in f if ln.strip()]
+
+
+def check(cases: list) -> int:
+    failures = 0
+    for case in cases:
+        got = extract_fields(case["message"])
+        diff = {k: (v, got.get(k)) for k, v in case["expected"].items() if got.get(k) != v}
+        if "intent" in case and detect_intent(case["message"]) != case["intent"]:
+            diff["intent"] = (case["intent"], detect_intent(case["message"]))
+        if diff:
+            failures += 1
+            print(f"MISMATCH {case['message']!r}: " + ", ".join(f"{k} expected {a!r} got {b!r}" for k, (a, b) in diff.items()))
+    return failures
+
+
+def bench(cases: list, iterations: int) -> float:
+    msgs = [c["message"] for c in cases]
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for m in msgs:
+            extract_fields(m)
+    elapsed = time.perf_counter() - start
+    return elapsed / (iterations * len(msgs))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=2000)
+    args = ap.parse_args()
+
+    cases = load_golden()
+    failures = check(cases)
+    print(f"golden: {len(cases) - failures}/{len(cases)} messages match")
+    per_msg = bench(cases, args.iterations)
+    print(f"extract_fields: {per_msg * 1e6:.1f} us/message ({1 / per_msg:,.0f} messages/s)")
+    sys.exit(1 if failures else 0)
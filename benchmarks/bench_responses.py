@@ -0,0 +1,104 @@
+# benchmarks/bench_responses.py
+"""
+Serialize + compress + transfer time of the dashboard's largest responses.
+
+    python benchmarks/bench_responses.py [--rows 20000] [--ids 100000] [--mbps 10 100] [--repeat 20]
+
+Writes synthetic audit / metrics / applicant files to a temp dir, points main
+at them and builds the real /audit?limit=1000, /metrics?limit=1000 and /db
+payloads. For each payload it times three renderers: FastAPI's default path
+(jsonable_encoder + JSONResponse), FastJSONResponse on the stdlib, and
+FastJSONResponse on orjson if it is installed. It then times gzip and deflate
+at the middleware's level and adds the transfer time at each --mbps link speed
+(body bytes only, no latency).
+"""
+import os
+import sys
+import csv
+import json
+import time
+import zlib
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ADMISSION", "0")
+import main  # noqa: E402
+import fast_responses  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+
+def write_fixtures(d: str, rows: int, ids: int, seed: int = 5):
+    rnd = random.Random(seed)
+    actions = ["apply_approve", "apply_reject", "apply_refer", "orchestrate_kyc_fail", "sanction_pdf_generated"]
+    with open(os.path.join(d, "audit_log.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["ts", "customer_id", "action", "data"])
+        for i in range(rows):
+            w.writerow([f"2026-10-01T10:{i % 60:02d}:00", f"CUST_{rnd.randrange(ids):06d}", rnd.choice(actions),
+                        json.dumps({"loan_amount": rnd.randrange(50000, 2000000), "emi": round(rnd.random() * 40000, 2),
+                                    "reasons": ["DTI within limit", "Credit score meets threshold"]})])
+    with open(os.path.join(d, "metrics.csv"), "w", encoding="utf-8") as f:
+        f.write("ts,customer_id,decision,loan_amount,tenure_months,emi,dti,credit_score\n")
+        for i in range(rows):
+            f.write(f"2026-10-01T10:00:00,CUST_{i:06d},{rnd.choice(['APPROVE', 'REJECT', 'REFER'])},"
+                    f"{rnd.randrange(50000, 2000000)},{rnd.choice([12, 24, 36])},{rnd.random() * 40000:.2f},"
+                    f"{rnd.random():.3f},{rnd.randrange(300, 900)}\n")
+    with open(os.path.join(d, "applicants.csv"), "w", encoding="utf-8") as f:
+        f.write("id,crm_customer_id,name\n")
+        for i in range(ids):
+            f.write(f"{i},CUST_{i:06d},Person {i}\n")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(label: str, content: dict, repeat: int, mbps: list):
+    renderers = [("fastapi default", lambda: JSONResponse(jsonable_encoder(content)).body)]
+    fast_responses.USE_ORJSON = False
+    renderers.append(("stdlib fast", lambda: fast_responses.FastJSONResponse(content).body))
+    if fast_responses.orjson is not None:
+        renderers.append(("orjson", lambda: fast_responses.orjson.dumps(
+            content, default=str, option=fast_responses.orjson.OPT_NON_STR_KEYS)))
+    print(f"\n{label}")
+    body = None
+    for name, fn in renderers:
+        body = fn()
+        print(f"  serialize  {name:16s} {best_of(fn, repeat) * 1e3:8.2f} ms  {len(body):>10,} bytes")
+    plain = [("identity", len(body), 0.0)]
+    for enc, wbits in (("gzip", 31), ("deflate", 15)):
+        def comp():
+            c = zlib.compressobj(6, zlib.DEFLATED, wbits)
+            return c.compress(body) + c.flush()
+        data = comp()
+        plain.append((enc, len(data), best_of(comp, repeat)))
+    for enc, size, t_comp in plain:
+        transfer = "  ".join(f"{m:g} Mbps {(t_comp + size * 8 / (m * 1e6)) * 1e3:8.1f} ms" for m in mbps)
+        print(f"  {enc:8s} {size:>10,} bytes  compress {t_comp * 1e3:6.2f} ms  compress+transfer: {transfer}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000, help="audit / metrics rows on disk")
+    ap.add_argument("--ids", type=int, default=100000, help="applicants for /db")
+    ap.add_argument("--mbps", type=float, nargs="+", default=[10.0, 100.0])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    d = tempfile.mkdtemp(prefix="resp_bench_")
+    write_fixtures(d, args.rows, args.ids)
+    main.AUDIT_FILE = os.path.join(d, "audit_log.csv")
+    main.METRICS_FILE = os.path.join(d, "metrics.csv")
+    main.DATA_CSV = os.path.join(d, "applicants.csv")
+    for label, resp in (("/audit?limit=1000", main.get_audit(limit=1000, action=None)),
+                        ("/metrics?limit=1000", main.get_metrics(limit=1000)),
+                        (f"/db ({args.ids} ids)", main.db_list())):
+        bench(label, json.loads(resp.body), args.repeat, args.mbps)
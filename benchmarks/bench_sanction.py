@@ -0,0 +1,66 @@
+# benchmarks/bench_sanction.py
+"""
+Canvas vs pre-rendered template sanction letters.
+
+    python benchmarks/bench_sanction.py [--letters 10000] [--keep DIR]
+
+Renders the same synthetic approved decisions with sanction_letter.render_canvas
+and SanctionTemplate.render and reports wall time, CPU time and letters/s for
+each. Letters are written to a temp directory (or --keep DIR).
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from sanction_letter import render_canvas, get_template  # noqa: E402
+
+
+def synthetic_decisions(n: int, seed: int = 7) -> list:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        amount = rnd.choice([50000, 150000, 300000, 500000, 1200000])
+        out.append({
+            "customer_id": f"CUST_{i:06d}",
+            "decision": "APPROVE",
+            "emi": round(amount / rnd.choice([12, 24, 36, 60]) * 1.08, 2),
+            "loan_request": {"loan_amount": amount, "tenure_months": rnd.choice([12, 24, 36, 60])},
+            "crm": {"name": f"Customer {i}", "phone": f"9{rnd.randrange(10**9):09d}", "email": f"c{i}@example.com"},
+            "reasons": ["Credit score meets threshold", f"DTI {rnd.randint(10, 40)}% within limit"],
+        })
+    return out
+
+
+def run(label: str, render, decisions: list, out_dir: str) -> float:
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    for d in decisions:
+        render(d, os.path.join(out_dir, f"{label}_{d['customer_id']}.pdf"))
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    n = len(decisions)
+    print(f"{label:9s} {n} letters  wall {wall:7.2f}s  cpu {cpu:7.2f}s  "
+          f"{wall / n * 1e3:6.3f} ms/letter  {n / wall:9,.0f} letters/s")
+    return wall
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--letters", type=int, default=10000)
+    ap.add_argument("--keep", default=None, help="write letters here instead of a temp dir")
+    args = ap.parse_args()
+
+    decisions = synthetic_decisions(args.letters)
+    out_dir = args.keep or tempfile.mkdtemp(prefix="sanction_bench_")
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        tpl = get_template()
+        t_canvas = run("canvas", render_canvas, decisions, out_dir)
+        t_tpl = run("template", tpl.render, decisions, out_dir)
+        print(f"speedup: {t_canvas / t_tpl:.1f}x")
+    finally:
+        if not args.keep:
+            shutil.rmtree(out_dir, ignore_errors=True)
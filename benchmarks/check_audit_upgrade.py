@@ -0,0 +1,67 @@
+# benchmarks/check_audit_upgrade.py
+"""
+Round-trips a legacy audit log (4 columns, data unquoted) through the header
+upgrade in file_append.append_lines and back through main.read_audit_rows.
+
+    python benchmarks/check_audit_upgrade.py [--audit audit_log.csv]
+
+Works on a copy in a temp dir, with extra legacy rows for empty data and data
+holding commas. Checks that every row reads the same before and after the
+upgrade (with an empty correlation_id), that a row appended afterwards keeps
+its correlation id, and that pandas loads the upgraded file as a rectangle.
+Exits non-zero on any difference.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ADMISSION", "0")
+import pandas as pd  # noqa: E402
+
+import main  # noqa: E402
+from file_append import append_lines  # noqa: E402
+
+DEFAULT_AUDIT = os.path.join(os.path.dirname(__file__), "..", "audit_log.csv")
+EXTRA = ["2025-10-02T10:00:00,CUST_002,apply_customer_not_found,",
+         "2025-10-02T10:00:01,CUST_002,apply_refer,credit:650,emi:1200"]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--audit", default=DEFAULT_AUDIT, help="legacy audit CSV")
+    args = ap.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        main.AUDIT_FILE = os.path.join(tmp, "audit_log.csv")
+        shutil.copyfile(args.audit, main.AUDIT_FILE)
+        with open(main.AUDIT_FILE, "a", encoding="utf-8", newline="") as f:
+            f.write("\r\n".join(EXTRA) + "\r\n")
+
+        before = main.read_audit_rows()
+        append_lines(main.AUDIT_FILE, [], header=main.AUDIT_HEADER)  # what /audit/download does
+        after = main.read_audit_rows()
+        for old, new in zip(before, after):
+            if old != new:
+                failures += 1
+                print(f"MISMATCH {old} -> {new}")
+        if len(before) != len(after):
+            failures += 1
+            print(f"row count {len(before)} -> {len(after)}")
+
+        main.audit_log({"ts": "2025-10-03T00:00:00", "customer_id": "CUST_003", "action": "apply_approve",
+                        "data": "credit:720,emi:100", "correlation_id": "check-1"})
+        last = main.read_audit_rows()[-1]
+        if (last["data"], last["correlation_id"]) != ("credit:720,emi:100", "check-1"):
+            failures += 1
+            print(f"MISMATCH new row {last}")
+        df = pd.read_csv(main.AUDIT_FILE, dtype=str, keep_default_na=False)
+        if list(df.columns) != main.AUDIT_HEADER.split(",") or len(df) != len(after) + 1:
+            failures += 1
+            print(f"pandas read {df.shape} with columns {list(df.columns)}")
+
+    print(f"{len(before)} legacy rows, {failures} problems")
+    sys.exit(1 if failures else 0)
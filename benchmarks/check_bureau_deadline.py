@@ -0,0 +1,64 @@
+# benchmarks/check_bureau_deadline.py
+"""
+Checks that a bureau call is bounded end to end, not just per socket read.
+
+    python benchmarks/check_bureau_deadline.py [--timeout 0.5] [--drip-ms 100]
+
+Starts credit_stub_server on a free port with drip_ms set, so the reply
+arrives one byte at a time: every read is well under the timeout but the
+whole reply takes many times longer. Then:
+
+    1. each call returns within timeout (+ slack) as degraded
+    2. failure_threshold such calls open the breaker
+    3. with drip_ms back at 0 and after reset_timeout, a probe scores again
+
+Exits non-zero on any unexpected result.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import credit_stub_server  # noqa: E402
+from credit_provider import HttpCreditProvider  # noqa: E402
+
+SLACK = 0.25
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--timeout", type=float, default=0.5)
+    ap.add_argument("--drip-ms", type=float, default=100.0)
+    args = ap.parse_args()
+
+    server = credit_stub_server.serve(port=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    provider = HttpCreditProvider(url, timeout=args.timeout, cache_ttl=0.001,
+                                  failure_threshold=3, reset_timeout=1.0)
+    problems = []
+    credit_stub_server.CONFIG["drip_ms"] = args.drip_ms
+    for i in range(3):
+        start = time.perf_counter()
+        res = provider.get_credit(f"CUST_{i}", {})
+        took = time.perf_counter() - start
+        print(f"drip call {i}: {took:.2f}s {res.get('reason') or res.get('credit_score')}")
+        if not res.get("degraded"):
+            problems.append(f"call {i} not degraded: {res}")
+        if took > args.timeout + SLACK:
+            problems.append(f"call {i} took {took:.2f}s > {args.timeout}s deadline")
+    print("breaker:", provider.breaker.snapshot())
+    if provider.breaker.state != "open":
+        problems.append(f"breaker {provider.breaker.state} after overruns, expected open")
+
+    credit_stub_server.CONFIG["drip_ms"] = 0.0
+    time.sleep(1.1)
+    res = provider.get_credit("CUST_9", {})
+    print("probe:", res, provider.breaker.snapshot())
+    if res.get("degraded") or provider.breaker.state != "closed":
+        problems.append(f"probe after reset did not recover: {res}")
+
+    server.shutdown()
+    for p in problems:
+        print("PROBLEM", p)
+    sys.exit(1 if problems else 0)
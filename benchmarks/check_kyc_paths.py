@@ -0,0 +1,92 @@
+# benchmarks/check_kyc_paths.py
+"""
+Checks that every KYC path gives the same answer for every applicant.
+
+    python benchmarks/check_kyc_paths.py [--data applicants.csv]
+
+Works on copies in a temp dir (the applicants CSV and a fresh identity table):
+
+    before   main.kyc_check with no identity table (raw-row field path)
+    after    main.kyc_check after identity.run_ingest (side-table lookup)
+    bulk     the kyc_status bulk_orchestrate.process_chunk gives each raw row
+    report   the failing set kyc_report.run_report writes; every applicant
+             identity.py marks lossy must be in it as "aadhaar needs re-capture"
+
+The bulk runner only reports a status, so only statuses are compared with it;
+the two live paths must also agree on "missing" and "issues". Prints the
+PASS / FAIL counts and each disagreement; exits non-zero on any.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ADMISSION", "0")
+os.environ.setdefault("CREDIT_PROVIDER", "local")
+import pandas as pd  # noqa: E402
+
+import main  # noqa: E402
+import identity  # noqa: E402
+from bulk_orchestrate import process_chunk  # noqa: E402
+from kyc_report import run_report  # noqa: E402
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "..", "applicants.csv")
+
+
+def live(ids: list) -> dict:
+    main.KYC_CACHE.clear()
+    return {cid: main.kyc_check(cid) for cid in ids}
+
+
+def summary(statuses: dict) -> str:
+    fails = sum(s == "FAIL" for s in statuses.values())
+    return f"{len(statuses) - fails} PASS / {fails} FAIL"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default=DEFAULT_DATA, help="applicants CSV")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DATA_CSV = os.path.join(tmp, "applicants.csv")
+        identity.IDENTITY_FILE = os.path.join(tmp, "identity.csv")
+        shutil.copyfile(args.data, main.DATA_CSV)
+
+        raw = pd.read_csv(main.DATA_CSV, dtype=str, keep_default_na=False)
+        ids = [r.get("crm_customer_id") or r.get("id") for r in raw.to_dict(orient="records")]
+
+        before = live(ids)
+        print("ingest:", identity.run_ingest(main.DATA_CSV))
+        after = live(ids)
+        bulk = {row[0]: row[1] for row in process_chunk(0, raw.to_dict(orient="records"))["rows"]}
+        report = run_report(main.DATA_CSV, os.path.join(tmp, "kyc_report.csv"))
+        listed = pd.read_csv(report["report"], dtype=str, keep_default_na=False)
+        failing = set(listed["customer_id"])
+        recapture = set(listed.loc[listed["issues"].str.contains("aadhaar needs re-capture"), "customer_id"])
+        lossy = set(pd.read_csv(identity.IDENTITY_FILE, dtype=str, keep_default_na=False)
+                    .query("aadhaar_status == 'lossy'")["customer_id"])
+        print("report:", {k: report[k] for k in ("applicants", "failing", "counts")})
+
+    statuses = {
+        "before": {cid: r["status"] for cid, r in before.items()},
+        "after": {cid: r["status"] for cid, r in after.items()},
+        "bulk": bulk,
+        "report": {cid: "FAIL" if cid in failing else "PASS" for cid in ids},
+    }
+    for name, by_id in statuses.items():
+        print(f"{name}: {summary(by_id)}")
+    mismatches = 0
+    for cid in ids:
+        seen = {name: by_id.get(cid) for name, by_id in statuses.items()}
+        if len(set(seen.values())) > 1 or before[cid] != after[cid]:
+            mismatches += 1
+            print(f"MISMATCH {cid}: {seen} before={before[cid]} after={after[cid]}")
+    print(f"{len(ids) - mismatches}/{len(ids)} applicants agree on every path")
+    print(f"re-capture: {len(recapture)} listed, {len(lossy)} lossy")
+    if recapture != lossy:
+        mismatches += 1
+        print(f"MISMATCH re-capture list: missing {sorted(lossy - recapture)}, extra {sorted(recapture - lossy)}")
+    sys.exit(1 if mismatches else 0)
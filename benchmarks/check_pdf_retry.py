@@ -0,0 +1,83 @@
+# benchmarks/check_pdf_retry.py
+"""
+Checks that a failed sanction-letter render can be retried and then served.
+
+    python benchmarks/check_pdf_retry.py
+
+Points main's PDF store and job queue at a temp dir, then for one
+content-addressed letter name:
+
+    1. a render that raises        -> file_state "failed", GET /pdf/{name} 500
+    2. the same name resubmitted   -> "ready", GET 200 with the stored bytes
+    3. a stale .pending (a job cancelled at shutdown) -> "failed", and a
+       resubmit recovers it the same way
+
+Exits non-zero on any unexpected state.
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ADMISSION", "0")
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from pdf_jobs import PdfJobQueue, PENDING_SUFFIX, STALE_PENDING_SECONDS  # noqa: E402
+from pdf_store import PdfStore  # noqa: E402
+
+BODY = b"%PDF-1.4\n% check_pdf_retry\n%%EOF\n"
+
+
+def render(decision: dict, filename: str):
+    """Stand-in for generate_sanction_pdf (runs in the pool): fails on request."""
+    if decision.get("fail"):
+        raise RuntimeError("simulated render failure")
+    PdfStore(decision["root"]).put(decision["digest"], BODY)
+    return filename
+
+
+def run(jobs: PdfJobQueue, decision: dict, filename: str) -> str:
+    job_id = jobs.submit(render, decision, filename)
+    deadline = time.time() + 30
+    while jobs.job(job_id)["finished"] is None and time.time() < deadline:
+        time.sleep(0.05)
+    return jobs.file_state(filename)
+
+
+if __name__ == "__main__":
+    problems = []
+
+    def expect(what, got, want):
+        print(f"{what}: {got}")
+        if got != want:
+            problems.append(f"{what}: expected {want!r}, got {got!r}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        main.PDF_STORE = PdfStore(tmp)
+        main.PDF_JOBS = PdfJobQueue(tmp, max_workers=1, locate=main.PDF_STORE.path_for)
+        decision = {"customer_id": "CUST_001", "decision": "APPROVE", "emi": 4448.89,
+                    "loan_request": {"loan_amount": 200000, "tenure_months": 48}}
+        filename, digest, _ = main.PDF_STORE.plan(decision)
+        job = {"root": tmp, "digest": digest}
+        client = TestClient(main.app)
+
+        expect("after failed render", run(main.PDF_JOBS, {**job, "fail": True}, filename), "failed")
+        expect("GET after failure", client.get(f"/pdf/{filename}").status_code, 500)
+        expect("after resubmit", run(main.PDF_JOBS, job, filename), "ready")
+        resp = client.get(f"/pdf/{filename}")
+        expect("GET after resubmit", (resp.status_code, resp.content == BODY), (200, True))
+
+        other, other_digest, _ = main.PDF_STORE.plan({**decision, "customer_id": "CUST_002"})
+        marker = os.path.join(tmp, other + PENDING_SUFFIX)
+        open(marker, "w").close()
+        old = time.time() - STALE_PENDING_SECONDS - 1
+        os.utime(marker, (old, old))
+        expect("stale pending", main.PDF_JOBS.file_state(other), "failed")
+        expect("stale pending resubmitted", run(main.PDF_JOBS, {"root": tmp, "digest": other_digest}, other), "ready")
+        main.PDF_JOBS.shutdown()
+
+    for p in problems:
+        print("PROBLEM", p)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,131 @@
+# benchmarks/stress_append.py
+"""
+Concurrency stress test for the audit / metrics append path.
+
+    python benchmarks/stress_append.py [--procs 16] [--records 2000] [--batch 1 50] [--payload 2000]
+
+Starts --procs processes against fresh audit / metrics files in a temp dir.
+They all start at the same moment (so they race on header creation), then
+each appends --records rows through main.audit_log / main.append_metrics_row,
+or through audit_log_many / append_metrics_lines in blocks of --batch. Audit
+rows carry a --payload byte data field, so writes are large enough to tear if
+they were not locked. Then it checks:
+
+    - exactly one header, on the first line
+    - every line parses and names its writer and sequence number
+    - no record is lost, duplicated or interleaved
+    - each writer's records appear in the order it wrote them
+
+Exits non-zero on any violation.
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("ADMISSION", "0")
+import main  # noqa: E402
+
+
+def writer(proc: int, records: int, batch: int, payload: int, audit_file: str, metrics_file: str, go):
+    main.AUDIT_FILE = audit_file
+    main.METRICS_FILE = metrics_file
+    go.wait()
+    filler = "x" * payload
+    for start in range(0, records, batch):
+        seqs = range(start, min(start + batch, records))
+        audit = [{"ts": f"{proc}", "customer_id": f"P{proc}", "action": "stress",
+                  "data": f'{{"seq": {s}, "pad": "{filler}"}}'} for s in seqs]
+        decisions = [{"customer_id": f"P{proc}", "decision": "APPROVE", "emi": s, "dti": 0.1,
+                      "credit_score": 700, "loan_request": {"loan_amount": proc, "tenure_months": 12}}
+                     for s in seqs]
+        if batch == 1:
+            main.audit_log(audit[0])
+            main.append_metrics_row(decisions[0])
+        else:
+            main.audit_log_many(audit)
+            main.append_metrics_lines([main.metrics_line(d) for d in decisions])
+
+
+def check(path: str, header: str, parse, procs: int, records: int) -> list:
+    """List of violations found in one file."""
+    errors = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        lines = f.read().split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    else:
+        errors.append("file does not end with a newline")
+    if not lines or lines[0] != header:
+        errors.append(f"first line is not the header: {lines[:1]!r}")
+    if sum(1 for ln in lines if ln == header) != 1:
+        errors.append(f"header appears {sum(1 for ln in lines if ln == header)} times")
+    last = [-1] * procs
+    seen = 0
+    for n, ln in enumerate(lines[1:], start=2):
+        try:
+            proc, seq = parse(ln)
+        except Exception as e:
+            errors.append(f"line {n} does not parse ({e}): {ln[:80]!r}")
+            continue
+        if seq != last[proc] + 1:
+            errors.append(f"line {n}: writer {proc} seq {seq} after {last[proc]}")
+        last[proc] = seq
+        seen += 1
+    if seen != procs * records:
+        errors.append(f"{seen} records, expected {procs * records}")
+    return errors[:20]
+
+
+def parse_audit(line: str) -> tuple:
+    (ts, cust, action, data, _correlation_id), = csv.reader([line])
+    assert action == "stress" and cust == f"P{ts}", "fields from different records"
+    seq = int(data.split('"seq": ', 1)[1].split(",", 1)[0])
+    return int(ts), seq
+
+
+def parse_metrics(line: str) -> tuple:
+    fields = line.split(",")
+    assert len(fields) == 10 and fields[1] == f"P{fields[6]}", "fields from different records"
+    return int(fields[6]), int(fields[3])
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=16)
+    ap.add_argument("--records", type=int, default=2000, help="rows per process and file")
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 50], help="rows per append call")
+    ap.add_argument("--payload", type=int, default=2000, help="bytes of padding per audit row")
+    args = ap.parse_args()
+
+    failed = False
+    for batch in args.batch:
+        d = tempfile.mkdtemp(prefix="append_stress_")
+        audit_file = os.path.join(d, "audit_log.csv")
+        metrics_file = os.path.join(d, "metrics.csv")
+        go = mp.Event()
+        procs = [mp.Process(target=writer, args=(p, args.records, batch, args.payload, audit_file, metrics_file, go))
+                 for p in range(args.procs)]
+        for p in procs:
+            p.start()
+        time.sleep(0.5)
+        t0 = time.perf_counter()
+        go.set()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - t0
+        total = args.procs * args.records
+        print(f"batch={batch}: {args.procs} procs x {args.records} rows x 2 files in {elapsed:.2f}s "
+              f"({2 * total / elapsed:,.0f} rows/s)")
+        for label, path, header, parse in (("audit", audit_file, main.AUDIT_HEADER, parse_audit),
+                                           ("metrics", metrics_file, main.METRICS_HEADER, parse_metrics)):
+            errors = check(path, header, parse, args.procs, args.records)
+            failed |= bool(errors)
+            print(f"  {label:8s} {'OK' if not errors else 'FAIL'}  {os.path.getsize(path):,} bytes")
+            for e in errors:
+                print(f"    {e}")
+    sys.exit(1 if failed else 0)
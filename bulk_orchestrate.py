@@ -0,0 +1,236 @@
+# backend/bulk_orchestrate.py
+"""
+Batch KYC -> underwriting -> metrics over applicants.csv.
+
+    python bulk_orchestrate.py [--data ../data/applicants.csv] [--chunk 1000] [--workers N] [--restart]
+
+The applicant file is streamed in chunks. Each chunk runs in a process pool
+with the same rules as /orchestrate_apply: KYC bits as in identity.py, computed
+for the whole chunk at once, then underwrite on the row's requested_amount /
+requested_tenure_months, with existing_emis as the existing debt. Rows are
+never looked up again through the CSV.
+
+Workers return their audit and metrics rows, and the parent writes each chunk
+with one append per file. Decisions go to <out>/bulk_decisions.csv. Finished
+chunks are recorded in <out>/.bulk_orchestrate.checkpoint together with the
+decisions file size at that point. A re-run skips finished chunks and trims
+any half-written tail of the decisions file, so the decisions file is exactly
+once. Audit and metrics rows of a chunk that was in flight when the run died
+may appear twice.
+
+Sanction letters are not rendered here; see bulk_sanction.py.
+"""
+import os
+import csv
+import json
+import time
+import signal
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+import main
+from credit_provider import get_credit_provider
+from identity import normalize_identity
+from kyc_report import compute_kyc_flags, kyc_result
+
+OUT_COLUMNS = ["customer_id", "kyc_status", "decision", "emi", "dti", "credit_score",
+               "loan_amount", "tenure_months", "reasons", "latency_ms"]
+
+
+def _process_row(rec: dict, kyc_code: int, audit: list) -> dict:
+    cid = rec.get("crm_customer_id") or rec.get("id")
+    crm = main.crm_record(rec)
+    kyc = kyc_result(kyc_code)
+    if kyc.get("status") == "FAIL":
+        audit.append({"ts": datetime.datetime.utcnow().isoformat(), "customer_id": cid,
+                      "action": "orchestrate_kyc_fail", "data": json.dumps(kyc)})
+        return {"customer_id": cid, "decision": "REFER", "reasons": ["KYC checks failed or missing information"],
+                "kyc_status": "FAIL"}
+    credit = get_credit_provider().get_credit(cid, rec)
+    payload = {
+        "customer_id": cid,
+        "loan_amount": rec.get("requested_amount"),
+        "tenure_months": rec.get("requested_tenure_months"),
+        "existing_monthly_debt": rec.get("existing_emis"),
+    }
+    try:
+        payload["tenure_months"] = int(float(payload["tenure_months"]))
+    except (TypeError, ValueError):
+        pass
+    res = main.underwrite(payload, crm, credit, audit=audit.append)
+    if not isinstance(res, dict):
+        try:
+            err = json.loads(res.body).get("error")
+        except Exception:
+            err = "underwriting failed"
+        return {"customer_id": cid, "decision": "ERROR", "reasons": [err], "kyc_status": "PASS"}
+    return {**res, "kyc_status": "PASS"}
+
+
+def _ignore_sigint():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+
+
+def process_chunk(index: int, records: list) -> dict:
+    """Worker: run every row of one chunk; returns decisions, audit / metrics rows and per-row latency."""
+    audit, decisions, latencies = [], [], []
+    # same normalization + KYC bits as the identity ingest, for the whole chunk at once
+    codes = compute_kyc_flags(normalize_identity(pd.DataFrame(records)))["code"].tolist()
+    for rec, code in zip(records, codes):
+        t0 = time.perf_counter()
+        try:
+            res = _process_row(rec, code, audit)
+        except Exception as e:
+            res = {"customer_id": rec.get("crm_customer_id") or rec.get("id"), "decision": "ERROR",
+                   "reasons": [str(e)[:200]], "kyc_status": ""}
+        latencies.append(time.perf_counter() - t0)
+        decisions.append(res)
+    rows = []
+    for res, lat in zip(decisions, latencies):
+        loan = res.get("loan_request") or {}
+        rows.append([res.get("customer_id"), res.get("kyc_status"), res.get("decision"), res.get("emi"),
+                     res.get("dti"), res.get("credit_score"), loan.get("loan_amount"), loan.get("tenure_months"),
+                     "; ".join(res.get("reasons") or []), round(lat * 1e3, 3)])
+    return {
+        "index": index,
+        "rows": rows,
+        "audit": audit,
+        "metrics": [main.metrics_line(d) for d in decisions if d.get("decision") != "ERROR"],
+        "latencies": latencies,
+    }
+
+
+def _fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def load_checkpoint(path: str, fingerprint: str, chunk: int) -> tuple:
+    """({done chunk index: counts}, decisions file size to keep) from a previous run."""
+    if not os.path.exists(path):
+        return {}, 0
+    done, keep = {}, 0
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("input") != fingerprint or header.get("chunk") != chunk:
+            raise SystemExit(f"{path} was written for a different input or --chunk; use --restart")
+        for ln in f:
+            try:
+                rec = json.loads(ln)
+            except ValueError:
+                break
+            done[rec["chunk"]] = rec["counts"]
+            keep = rec["out_size"]
+    return done, keep
+
+
+def percentile(sorted_vals: list, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def run(data_csv: str, out_dir: str, chunk: int = 1000, workers: int | None = None, restart: bool = False) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    ckpt_path = os.path.join(out_dir, ".bulk_orchestrate.checkpoint")
+    out_path = os.path.join(out_dir, "bulk_decisions.csv")
+    fingerprint = _fingerprint(data_csv)
+    if restart:
+        for p in (ckpt_path, out_path):
+            if os.path.exists(p):
+                os.remove(p)
+    done, keep = load_checkpoint(ckpt_path, fingerprint, chunk)
+    if not os.path.exists(ckpt_path):
+        with open(ckpt_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"input": fingerprint, "source": os.path.abspath(data_csv), "chunk": chunk}) + "\n")
+    if os.path.exists(out_path):
+        with open(out_path, "r+b") as f:
+            f.truncate(keep)  # drop rows of a chunk that was written but never checkpointed
+    if not os.path.exists(out_path) or os.path.getsize(out_path) == 0:
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow(OUT_COLUMNS)
+
+    workers = workers or os.cpu_count() or 1
+    counts = {}
+    for c in done.values():
+        for k, v in c.items():
+            counts[k] = counts.get(k, 0) + v
+    latencies, processed = [], 0
+    start = time.perf_counter()
+    reader = pd.read_csv(data_csv, dtype=str, keep_default_na=False, chunksize=chunk)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_sigint)
+    interrupted = False
+    with open(out_path, "a", encoding="utf-8", newline="") as out, \
+            open(ckpt_path, "a", encoding="utf-8") as ckpt:
+        writer = csv.writer(out)
+        inflight = set()
+
+        def drain():
+            nonlocal processed
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                inflight.discard(fut)
+                res = fut.result()
+                writer.writerows(res["rows"])
+                out.flush()
+                main.audit_log_many(res["audit"])
+                main.append_metrics_lines(res["metrics"])
+                chunk_counts = {}
+                for row in res["rows"]:
+                    chunk_counts[row[2]] = chunk_counts.get(row[2], 0) + 1
+                for k, v in chunk_counts.items():
+                    counts[k] = counts.get(k, 0) + v
+                ckpt.write(json.dumps({"chunk": res["index"], "counts": chunk_counts, "out_size": out.tell()}) + "\n")
+                ckpt.flush()
+                os.fsync(ckpt.fileno())
+                latencies.extend(res["latencies"])
+                processed += len(res["rows"])
+            if finished:
+                elapsed = time.perf_counter() - start
+                print(f"  {processed} rows  {processed / elapsed if elapsed else 0:,.0f} rows/s")
+
+        try:
+            for index, df in enumerate(reader):
+                if index in done:
+                    continue
+                inflight.add(pool.submit(process_chunk, index, df.to_dict("records")))
+                if len(inflight) >= workers * 2:
+                    drain()  # bounded read-ahead: the file is never fully in memory
+            while inflight:
+                drain()
+        except KeyboardInterrupt:
+            # finished chunks are checkpointed; a re-run resumes after them
+            interrupted = True
+            print("interrupted, re-run the same command to resume")
+        finally:
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    lat = sorted(latencies)
+    latency_ms = {f"p{p}": round(percentile(lat, p) * 1e3, 3) for p in (50, 90, 99)}
+    latency_ms["max"] = round(lat[-1] * 1e3, 3) if lat else 0.0
+    return {
+        "rows_processed": processed,
+        "interrupted": interrupted,
+        "chunks_skipped": len(done),
+        "decisions": counts,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(processed / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": latency_ms,
+        "decisions_file": out_path,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run KYC, underwriting and metrics for every applicant.")
+    ap.add_argument("--data", default=main.DATA_CSV, help="applicants CSV")
+    ap.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "bulk_runs"), help="output directory")
+    ap.add_argument("--chunk", type=int, default=1000, help="rows per task / checkpoint entry")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = ap.parse_args()
+    print(json.dumps(run(args.data, args.out, args.chunk, args.workers, args.restart), indent=2))
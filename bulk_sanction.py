@@ -0,0 +1,193 @@
+# backend/bulk_sanction.py
+"""
+Bulk sanction letter generation for campaign batches.
+
+    python bulk_sanction.py decisions.jsonl [--out pdfs/] [--workers N] [--chunk 200]
+    python bulk_sanction.py decisions.csv --restart
+
+Input is JSONL (one decision_result per line, or a whole /orchestrate_apply
+response with the result under "decision"). CSV input is also accepted, with
+columns customer_id, decision, loan_amount, tenure_months, emi, name, phone,
+email and reasons (separated by "|"). Only APPROVE rows get a letter.
+
+Letters use the same layout as generate_sanction_pdf (sanction_letter.py) and
+are rendered in chunks across a process pool into the same content-addressed
+store (pdf_store.PdfStore under <out>): objects/ by digest plus each customer's
+index/, named sanction_<customer>_<digest>.pdf and served by /pdf/{name}. A
+letter identical to one already stored (by the API or an earlier campaign) is
+not rendered again and is indexed once. Every finished chunk is appended
+to <out>/.<input name>.checkpoint. Re-running the same command skips letters
+that are already done, so an interrupted run resumes where it stopped. Failed
+letters are not checkpointed, so a re-run retries them. The checkpoint also
+serves as the manifest of customer_id -> file.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pdf_store import PdfStore
+from sanction_letter import get_template, render_canvas
+
+PDF_DIR = os.path.join(os.path.dirname(__file__), "pdfs")
+
+
+def _from_csv_row(row: dict) -> dict:
+    reasons = [r.strip() for r in (row.get("reasons") or "").split("|") if r.strip()]
+    return {
+        "customer_id": row.get("customer_id"),
+        "decision": (row.get("decision") or "").upper(),
+        "emi": row.get("emi"),
+        "loan_request": {"loan_amount": row.get("loan_amount"), "tenure_months": row.get("tenure_months")},
+        "crm": {"name": row.get("name"), "phone": row.get("phone"), "email": row.get("email")},
+        "reasons": reasons,
+    }
+
+
+def load_decisions(path: str) -> list:
+    """All decision_result dicts from a JSONL or CSV file, in file order."""
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return [_from_csv_row(row) for row in csv.DictReader(f)]
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for ln in f:
+            if not ln.strip():
+                continue
+            rec = json.loads(ln)
+            out.append(rec["decision"] if isinstance(rec.get("decision"), dict) else rec)
+    return out
+
+
+def _fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def load_checkpoint(path: str, fingerprint: str) -> tuple:
+    """(run stamp, {index: filename}) from an existing checkpoint, or (None, {})."""
+    if not os.path.exists(path):
+        return None, {}
+    done = {}
+    with open(path, "r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("input") != fingerprint:
+            raise SystemExit(f"{path} belongs to a different version of the input; use --restart")
+        for ln in f:
+            try:
+                rec = json.loads(ln)
+            except ValueError:
+                break  # torn last line from an interrupted write
+            for idx, _cid, fname in rec.get("done", []):
+                done[idx] = fname
+    return header.get("stamp"), done
+
+
+def render_chunk(items: list, out_dir: str, use_canvas: bool = False) -> tuple:
+    """
+    Worker: store [(index, decision)] in the PdfStore at out_dir ->
+    ([(index, customer_id, filename)], [(index, error)], letters already stored).
+    """
+    store = PdfStore(out_dir)
+    tpl = None if use_canvas else get_template()
+    done, failed, reused = [], [], 0
+    for idx, decision in items:
+        cust_id = str(decision.get("customer_id") or (decision.get("crm") or {}).get("customer_id") or "UNKNOWN")
+        try:
+            filename, digest, stored = store.plan(decision)
+            if stored:
+                reused += 1
+            else:
+                if use_canvas:
+                    buf = io.BytesIO()
+                    render_canvas(decision, buf)
+                    data = buf.getvalue()
+                else:
+                    data = tpl.render_bytes(decision)
+                store.put(digest, data)
+            store.record(cust_id, digest, filename, decision)
+            done.append((idx, cust_id, filename))
+        except Exception as e:
+            failed.append((idx, f"{cust_id}: {e}"))
+    return done, failed, reused
+
+
+def run(input_path: str, out_dir: str = PDF_DIR, workers: int | None = None, chunk: int = 200,
+        restart: bool = False, use_canvas: bool = False) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    ckpt_path = os.path.join(out_dir, f".{os.path.basename(input_path)}.checkpoint")
+    fingerprint = _fingerprint(input_path)
+    if restart and os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    stamp, done = load_checkpoint(ckpt_path, fingerprint)
+    if stamp is None:
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        with open(ckpt_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"input": fingerprint, "source": os.path.abspath(input_path), "stamp": stamp}) + "\n")
+
+    decisions = load_decisions(input_path)
+    todo = [(i, d) for i, d in enumerate(decisions)
+            if str(d.get("decision") or "").upper() == "APPROVE" and i not in done]
+    approved = sum(1 for d in decisions if str(d.get("decision") or "").upper() == "APPROVE")
+    print(f"{len(decisions)} decisions, {approved} approved, {len(done)} already done, {len(todo)} to render")
+
+    rendered, reused, errors = 0, 0, []
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers)
+    interrupted = False
+    with open(ckpt_path, "a", encoding="utf-8") as ckpt:
+        try:
+            futures = [pool.submit(render_chunk, todo[i:i + chunk], out_dir, use_canvas)
+                       for i in range(0, len(todo), chunk)]
+            for n, fut in enumerate(as_completed(futures), 1):
+                ok, failed, already = fut.result()
+                ckpt.write(json.dumps({"done": ok}) + "\n")
+                ckpt.flush()
+                os.fsync(ckpt.fileno())
+                rendered += len(ok)
+                reused += already
+                errors.extend(failed)
+                if n % 10 == 0 or n == len(futures):
+                    elapsed = time.perf_counter() - start
+                    print(f"  {rendered}/{len(todo)} letters  {rendered / elapsed if elapsed else 0:,.0f} letters/s")
+        except KeyboardInterrupt:
+            # finished chunks are already checkpointed; drop the rest and let a re-run resume
+            interrupted = True
+            print("interrupted, re-run the same command to resume", file=sys.stderr)
+        finally:
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    for idx, err in errors[:20]:
+        print(f"FAILED #{idx} {err}", file=sys.stderr)
+    return {
+        "decisions": len(decisions),
+        "approved": approved,
+        "rendered": rendered,
+        "reused": reused,
+        "skipped_done": len(done),
+        "failed": len(errors),
+        "interrupted": interrupted,
+        "seconds": round(elapsed, 3),
+        "letters_per_sec": round(rendered / elapsed, 1) if elapsed > 0 else None,
+        "checkpoint": ckpt_path,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Render sanction letters for a batch of approved decisions.")
+    ap.add_argument("input", help="decisions as JSONL or CSV")
+    ap.add_argument("--out", default=PDF_DIR, help="directory for the letters and the checkpoint")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--chunk", type=int, default=200, help="letters per task / checkpoint line")
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    ap.add_argument("--canvas", action="store_true", help="draw with the ReportLab canvas instead of the template")
+    args = ap.parse_args()
+    summary = run(args.input, args.out, args.workers, args.chunk, args.restart, args.canvas)
+    print(json.dumps(summary))
+    sys.exit(130 if summary["interrupted"] else (1 if summary["failed"] else 0))
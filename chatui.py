@@ -4,6 +4,9 @@ import requests
 import streamlit.components.v1 as components
 from datetime import datetime
 import os
+import uuid
+import json
+import time
 # -----------------------------
 # PAGE CONFIG
 # -----------------------------
@@ -18,6 +21,9 @@ if 'show_chat' not in st.session_state:
 if 'demo_lead_email' not in st.session_state:
     st.session_state.demo_lead_email = ""
 
+# Sidebar: backend URL (also used by the entry screen's offer preview)
+BACKEND = st.sidebar.text_input("Backend base URL", "http://127.0.0.1:8001")
+
 if not st.session_state.show_chat:
     left, right = st.columns([2, 1])
     with left:
@@ -39,23 +45,25 @@ if not st.session_state.show_chat:
     with right:
         # Optional taste: "Check Offers" quick preview — shows modal-like info
         st.markdown("### Offers preview")
+        offer_cid = st.text_input("Customer ID", placeholder="CUST_001")
         if st.button("Check Offers"):
-            # Simple offer mock to show in slides
-            offer1 = {
-                "title": "Pre-approved Personal Loan",
-                "amount": "₹4,00,000",
-                "rate": "11.5% p.a.",
-                "tenure": "36 months"
-            }
-            offer2 = {
-                "title": "Top-up Loan",
-                "amount": "₹2,00,000",
-                "rate": "13.0% p.a.",
-                "tenure": "24 months"
-            }
-            st.info("Here are personalized offers we found (demo):")
-            st.markdown(f"**{offer1['title']}** — {offer1['amount']} — {offer1['rate']} — {offer1['tenure']}")
-            st.markdown(f"**{offer2['title']}** — {offer2['amount']} — {offer2['rate']} — {offer2['tenure']}")
+            # precomputed offer from the backend's pre-approval table (GET /offers/{customer_id})
+            if not offer_cid.strip():
+                st.warning("Enter your customer ID to see your pre-approved offer.")
+            else:
+                try:
+                    r = requests.get(f"{BACKEND.rstrip('/')}/offers/{offer_cid.strip().upper().replace('-', '_')}", timeout=6)
+                    offer = r.json() if r.status_code == 200 else None
+                except Exception:
+                    r, offer = None, None
+                if offer and offer.get("offer_tier") not in (None, "", "NONE"):
+                    st.info("Here is the offer we found for you:")
+                    st.markdown(f"**Pre-approved Personal Loan ({offer['offer_tier'].title()})** — "
+                                f"₹{offer['pre_approved_limit']:,} — {offer['rate']}% p.a. — {offer['tenure_months']} months")
+                elif r is not None and r.status_code in (200, 404):
+                    st.info("No pre-approved offer for this customer yet — start the chat to check your eligibility.")
+                else:
+                    st.warning("Could not fetch offers right now.")
             st.write("Click **Save Email & Start Chat** to continue with a pre-filled demo experience.")
         # image for visual
         try:
@@ -69,9 +77,6 @@ if not st.session_state.show_chat:
 
 
 
-# Sidebar: backend URL
-BACKEND = st.sidebar.text_input("Backend base URL", "http://127.0.0.1:8001")
-
 # -----------------------------
 # SESSION STATE
 # -----------------------------
@@ -85,6 +90,9 @@ if "crm" not in st.session_state:
     st.session_state.crm = None   # will hold dict from /crm/{id} if loaded
 if "loaded_customer_id" not in st.session_state:
     st.session_state.loaded_customer_id = None
+if "nlp_session_id" not in st.session_state:
+    # backend keeps slots (amount, tenure, purpose) and the CRM record for this id
+    st.session_state.nlp_session_id = uuid.uuid4().hex
 
 # ---- Auto-prefill from marketing CTA (paste after session-state init in chatui.py) ----
 from urllib.parse import unquote
@@ -147,6 +155,66 @@ from requests.exceptions import RequestException
 # BACKEND = "http://127.0.0.1:8001"
 # If not, set it at top of file.
 
+# One correlation id per user action (customer lookup, chat message, formal apply).
+# Every backend call made for the action sends it as X-Correlation-ID, so the
+# backend's audit / metrics rows of that click share it; the UI's own timing of
+# each call goes to /log_event as one "ui_action" event when the action ends.
+def start_action(name: str):
+    st.session_state["ui_action"] = {
+        "correlation_id": uuid.uuid4().hex,
+        "name": name,
+        "started": time.perf_counter(),
+        "calls": [],
+    }
+
+
+def record_call(call: str, started: float, status=None):
+    action = st.session_state.get("ui_action")
+    if action is not None:
+        action["calls"].append({"call": call, "ms": round((time.perf_counter() - started) * 1000, 1),
+                                "status": status})
+
+
+def correlation_headers(headers: dict = None) -> dict:
+    headers = dict(headers or {})
+    action = st.session_state.get("ui_action")
+    if action is not None:
+        headers["X-Correlation-ID"] = action["correlation_id"]
+    return headers
+
+
+def backend_request(method: str, url: str, call: str, **kwargs):
+    """requests.request with the current action's correlation id; records the call's duration."""
+    kwargs["headers"] = correlation_headers(kwargs.get("headers"))
+    started = time.perf_counter()
+    try:
+        resp = requests.request(method, url, **kwargs)
+    except Exception:
+        record_call(call, started)
+        raise
+    record_call(call, started, resp.status_code)
+    return resp
+
+
+def finish_action():
+    """Report the action's end-to-end and per-call latency (best-effort)."""
+    action = st.session_state.pop("ui_action", None)
+    if action is None:
+        return
+    try:
+        requests.post(f"{BACKEND}/log_event", json={
+            "event": "ui_action",
+            "action": action["name"],
+            "correlation_id": action["correlation_id"],
+            "customer_id": st.session_state.get("loaded_customer_id") or "",
+            "total_ms": round((time.perf_counter() - action["started"]) * 1000, 1),
+            "calls": action["calls"],
+            "ts": datetime.utcnow().isoformat()
+        }, headers={"X-Correlation-ID": action["correlation_id"]}, timeout=2)
+    except Exception:
+        pass
+
+
 def call_nlp_apply(msg: str, cust_id: str = None, timeout: int = 10):
     """
     Sends JSON {"msg": msg, "cust_id": cust_id} to /nlp_apply and returns dict.
@@ -155,13 +223,13 @@ def call_nlp_apply(msg: str, cust_id: str = None, timeout: int = 10):
     if not msg:
         return {"error": "empty message"}
 
-    payload = {"message": msg}
+    payload = {"message": msg, "session_id": st.session_state.get("nlp_session_id")}
     if cust_id:
         payload["cust_id"] = cust_id
 
     url = f"{BACKEND.rstrip('/')}/nlp_apply"
     try:
-        resp = requests.post(url, json=payload, timeout=timeout)
+        resp = backend_request("POST", url, "nlp_apply", json=payload, timeout=timeout)
         # If status code is not 2xx, try to return backend message
         try:
             data = resp.json()
@@ -182,24 +250,131 @@ def call_nlp_apply(msg: str, cust_id: str = None, timeout: int = 10):
 
 
 
-def call_orchestrate(customer_id, loan_amount, tenure_months, existing_monthly_debt=0):
+def iter_sse(resp):
+    """(event, data) pairs from a text/event-stream response."""
+    event = "message"
+    for line in resp.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            try:
+                yield event, json.loads(line[5:].strip())
+            except ValueError:
+                yield event, {"raw": line[5:].strip()}
+            event = "message"
+
+
+def stream_nlp_apply(msg: str, cust_id: str = None, timeout: int = 10):
+    """
+    POST /nlp_apply/stream and yield (event, data) pairs: "parsed" as soon as the
+    message is understood, then "reply", "options" and "done" (the full response).
+    Yields ("error", {...}) if the call itself fails.
+    """
+    payload = {"message": msg, "session_id": st.session_state.get("nlp_session_id")}
+    if cust_id:
+        payload["cust_id"] = cust_id
+    headers = correlation_headers({"Accept": "text/event-stream"})
+    started, status = time.perf_counter(), None
+    try:
+        with requests.post(f"{BACKEND.rstrip('/')}/nlp_apply/stream", json=payload,
+                           headers=headers, stream=True, timeout=timeout) as r:
+            status = r.status_code
+            if r.status_code >= 400:
+                yield "error", {"error": f"{r.status_code} {r.reason}: {r.text}"}
+                return
+            yield from iter_sse(r)
+    except Exception as e:
+        yield "error", {"error": f"Request failed: {str(e)}"}
+    finally:
+        record_call("nlp_apply_stream", started, status)
+
+
+def apply_via_queue(customer_id, loan_amount, tenure_months, existing_monthly_debt=0, idempotency_key=None,
+                    max_wait=60.0):
+    """
+    Queue the application on POST /applications (202 + job id) and poll the job,
+    yielding ("stage", data) for each stage the backend records, then
+    ("result", <the /orchestrate_apply response>) or ("error", {...}).
+    Throughput stays bounded by the backend's job workers, not by how long
+    this client holds a request open.
+    """
     payload = {
         "customer_id": customer_id,
         "loan_amount": loan_amount,
         "tenure_months": tenure_months,
         "existing_monthly_debt": existing_monthly_debt,
     }
+    # same key on reruns / double clicks -> backend returns the first job / result
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
     try:
-        r = requests.post(f"{BACKEND}/orchestrate_apply", json=payload, timeout=25)
-        r.raise_for_status()
-        return r.json()
+        r = backend_request("POST", f"{BACKEND}/applications", "applications", json=payload, headers=headers, timeout=6)
+        if r.status_code >= 400:
+            yield "error", {"error": f"{r.status_code} {r.reason}: {r.text}"}
+            return
+        job = r.json()
+        status_url = job["status_url"]
+        sent = 0
+        deadline = time.time() + max_wait
+        while True:
+            for data in (job.get("stages") or [])[sent:]:
+                yield "stage", data
+            sent = max(sent, len(job.get("stages") or []))
+            if job.get("status") == "done":
+                yield "result", job["result"]
+                return
+            if job.get("status") == "failed":
+                yield "error", {"error": job.get("error") or "application failed"}
+                return
+            if time.time() >= deadline:
+                yield "error", {"error": f"application still {job.get('status')} after {max_wait:.0f}s",
+                                "job_id": job.get("job_id")}
+                return
+            try:
+                delay = float(r.headers.get("Retry-After", "1"))
+            except ValueError:
+                delay = 1.0
+            time.sleep(max(0.2, min(delay, 1.0)))
+            r = backend_request("GET", f"{BACKEND}{status_url}", "application_status", timeout=6)
+            if r.status_code >= 400:
+                yield "error", {"error": f"{r.status_code} {r.reason}: {r.text}"}
+                return
+            job = r.json()
     except Exception as e:
-        return {"error": str(e)}
+        yield "error", {"error": str(e)}
+
+
+def apply_stage_event(statuses: dict, data: dict):
+    """Map one backend stage event onto the stepper statuses."""
+    stage = data.get("stage")
+    status = str(data.get("status") or "").upper()
+    if stage == "kyc":
+        statuses["kyc"] = "pass" if status == "PASS" else "fail"
+        if status == "PASS":
+            statuses["underwriting"] = "in_progress"
+    elif stage == "underwriting":
+        statuses["underwriting"] = "fail" if status == "ERROR" else "pass"
+        statuses["pdf"] = "in_progress"
+    elif stage == "pdf":
+        statuses["pdf"] = {"GENERATED": "pass", "QUEUED": "in_progress", "ERROR": "fail"}.get(status, "pending")
+
+
+def fetch_pdf(full_pdf: str, max_wait: float = 20.0):
+    """GET a sanction letter, polling while the backend answers 202 (still rendering)."""
+    deadline = time.time() + max_wait
+    while True:
+        resp = backend_request("GET", full_pdf, "sanction_pdf", timeout=10)
+        if resp.status_code != 202 or time.time() >= deadline:
+            return resp
+        try:
+            delay = float(resp.headers.get("Retry-After", "1"))
+        except ValueError:
+            delay = 1.0
+        time.sleep(max(0.2, min(delay, deadline - time.time())))
 
 
 def fetch_crm(customer_id: str):
     try:
-        r = requests.get(f"{BACKEND}/crm/{customer_id}", timeout=6)
+        r = backend_request("GET", f"{BACKEND}/crm/{customer_id}", "crm", timeout=6)
         if r.status_code == 200:
             return r.json()
         return None
@@ -219,24 +394,13 @@ def call_update_crm(customer_id: str, pan: str = "", income_monthly: float = 0.0
     if income_monthly is not None:
         payload["income_monthly"] = income_monthly
     try:
-        r = requests.post(f"{BACKEND.rstrip('/')}/crm/update", json=payload, timeout=timeout)
+        r = backend_request("POST", f"{BACKEND.rstrip('/')}/crm/update", "crm_update", json=payload, timeout=timeout)
         if r.status_code >= 400:
             return {"error": f"{r.status_code} {r.reason}: {r.text}"}
         return r.json() if r.text else {"status": "ok"}
     except Exception as e:
         return {"error": str(e)}
 
-def call_get_kyc(customer_id: str, timeout: int = 6):
-    """
-    GET /kyc/{customer_id} returning kyc result or error.
-    """
-    try:
-        r = requests.get(f"{BACKEND.rstrip('/')}/kyc/{customer_id}", timeout=timeout)
-        if r.status_code >= 400:
-            return {"error": f"{r.status_code} {r.reason}: {r.text}"}
-        return r.json() if r.text else {}
-    except Exception as e:
-        return {"error": str(e)}
 
 # -----------------------------
 # Improved single placeholder stepper (horizontal badges + progress bar)
@@ -529,6 +693,8 @@ if user_input:
     # Pattern for customer id: accepts CUST_001, cust-1, CUST001, etc.
     cust_pattern = re.compile(r'^cust[_-]?\d+$', re.I)
 
+    # every backend call below shares this action's correlation id
+    start_action("load_customer" if cust_pattern.match(text) else "chat_message")
 
     if cust_pattern.match(text):
         # Normalize format to CUST_XXX (upper + underscore)
@@ -559,6 +725,8 @@ if user_input:
             )
             if preapproved not in ("", "N/A", None):
                 msg += f"You're pre-approved for up to ₹{preapproved}! 🎉"
+                if crm.get("offer_tier"):
+                    msg += f" ({crm.get('offer_tier').title()} offer)"
             else:
                 msg += "Let's check your best loan options today."
 
@@ -578,8 +746,24 @@ if user_input:
         st.chat_message("user").write(text)
 
         st.session_state.typing = True
+        resp = None
         with st.spinner("Contacting backend..."):
-            resp = call_nlp_apply(text, st.session_state.get("loaded_customer_id"))
+            # streamed: show what was understood while the backend finishes the reply
+            understood = st.empty()
+            for event, data in stream_nlp_apply(text, st.session_state.get("loaded_customer_id")):
+                if event == "parsed":
+                    f = data.get("fields") or {}
+                    if f.get("loan_amount"):
+                        understood.caption(f"Understood: ₹{int(f['loan_amount']):,}"
+                                           + (f" over {f['tenure_months']} months" if f.get("tenure_months") else "")
+                                           + " — preparing your options...")
+                elif event == "done":
+                    resp = data
+                elif event == "error":
+                    resp = {"error": data.get("detail") or data.get("error") or f"status {data.get('status_code')}"}
+            understood.empty()
+        if resp is None:
+            resp = {"error": "reply stream ended early"}
         st.session_state.typing = False
 
         # persist response for EMI/options UI
@@ -638,6 +822,8 @@ if user_input:
                             append_message("bot", friendly2)
                             st.chat_message("assistant").write(friendly2)
 
+    finish_action()
+
 # -----------------------------
 # DECISION / ORCHESTRATE SECTION
 # -----------------------------
@@ -687,6 +873,8 @@ if st.session_state.last_decision:
                 st.error("Loan amount and tenure must be > 0.")
             else:
                 st.session_state.show_kyc_form = True
+                # one idempotency key per formal apply attempt (reused across reruns)
+                st.session_state.apply_idem_key = uuid.uuid4().hex
                 # prefill income from CRM if available
                 try:
                     st.session_state.kyc_income = float(st.session_state.crm.get("income_monthly") or 0)
@@ -716,6 +904,7 @@ if st.session_state.last_decision:
                 else:
                     # hide the form while processing to avoid duplicate submits
                     st.session_state.show_kyc_form = False
+                    start_action("formal_apply")
 
                     # 1) update CRM with PAN and income (best-effort)
                     st.info("Saving KYC details to CRM (demo)...")
@@ -732,9 +921,23 @@ if st.session_state.last_decision:
                     statuses = {"kyc": "in_progress", "underwriting": "pending", "pdf": "pending"}
                     render_stepper(statuses)
 
-                    # 3) call /kyc/{id}
-                    with st.spinner("Running KYC check..."):
-                        kyc_res = call_get_kyc(cust)
+                    # 3) one queued application runs kyc -> underwriting -> pdf -> metrics;
+                    #    the stepper is updated as the job records each stage
+                    kyc_res, orch = None, None
+                    with st.spinner("Running KYC, underwriting and PDF generation..."):
+                        for event, data in apply_via_queue(cust, float(loan_amount), int(tenure_months), float(existing_debt or 0),
+                                                           idempotency_key=st.session_state.get("apply_idem_key")):
+                            if event == "stage":
+                                apply_stage_event(statuses, data)
+                                render_stepper(statuses)
+                                if data.get("stage") == "kyc":
+                                    kyc_res = {"kyc": data.get("kyc") or {"status": data.get("status", "")}}
+                            elif event == "result":
+                                orch = data
+                            elif event == "error":
+                                orch = {"error": data.get("detail") or data.get("error") or str(data)}
+                    if kyc_res is None:
+                        kyc_res = {"error": (orch or {}).get("error") or "no KYC result received"}
                     if isinstance(kyc_res, dict) and kyc_res.get("error"):
                         st.error(f"KYC endpoint error: {kyc_res.get('error')}")
                         statuses["kyc"] = "fail"
@@ -742,14 +945,9 @@ if st.session_state.last_decision:
                     else:
                         kyc_status = (kyc_res.get("kyc", {}) if isinstance(kyc_res, dict) else {})
                         if kyc_status and kyc_status.get("status", "").upper() == "PASS":
-                            statuses["kyc"] = "pass"
-                            render_stepper(statuses)
-
-                            # 4) call orchestration (underwriting + pdf)
-                            statuses["underwriting"] = "in_progress"
-                            render_stepper(statuses)
-                            with st.spinner("Running underwriting and PDF generation..."):
-                                orch = call_orchestrate(cust, float(loan_amount), int(tenure_months), float(existing_debt or 0))
+                            # 4) underwriting + pdf results came with the same job
+                            if orch is None:
+                                orch = {"error": "application ended without a result"}
                             if isinstance(orch, dict) and orch.get("error"):
                                 st.error(f"Orchestration error: {orch.get('error')}")
                                 statuses["underwriting"] = "fail"
@@ -808,7 +1006,8 @@ if st.session_state.last_decision:
 
                                     # Try to fetch PDF bytes from backend on demand and provide a download button
                                     try:
-                                        resp = requests.get(full_pdf, timeout=10)
+                                        with st.spinner("Preparing sanction letter..."):
+                                            resp = fetch_pdf(full_pdf)
                                         if resp.status_code == 200:
                                             pdf_bytes = resp.content
                                             # Derive a friendly filename (basename of the url path)
@@ -843,12 +1042,14 @@ if st.session_state.last_decision:
                             statuses["kyc"] = "fail"
                             render_stepper(statuses)
                             st.error("KYC failed or missing data — workflow stopped. Please update CRM and try again.")
+                    finish_action()
 
 
     with col2:
         if st.button("🧹 Clear Chat"):
             st.session_state.messages = []
             st.session_state.last_decision = None
+            st.session_state.nlp_session_id = uuid.uuid4().hex
             st.experimental_rerun()
 
 st.caption("💡 Note: If you load a Customer ID, the UI will use stored income & existing debt from CRM and won't ask for them again.")
@@ -0,0 +1,85 @@
+# backend/correlation.py
+"""
+Correlation ids: tie together every backend call made for one user action.
+
+The chat UI creates one id per action (customer lookup, chat message, formal
+apply) and sends it as X-Correlation-ID on each call it makes for that action.
+CorrelationMiddleware keeps the id of the current request in a context
+variable. Async endpoints, sync endpoints (threadpool) and run_blocking work
+all see it, and audit_line / metrics_line in main.py record it on every row.
+The id is echoed back in the response. A request without the header gets a
+fresh id, so rows of one API call still group together.
+
+For requests that did carry the header, on_complete(correlation_id, scope,
+status, duration_ms) runs once the response is finished; main.py writes it as
+an "http_call" audit row. One action's rows then give each backend call's
+duration and, from the first call's start to the last one's end, the
+end-to-end latency.
+
+Work that outlives the request (queued applications, PDF jobs) takes the id
+along explicitly and runs under correlated(correlation_id).
+"""
+import re
+import time
+import uuid
+import contextlib
+import contextvars
+
+HEADER = "X-Correlation-ID"
+_TOKEN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_current = contextvars.ContextVar("correlation", default=None)  # (correlation id, monotonic start)
+
+
+def current_id() -> str:
+    """The current request's correlation id ("" outside a request)."""
+    cur = _current.get()
+    return cur[0] if cur else ""
+
+
+def elapsed_ms() -> str:
+    """Milliseconds since the current request (or correlated job) started ("" outside one)."""
+    cur = _current.get()
+    return f"{(time.monotonic() - cur[1]) * 1000:.1f}" if cur else ""
+
+
+@contextlib.contextmanager
+def correlated(correlation_id: str):
+    """Run a block (e.g. a queued job) under correlation_id; no-op for an empty id."""
+    if not correlation_id:
+        yield
+        return
+    token = _current.set((correlation_id, time.monotonic()))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class CorrelationMiddleware:
+    def __init__(self, app, on_complete=None):
+        self.app = app
+        self.on_complete = on_complete
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        sent = next((v.decode("latin-1") for k, v in scope.get("headers") or [] if k == b"x-correlation-id"), "")
+        cid = sent if _TOKEN.match(sent) else uuid.uuid4().hex
+        status = 0
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*(message.get("headers") or []),
+                                                  (b"x-correlation-id", cid.encode())]}
+            await send(message)
+
+        t0 = time.monotonic()
+        token = _current.set((cid, t0))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if self.on_complete is not None and cid == sent:
+                self.on_complete(cid, scope, status, round((time.monotonic() - t0) * 1000, 1))
@@ -0,0 +1,185 @@
+# backend/credit_provider.py
+"""
+Credit score providers.
+
+LocalCreditProvider  the demo logic: credit_score from the CRM row, or a
+                     synthetic score derived from income.
+HttpCreditProvider   a credit bureau over HTTP with a pooled session,
+                     an overall per-call deadline, a per-customer TTL cache and a
+                     circuit breaker. When the bureau is down or the breaker
+                     is open it returns a "degraded" result and underwriting
+                     refers the application instead of failing it.
+
+Selected with env vars:
+    CREDIT_PROVIDER=local|http      (default local)
+    CREDIT_BUREAU_URL=http://127.0.0.1:8009
+    CREDIT_BUREAU_TIMEOUT=2.0       seconds per call, end to end
+    CREDIT_CACHE_TTL=900            seconds
+    CREDIT_BREAKER_FAILURES=5       consecutive failures before opening
+    CREDIT_BREAKER_RESET=30         seconds before a half-open probe
+
+credit_stub_server.py is a local bureau stub with injectable latency/failures.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from cache import LRUCache
+
+
+class CreditProvider:
+    """Interface: return {"customer_id", "credit_score", ...} for one customer."""
+    name = "base"
+
+    def get_credit(self, customer_id: str, rec: dict) -> dict:
+        raise NotImplementedError
+
+
+class LocalCreditProvider(CreditProvider):
+    """credit_score column from the CSV, or a synthetic score from income."""
+    name = "local"
+
+    def get_credit(self, customer_id: str, rec: dict) -> dict:
+        credit = rec.get("credit_score")
+        if not credit or str(credit).strip() == "" or str(credit) == "nan":
+            try:
+                inc = float(rec.get("income_monthly") or 30000)
+                credit = int(min(900, max(300, (inc / 1000) * 40)))
+            except:
+                credit = 650
+        return {"customer_id": customer_id, "credit_score": int(float(credit)), "source": self.name}
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half_open after `reset_timeout` seconds (one probe call allowed);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+class HttpCreditProvider(CreditProvider):
+    """
+    Bureau client: GET {base_url}/score/{customer_id} -> {"credit_score": int}.
+
+    requests' timeout only bounds connect and each socket read, so a bureau
+    that drips its reply byte by byte never trips it. The call runs on a small
+    pool and the caller waits at most `timeout` seconds in total; an overrun
+    is a breaker failure like any other error.
+    """
+    name = "bureau"
+
+    def __init__(self, base_url: str, timeout: float = 2.0, cache_ttl: float = 900.0,
+                 pool_size: int = 20, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        # keep-alive pool sized for the uvicorn threadpool; no automatic retries
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = LRUCache(maxsize=10000, ttl=cache_ttl, name="credit_bureau")
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.calls = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="credit-bureau")
+
+    def _fetch(self, customer_id: str) -> int:
+        r = self.session.get(f"{self.base_url}/score/{customer_id}", timeout=(self.timeout, self.timeout))
+        r.raise_for_status()
+        return int(float(r.json()["credit_score"]))
+
+    def _degraded(self, customer_id: str, reason: str) -> dict:
+        return {"customer_id": customer_id, "credit_score": None, "degraded": True,
+                "reason": reason, "source": self.name}
+
+    def get_credit(self, customer_id: str, rec: dict) -> dict:
+        cached = self.cache.get(customer_id)
+        if cached is not None:
+            return {**cached, "cached": True}
+        if not self.breaker.allow():
+            return self._degraded(customer_id, "circuit_open")
+        fut = self.calls.submit(self._fetch, customer_id)
+        try:
+            score = fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            # the worker finishes (or times out) on its own; its answer is dropped
+            fut.cancel()
+            self.breaker.record_failure()
+            return self._degraded(customer_id, "bureau_error: deadline exceeded")
+        except Exception as e:
+            self.breaker.record_failure()
+            return self._degraded(customer_id, f"bureau_error: {type(e).__name__}")
+        self.breaker.record_success()
+        res = {"customer_id": customer_id, "credit_score": score, "source": self.name}
+        self.cache.set(customer_id, res)
+        return res
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_credit_provider() -> CreditProvider:
+    """Process-wide provider chosen from the environment (built once)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if os.environ.get("CREDIT_PROVIDER", "local").lower() == "http":
+                    _provider = HttpCreditProvider(
+                        os.environ.get("CREDIT_BUREAU_URL", "http://127.0.0.1:8009"),
+                        timeout=float(os.environ.get("CREDIT_BUREAU_TIMEOUT", "2.0")),
+                        cache_ttl=float(os.environ.get("CREDIT_CACHE_TTL", "900")),
+                        failure_threshold=int(os.environ.get("CREDIT_BREAKER_FAILURES", "5")),
+                        reset_timeout=float(os.environ.get("CREDIT_BREAKER_RESET", "30")),
+                    )
+                else:
+                    _provider = LocalCreditProvider()
+    return _provider
+
+
+def set_credit_provider(provider: CreditProvider):
+    """Swap the provider (e.g. to point at a stub bureau)."""
+    global _provider
+    _provider = provider
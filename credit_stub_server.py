@@ -0,0 +1,105 @@
+# backend/credit_stub_server.py
+"""
+Local credit bureau stub for exercising HttpCreditProvider.
+
+    python credit_stub_server.py --port 8009 --latency-ms 300 --fail-rate 0.2
+
+GET  /score/{customer_id}  -> {"customer_id": ..., "credit_score": 300..900}
+POST /control              -> change latency_ms / jitter_ms / drip_ms / fail_rate / down
+                              at runtime (drip_ms sends the reply one byte at a time)
+                              e.g. curl -XPOST localhost:8009/control -d '{"down": true}'
+GET  /stats                -> request counters
+
+Scores are deterministic per customer id so cached and fresh answers agree.
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONFIG = {"latency_ms": 0.0, "jitter_ms": 0.0, "drip_ms": 0.0, "fail_rate": 0.0, "down": False}
+STATS = {"requests": 0, "failures": 0}
+_lock = threading.Lock()
+
+
+def score_for(customer_id: str) -> int:
+    h = int(hashlib.sha256(customer_id.encode("utf-8")).hexdigest()[:8], 16)
+    return 300 + h % 601
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+
+    def _send(self, code: int, body: dict, drip_ms: float = 0.0):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if drip_ms <= 0:
+            return self.wfile.write(data)
+        self.wfile.flush()
+        for i in range(len(data)):
+            self.wfile.write(data[i:i + 1])
+            self.wfile.flush()
+            time.sleep(drip_ms / 1000.0)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            return self._send(200, {**STATS, **CONFIG})
+        if not self.path.startswith("/score/"):
+            return self._send(404, {"error": "not found"})
+        with _lock:
+            STATS["requests"] += 1
+            cfg = dict(CONFIG)
+        delay = cfg["latency_ms"] + random.uniform(0, cfg["jitter_ms"])
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if cfg["down"] or random.random() < cfg["fail_rate"]:
+            with _lock:
+                STATS["failures"] += 1
+            return self._send(503, {"error": "bureau unavailable"})
+        cid = self.path[len("/score/"):]
+        self._send(200, {"customer_id": cid, "credit_score": score_for(cid)}, cfg["drip_ms"])
+
+    def do_POST(self):
+        if self.path != "/control":
+            return self._send(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            update = json.loads(self.rfile.read(length) or b"{}")
+        except Exception:
+            return self._send(400, {"error": "invalid json"})
+        with _lock:
+            for k in CONFIG:
+                if k in update:
+                    CONFIG[k] = type(CONFIG[k])(update[k])
+        self._send(200, dict(CONFIG))
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8009) -> ThreadingHTTPServer:
+    """Start the stub in a background thread and return the server (call .shutdown())."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Credit bureau stub with latency injection.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8009)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--drip-ms", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    CONFIG.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, drip_ms=args.drip_ms,
+                  fail_rate=args.fail_rate)
+    print(f"credit bureau stub on http://{args.host}:{args.port}")
+    ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
@@ -0,0 +1,138 @@
+# backend/fast_responses.py
+"""
+Cheaper large responses: fast JSON rendering and on-the-fly compression.
+
+FastJSONResponse     returned directly by the big list endpoints (/audit,
+                     /metrics, /db). That skips FastAPI's jsonable_encoder
+                     walk over every row, and the body is rendered with orjson
+                     when it is installed (pip install orjson), or else with the
+                     same compact json.dumps JSONResponse uses. FAST_JSON=0
+                     forces the stdlib path.
+CompressionMiddleware
+                     pure ASGI gzip / deflate, picked from Accept-Encoding.
+                     Only 200 responses of compressible types at or above
+                     min_size bytes are compressed. Event streams, PDFs,
+                     ranges and already-encoded bodies pass through untouched.
+                     Streamed bodies (FileResponse) are compressed chunk by
+                     chunk.
+"""
+import os
+import json
+import zlib
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USE_ORJSON = orjson is not None and os.environ.get("FAST_JSON", "1") != "0"
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if USE_ORJSON:
+            return orjson.dumps(content, default=str,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":"), default=str).encode("utf-8")
+
+
+COMPRESSIBLE = ("application/json", "text/csv", "text/plain", "text/html", "application/javascript")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Pick "gzip" or "deflate" (or None) from an Accept-Encoding header; gzip wins ties."""
+    q = {}
+    for part in accept_encoding.split(","):
+        token, _, param = part.strip().partition(";")
+        try:
+            weight = float(param.strip()[2:]) if param.strip().startswith("q=") else 1.0
+        except ValueError:
+            weight = 0.0
+        q[token.strip().lower()] = weight
+    wildcard = q.get("*", 0.0)
+    gzip_q = q.get("gzip", q.get("x-gzip", wildcard))
+    deflate_q = q.get("deflate", wildcard)
+    if max(gzip_q, deflate_q) <= 0:
+        return None
+    return "gzip" if gzip_q >= deflate_q else "deflate"
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = 1024, level: int = 6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = ""
+        for k, v in scope.get("headers") or []:
+            if k == b"accept-encoding":
+                accept = v.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None        # held-back http.response.start
+        compressor = None   # set once we decided to compress a streamed body
+        passthrough = False
+
+        def headers_for(body_len: int | None) -> list:
+            headers = [(k, v) for k, v in start["headers"]
+                       if k not in (b"content-length", b"etag", b"accept-ranges")]
+            etag = next((v for k, v in start["headers"] if k == b"etag"), None)
+            if etag is not None:
+                # a compressed variant is no longer byte-identical to the strong validator
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+            if body_len is not None:
+                headers.append((b"content-length", str(body_len).encode()))
+            return headers
+
+        def new_compressor():
+            return zlib.compressobj(self.level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                hdrs = {k: v for k, v in message.get("headers") or []}
+                ctype = hdrs.get(b"content-type", b"").decode("latin-1").split(";")[0].strip().lower()
+                passthrough = (
+                    message["status"] != 200
+                    or b"content-encoding" in hdrs
+                    or ctype not in COMPRESSIBLE
+                    or (b"content-length" in hdrs and int(hdrs[b"content-length"]) < self.min_size)
+                )
+                if passthrough:
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                if not more:
+                    # whole body in one message: compress only above the threshold
+                    if len(body) < self.min_size:
+                        await send(start)
+                        return await send(message)
+                    c = new_compressor()
+                    data = c.compress(body) + c.flush()
+                    await send({**start, "headers": headers_for(len(data))})
+                    return await send({"type": "http.response.body", "body": data})
+                compressor = new_compressor()
+                await send({**start, "headers": headers_for(None)})
+            data = compressor.compress(body)
+            if not more:
+                data += compressor.flush()
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
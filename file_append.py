@@ -0,0 +1,146 @@
+# backend/file_append.py
+"""
+Multi-process-safe appends to the CSV logs (audit_log.csv, metrics.csv).
+
+Every uvicorn worker and every bulk_orchestrate writer appends to the same
+files. append_lines() makes each call one locked write:
+
+    open(O_APPEND) -> flock(LOCK_EX) -> [header if the file is empty]
+                   -> one os.write() of all the lines -> unlock
+
+so records from different processes never interleave, a batch lands as a
+contiguous block, and the header is written exactly once, by whichever writer
+finds the file empty while holding the lock.
+
+When a schema gains columns, a file still starting with the old header is
+upgraded by the first writer that passes the new one: if the old columns are a
+prefix of the new, the file is rewritten with the new header and every old row
+padded with empty fields (fields past the old width are joined back into its
+last column, which old writers did not quote); any other first line gets the file moved aside to
+<path>.<timestamp>.old and a fresh one started. Either way the CSV served for
+download stays rectangular. Each process reads a file's first line once, until
+the file is replaced or shrinks.
+If an earlier writer died
+mid-line, a newline is written first so the torn fragment cannot swallow the
+next record.
+
+locked() exposes the same lock for callers that must read the file before
+deciding what to append (pdf_store's once-per-digest index).
+
+Without fcntl (Windows) the lock only covers threads of this process.
+"""
+import io
+import os
+import csv
+import time
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+_thread_lock = threading.Lock()
+_header_ok = {}  # path -> (st_dev, st_ino, header, size) known to start with that header
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+@contextlib.contextmanager
+def locked(path: str):
+    """Hold the append lock on path (created if missing); yields an O_APPEND fd for write_all()."""
+    with _thread_lock:
+        while True:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                st = None
+            fst = os.fstat(fd)
+            if st is not None and (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino):
+                break
+            # a header upgrade replaced the file while we waited: lock the new one
+            os.close(fd)
+        try:
+            yield fd
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def write_all(fd: int, text: str):
+    _write_all(fd, text.encode("utf-8"))
+
+
+def append_lines(path: str, lines: list, header: str | None = None):
+    """
+    Append lines (without trailing newlines) to path as one locked write.
+    header is written first if the file is new or empty, and replaces an older
+    header (see the module docstring). An empty list with a header only makes
+    sure the file exists with its current header.
+    """
+    while True:
+        with locked(path) as fd:
+            if header and _upgrade_header(path, fd, header):
+                continue  # the file was replaced; lock the new one
+            size = os.fstat(fd).st_size
+            parts = []
+            if size == 0:
+                if header:
+                    parts.append(header + "\n")
+            elif _last_byte(path, size) != b"\n":
+                parts.append("\n")
+            parts.extend(ln + "\n" for ln in lines)
+            if parts:
+                _write_all(fd, "".join(parts).encode("utf-8"))
+            return
+
+
+def _last_byte(path: str, size: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1)
+
+
+def _upgrade_header(path: str, fd: int, header: str) -> bool:
+    """
+    With the lock held: make sure a non-empty path starts with header. Returns
+    True if the file had to be replaced (the caller must lock it again).
+    """
+    st = os.fstat(fd)
+    if st.st_size == 0:
+        return False
+    known = _header_ok.get(path)
+    if known and known[:3] == (st.st_dev, st.st_ino, header) and st.st_size >= known[3]:
+        return False  # appends only grow the file; a smaller one was rewritten in place
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        first = f.readline().rstrip("\r\n")
+        if first == header:
+            _header_ok[path] = (st.st_dev, st.st_ino, header, st.st_size)
+            return False
+        old, new = first.split(","), header.split(",")
+        if len(old) < len(new) and new[:len(old)] == old:
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(new)
+            for row in csv.reader(f):
+                if not row:
+                    continue
+                if len(row) > len(old):  # an unquoted comma inside the last old column
+                    row = row[:len(old) - 1] + [",".join(row[len(old) - 1:])]
+                writer.writerow(row + [""] * (len(new) - len(row)))
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8", newline="") as t:
+                t.write(out.getvalue())
+            os.replace(tmp, path)
+            return True
+    os.replace(path, f"{path}.{time.strftime('%Y%m%dT%H%M%S')}.old")
+    return True
@@ -0,0 +1,126 @@
+# backend/fuzzy_index.py
+"""
+Typo-tolerant phrase matching with a trigram inverted index.
+
+Phrases are indexed by their character trigrams (space padded), bucketed by
+word count. Scores are Dice coefficients over trigram sets; exact phrases
+short-circuit through a dict. Candidates come from a prefix filter: a phrase
+can only reach min_score if it shares at least k of the window's n trigrams,
+so it must contain one of the n - k + 1 rarest ones. Only those short posting
+lists are read, which keeps the per-message cost roughly flat as the
+vocabulary grows into the thousands.
+
+    idx = TrigramIndex(min_score=0.65)
+    idx.add("too expensive", "intent:hesitation")
+    idx.best("this is too expnsive")   # -> ("too expensive", "intent:hesitation", 0.8)
+"""
+import re
+import math
+from collections import defaultdict
+
+_NORMALIZE = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """lower-case, drop apostrophes/punctuation, collapse spaces."""
+    t = (text or "").lower().replace("'", "").replace("’", "")
+    return _SPACES.sub(" ", _NORMALIZE.sub(" ", t)).strip()
+
+
+def trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    min_score     Dice threshold for a fuzzy hit
+    min_fuzzy_len windows shorter than this (in characters) only match exactly,
+                  so short words like "car" never fuzzy-match "can"
+    """
+
+    def __init__(self, min_score: float = 0.65, min_fuzzy_len: int = 4):
+        self.min_score = min_score
+        self.min_fuzzy_len = min_fuzzy_len
+        self._phrases = []                    # id -> (phrase, label, trigram set)
+        self._exact = {}                      # phrase -> id
+        self._postings = defaultdict(list)    # (word count, trigram) -> [ids]
+        self.max_words = 0
+
+    def __len__(self):
+        return len(self._phrases)
+
+    def add(self, phrase: str, label: str):
+        p = normalize(phrase)
+        if not p or p in self._exact:
+            return
+        pid = len(self._phrases)
+        grams = trigrams(p)
+        nwords = p.count(" ") + 1
+        self._phrases.append((p, label, grams))
+        self._exact[p] = pid
+        for g in grams:
+            self._postings[(nwords, g)].append(pid)
+        self.max_words = max(self.max_words, nwords)
+
+    def add_many(self, phrases, label: str):
+        for p in phrases:
+            self.add(p, label)
+
+    def _score_window(self, window: str, nwords: int, prefix: str):
+        pid = self._exact.get(window)
+        if pid is not None and self._phrases[pid][1].startswith(prefix):
+            return pid, 1.0
+        if len(window) < self.min_fuzzy_len:
+            return None, 0.0
+        grams = trigrams(window)
+        n = len(grams)
+        # any phrase with Dice >= t shares at least k = ceil(t*n / (2-t)) trigrams,
+        # so probing the n-k+1 rarest trigrams finds every possible hit
+        k = max(1, math.ceil(self.min_score * n / (2.0 - self.min_score)))
+        postings = sorted((self._postings.get((nwords, g), ()) for g in grams), key=len)
+        candidates = set()
+        for plist in postings[:n - k + 1]:
+            candidates.update(plist)
+        best, best_score = None, 0.0
+        for cand in candidates:
+            phrase, label, cgrams = self._phrases[cand]
+            score = 2.0 * len(grams & cgrams) / (n + len(cgrams))
+            if score > best_score and label.startswith(prefix):
+                best, best_score = cand, score
+        return best, best_score
+
+    def exact(self, text: str, prefix: str = ""):
+        """(phrase, label) of the first phrase found verbatim (as whole words) in the text, or None."""
+        words = normalize(text).split()
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            for i in range(len(words) - size + 1):
+                pid = self._exact.get(" ".join(words[i:i + size]))
+                if pid is not None and self._phrases[pid][1].startswith(prefix):
+                    return self._phrases[pid][0], self._phrases[pid][1]
+        return None
+
+    def search(self, text: str, prefix: str = "", limit: int = 3, min_score: float | None = None) -> list:
+        """
+        Best matches for any word window of the text: [(phrase, label, score)],
+        highest score first. prefix restricts labels (e.g. "purpose:");
+        min_score overrides the index threshold (it can only be raised).
+        """
+        threshold = max(self.min_score, min_score or 0.0)
+        words = normalize(text).split()
+        found = {}
+        for size in range(1, min(self.max_words, len(words)) + 1):
+            for i in range(len(words) - size + 1):
+                pid, score = self._score_window(" ".join(words[i:i + size]), size, prefix)
+                if pid is None or score < threshold:
+                    continue
+                if score > found.get(pid, 0.0):
+                    found[pid] = score
+        ranked = sorted(found.items(), key=lambda kv: -kv[1])[:limit]
+        return [(self._phrases[pid][0], self._phrases[pid][1], round(score, 3)) for pid, score in ranked]
+
+    def best(self, text: str, prefix: str = "", min_score: float | None = None):
+        """Top (phrase, label, score) or None."""
+        hits = self.search(text, prefix=prefix, limit=1, min_score=min_score)
+        return hits[0] if hits else None
@@ -0,0 +1,232 @@
+# backend/identity.py
+"""
+Canonical applicant identity fields and precomputed KYC bits.
+
+applicants.csv keeps identity fields as they were captured: phones with
+spaces / dashes / +91, PAN in any case, Aadhaar often mangled by a spreadsheet
+into scientific notation ("4.04E+11"). The ingest job normalizes them once:
+
+    phone     decimal digits only (any script -> ASCII); blank -> missing
+    pan       trimmed, upper case
+    aadhaar   digits only (spaces / dashes dropped). Scientific notation is
+              reconstructed when the mantissa still carries all 12 digits and
+              flagged "lossy" otherwise. The raw text is kept, and KYC fails a
+              lossy value as "aadhaar needs re-capture" (see kyc_report.py).
+
+and stores the kyc_check bit code (kyc_report.FLAGS) per customer in a side
+table (IDENTITY_FILE). kyc_check turns into a dict lookup plus
+kyc_report.kyc_result(code); /crm/update recomputes the touched customer.
+Like preapproval.py, the table is reloaded only when its mtime changes. Rows
+stamped with an older kyc_report.KYC_RULES_VERSION are ignored (kyc_check then
+checks the raw applicants row) until the ingest runs again.
+
+Run the full ingest:
+    python identity.py [--data path/to/applicants.csv] [--out identity.csv]
+"""
+import os
+import re
+import json
+import datetime
+import argparse
+import threading
+import unicodedata
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from kyc_report import compute_kyc_flags, IDENTITY_COLUMNS, KYC_RULES_VERSION
+
+IDENTITY_FILE = os.path.join(os.path.dirname(__file__), "identity.csv")
+
+COLUMNS = ["customer_id", "phone", "pan", "aadhaar", "aadhaar_status", "kyc_code", "kyc_rules", "computed_at"]
+
+_SCI = re.compile(r"^[+-]?(\d+)(?:\.(\d*))?[eE]([+-]?\d+)$")
+_FLOAT = re.compile(r"^(\d{12})\.0*$")
+_GROUPED = re.compile(r"^[\d\s\-]+$")
+
+
+def _digits(value: str) -> str:
+    return "".join(str(unicodedata.decimal(c)) for c in value if c.isdecimal())
+
+
+def normalize_phone(phone: str) -> str:
+    """
+    Decimal digits only, as ASCII ("+91 97496-38768" -> "919749638768").
+    Text without any digit is only trimmed, so it still reads as present-but-invalid.
+    """
+    raw = str(phone or "").strip()
+    return _digits(raw) or raw
+
+
+def normalize_pan(pan: str) -> str:
+    return str(pan or "").strip().upper()
+
+
+def normalize_aadhaar(aadhaar: str) -> tuple:
+    """(canonical value, status) with status "", "ok", "reconstructed", "lossy" or "invalid"."""
+    raw = str(aadhaar or "").strip()
+    if not raw:
+        return "", ""
+    if _GROUPED.match(raw):
+        digits = _digits(raw)
+        return digits, "ok" if len(digits) == 12 else "invalid"
+    m = _FLOAT.match(raw)
+    if m:
+        return m.group(1), "reconstructed"
+    m = _SCI.match(raw)
+    if m:
+        value = Decimal(raw)
+        if value != value.to_integral_value() or len(str(int(value))) != 12:
+            return raw, "invalid"
+        # "4.04123456789E+11" still carries every digit; "4.04E+11" lost nine of them
+        mantissa = (m.group(1) + (m.group(2) or "")).lstrip("0")
+        return (str(int(value)), "reconstructed") if len(mantissa) >= 12 else (raw, "lossy")
+    return raw, "invalid"
+
+
+def _column(df: pd.DataFrame, *cols: str) -> np.ndarray:
+    """First non-empty of the given columns as an object array of str ("" if none)."""
+    out = np.full(len(df), "", dtype=object)
+    for col in reversed(cols):
+        if col in df.columns:
+            vals = df[col].to_numpy(dtype=object, na_value="")
+            if df[col].dtype == object:  # values set through /crm/update may be numbers
+                vals = np.array([v if isinstance(v, str) else str(v) for v in vals], dtype=object)
+            out = np.where(vals != "", vals, out)
+    return out
+
+
+def _canonical(values: np.ndarray, already: np.ndarray, fn) -> np.ndarray:
+    """fn(value) for rows not already canonical; the rest are kept as they are."""
+    out = values.copy()
+    for i in np.flatnonzero(~already):
+        out[i] = fn(values[i])
+    return out
+
+
+def normalize_identity(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical identity frame for every applicant row (same index): customer_id,
+    name, phone, pan, aadhaar, aadhaar_status. Values that are already canonical
+    (nearly all of them) are detected with str methods mapped over the column and
+    kept; only the rest go through the per-value normalizers.
+    """
+    n = len(df)
+    phone = _column(df, "phone")
+    pan = _column(df, "pan", "PAN")
+    aadhaar = _column(df, "aadhaar", "Aadhaar")
+
+    def ascii_digits(vals):
+        return np.fromiter(map(str.isascii, vals), bool, n) & np.fromiter(map(str.isdigit, vals), bool, n)
+
+    phone = _canonical(phone, ascii_digits(phone) | (phone == ""), normalize_phone)
+    pan = np.array(list(map(str.upper, map(str.strip, pan))), dtype=object)  # normalize_pan, mapped
+
+    aadhaar_ok = ascii_digits(aadhaar) & (np.fromiter(map(len, aadhaar), np.int64, n) == 12)
+    status = np.where(aadhaar_ok, "ok", "").astype(object)
+    for i in np.flatnonzero(~aadhaar_ok & (aadhaar != "")):
+        aadhaar[i], status[i] = normalize_aadhaar(aadhaar[i])
+
+    return pd.DataFrame({
+        "customer_id": _column(df, "crm_customer_id", "id"),
+        "name": _column(df, "name"),
+        "phone": phone,
+        "pan": pan,
+        "aadhaar": aadhaar,
+        "aadhaar_status": status,
+    }, index=df.index)
+
+
+def compute_identity(df: pd.DataFrame) -> pd.DataFrame:
+    """Side table rows (COLUMNS) for every row of the applicants frame."""
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    canon = normalize_identity(df)
+    canon["kyc_code"] = compute_kyc_flags(canon)["code"]
+    canon["kyc_rules"] = KYC_RULES_VERSION
+    canon["computed_at"] = datetime.datetime.utcnow().isoformat()
+    return canon[COLUMNS]
+
+
+def _write_table(table: pd.DataFrame, out_path: str):
+    tmp = out_path + ".tmp"
+    table.to_csv(tmp, index=False)
+    os.replace(tmp, out_path)
+
+
+def run_ingest(data_csv: str, out_path: str | None = None) -> dict:
+    """Rebuild the whole side table from the applicants CSV. Returns counts."""
+    if not os.path.exists(data_csv):
+        raise FileNotFoundError(data_csv)
+    out_path = out_path or IDENTITY_FILE
+    df = pd.read_csv(data_csv, dtype=str, keep_default_na=False, usecols=lambda c: c in IDENTITY_COLUMNS)
+    table = compute_identity(df)
+    _write_table(table, out_path)
+    return {
+        "applicants": len(table),
+        "kyc_fail": int((table["kyc_code"] != 0).sum()),
+        "aadhaar_status": {k: int(v) for k, v in table["aadhaar_status"].value_counts().items() if k},
+    }
+
+
+def recompute_customers(df: pd.DataFrame, out_path: str | None = None) -> int:
+    """
+    Incremental recompute: df holds only the touched applicant rows.
+    Their entries are replaced in the side table; everything else is kept.
+    """
+    fresh = compute_identity(df)
+    if fresh.empty:
+        return 0
+    out_path = out_path or IDENTITY_FILE
+    with _lock:
+        if os.path.exists(out_path):
+            table = pd.read_csv(out_path, dtype=str, keep_default_na=False)
+            table = table[~table["customer_id"].isin(fresh["customer_id"])]
+            table = pd.concat([table, fresh.astype(str)], ignore_index=True)
+        else:
+            table = fresh
+        _write_table(table, out_path)
+    return len(fresh)
+
+
+# --- in-memory side table (reloaded when the file changes) ---
+_lock = threading.Lock()
+_cache = {"stamp": None, "rows": {}}
+
+
+def load_identities(path: str | None = None) -> dict:
+    """Return {customer_id: identity row} (current rules only); cheap when the file is unchanged."""
+    path = path or IDENTITY_FILE
+    try:
+        stamp = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        return {}
+    if _cache["stamp"] == stamp:
+        return _cache["rows"]
+    with _lock:
+        if _cache["stamp"] != stamp:
+            table = pd.read_csv(path, dtype=str, keep_default_na=False)
+            rows = {}
+            for r in table.to_dict(orient="records"):
+                if r.get("kyc_rules") != KYC_RULES_VERSION:
+                    continue
+                r["kyc_code"] = int(r["kyc_code"] or 0)
+                rows[r["customer_id"]] = r
+            _cache["rows"] = rows
+            _cache["stamp"] = stamp
+    return _cache["rows"]
+
+
+def get_identity(customer_id: str, path: str | None = None) -> dict | None:
+    """O(1) lookup of one customer's canonical identity and kyc_code (None if not ingested)."""
+    return load_identities(path).get(str(customer_id))
+
+
+if __name__ == "__main__":
+    default_data = os.path.join(os.path.dirname(__file__), "..", "data", "applicants.csv")
+    ap = argparse.ArgumentParser(description="Normalize applicant identity fields and precompute KYC bits.")
+    ap.add_argument("--data", default=default_data, help="applicants CSV")
+    ap.add_argument("--out", default=IDENTITY_FILE, help="side table to write")
+    args = ap.parse_args()
+    print(json.dumps(run_ingest(args.data, args.out), indent=2))
@@ -0,0 +1,200 @@
+# backend/kyc_report.py
+"""
+Whole-portfolio KYC validation report.
+
+Applies the KYC rules behind kyc_check (main.py) to every applicant in one
+vectorized pass over the applicants table, instead of one lookup + regex round
+per customer.
+1M applicants take a few seconds, most of it reading the CSV.
+compute_kyc_flags is the only implementation of the rules: kyc_check looks up
+the code the identity ingest stored from it, or runs it over the customer's
+raw applicants row, and bulk_orchestrate.py runs it per chunk.
+benchmarks/check_kyc_paths.py checks all of them against each other:
+
+    name      missing if blank
+    phone     missing if empty, else "phone format invalid" unless exactly 10 digits
+    pan       "pan format suspicious" if present and not AAAAA9999A (any case)
+    aadhaar   "aadhaar needs re-capture" if identity.py marks it "lossy", else
+              "aadhaar format suspicious" if present and not 12 digits
+
+Fields are normalized first (identity.normalize_identity) on every path.
+Lossy Aadhaar ("4.04E+11": a 12-digit number a spreadsheet cut down to three
+significant digits) fails: the number that was captured can no longer be
+verified. It gets its own flag and issue text, so the applicant is referred
+(never auto-approved) and listed for re-capture rather than treated as a typo.
+
+Only failing applicants are written, one row each with the same "missing" and
+"issues" texts kyc_check returns ("; " separated). Lossy Aadhaar rows are among
+them with "aadhaar needs re-capture", so filtering the issues column on that
+text gives the re-capture list. A .gz output name is
+compressed.
+
+    python kyc_report.py [--data path/to/applicants.csv] [--out reports/kyc_report_YYYYMMDD.csv]
+"""
+import os
+import re
+import json
+import time
+import datetime
+import argparse
+
+import numpy as np
+import pandas as pd
+
+PAN_PATTERN = r"^[A-Z]{5}[0-9]{4}[A-Z]$"      # matched case-insensitively
+AADHAAR_PATTERN = r"^\d{12}$"
+PHONE_DIGITS = 10
+
+REPORT_COLUMNS = ["customer_id", "missing", "issues"]
+IDENTITY_COLUMNS = {"id", "crm_customer_id", "name", "phone", "pan", "PAN", "aadhaar", "Aadhaar"}
+
+# stored with every identity.py row; bump when the rules below change, so tables
+# computed under older rules are ignored until the next ingest
+KYC_RULES_VERSION = "3"
+
+# flag bits, in kyc_check's order: "missing" texts come from bits 0-1, "issues" from bits 2-5
+FLAGS = ["name_missing", "phone_missing", "phone_invalid", "pan_invalid", "aadhaar_invalid", "aadhaar_lossy"]
+_MISSING_LABELS = ["name", "phone"]
+_ISSUE_LABELS = ["phone format invalid", "pan format suspicious", "aadhaar format suspicious",
+                 "aadhaar needs re-capture"]
+
+_PAN_RE = re.compile(PAN_PATTERN, flags=re.IGNORECASE)
+_AADHAAR_RE = re.compile(AADHAAR_PATTERN)
+_WIDTH = 16  # values up to this many characters are checked on a code-point matrix
+
+
+def _texts(labels: list) -> np.ndarray:
+    """"; ".join of the labels set in each bit pattern, indexed by the pattern."""
+    return np.array(["; ".join(l for b, l in enumerate(labels) if code >> b & 1)
+                     for code in range(1 << len(labels))], dtype=object)
+
+
+def _field(df: pd.DataFrame, *cols: str) -> np.ndarray:
+    """First non-empty of the given columns ("" if none)."""
+    out = np.full(len(df), "", dtype=object)
+    for col in reversed(cols):
+        if col in df.columns:
+            vals = df[col].to_numpy(dtype=object, na_value="")
+            out = np.where(vals != "", vals, out)
+    return out
+
+
+def _codepoints(values: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """(n, _WIDTH) uint32 code points per value, zero padded; longer values come out all zero."""
+    short = np.where(lengths <= _WIDTH, values, "").astype(f"<U{_WIDTH}")
+    return short.view(np.uint32).reshape(len(values), _WIDTH)
+
+
+def _between(u: np.ndarray, lo: str, hi: str) -> np.ndarray:
+    return (u >= ord(lo)) & (u <= ord(hi))
+
+
+def _slow(values: np.ndarray, rows: np.ndarray, test) -> np.ndarray:
+    """test(value) -> bool for the given rows only (the rule's plain regex expression)."""
+    return np.fromiter((test(v) for v in values[rows]), dtype=bool, count=len(rows))
+
+
+def kyc_result(code: int) -> dict:
+    """kyc_check's result for a precomputed flag code (identity.py stores one per customer)."""
+    code = int(code)
+    return {
+        "status": "FAIL" if code else "PASS",
+        "missing": [l for b, l in enumerate(_MISSING_LABELS) if code >> b & 1],
+        "issues": [l for b, l in enumerate(_ISSUE_LABELS) if code >> (b + len(_MISSING_LABELS)) & 1],
+    }
+
+
+def compute_kyc_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-applicant KYC flags for the whole frame (same index): customer_id, one bool
+    column per FLAGS entry, their bit code, and kyc_check's status / missing /
+    issues. aadhaar_lossy needs the aadhaar_status column of a frame from
+    identity.normalize_identity.
+
+    Plain ASCII values (nearly all of them) are decided with array operations on
+    their code points. Anything else - non-ASCII text, unexpected lengths, values
+    that fail the fast test - goes through the rule's regex, so both give the
+    same answer.
+    """
+    n = len(df)
+    ids = _field(df, "crm_customer_id", "id", "customer_id")
+    name = _field(df, "name")
+    phone = _field(df, "phone")
+    pan = _field(df, "pan", "PAN")
+    aadhaar = _field(df, "aadhaar", "Aadhaar")
+
+    # name: missing if not name.strip()
+    name_missing = (name == "") | np.fromiter(map(str.isspace, name), dtype=bool, count=n)
+
+    # phone: present and re.sub(r"\D", "", phone) not 10 long; for pure ASCII that is the ASCII digit count
+    plen = np.fromiter(map(len, phone), dtype=np.int64, count=n)
+    u = _codepoints(phone, plen)
+    phone_missing = plen == 0
+    ascii_row = (plen <= _WIDTH) & (u < 128).all(axis=1)
+    phone_invalid = ~phone_missing & (_between(u, "0", "9").sum(axis=1) != PHONE_DIGITS)
+    rows = np.flatnonzero(~phone_missing & ~ascii_row)
+    phone_invalid[rows] = _slow(phone, rows, lambda v: len(re.sub(r"\D", "", v)) != PHONE_DIGITS)
+
+    # pan: present and no (case-insensitive) AAAAA9999A match
+    plen = np.fromiter(map(len, pan), dtype=np.int64, count=n)
+    u = _codepoints(pan, plen)
+    letter = _between(u, "A", "Z") | _between(u, "a", "z")
+    pan_ok = (plen == 10) & letter[:, :5].all(axis=1) & _between(u[:, 5:9], "0", "9").all(axis=1) & letter[:, 9]
+    pan_invalid = np.zeros(n, dtype=bool)
+    rows = np.flatnonzero((plen > 0) & ~pan_ok)
+    pan_invalid[rows] = _slow(pan, rows, lambda v: _PAN_RE.match(v) is None)
+
+    # aadhaar: present and not 12 digits
+    alen = np.fromiter(map(len, aadhaar), dtype=np.int64, count=n)
+    u = _codepoints(aadhaar, alen)
+    aadhaar_ok = (alen == 12) & _between(u[:, :12], "0", "9").all(axis=1)
+    aadhaar_invalid = np.zeros(n, dtype=bool)
+    rows = np.flatnonzero((alen > 0) & ~aadhaar_ok)
+    aadhaar_invalid[rows] = _slow(aadhaar, rows, lambda v: _AADHAAR_RE.match(v) is None)
+    # a lossy scientific-notation value lost most of its 12 digits to a spreadsheet:
+    # unverifiable, so it fails under its own flag (re-capture, not a format typo)
+    aadhaar_lossy = _field(df, "aadhaar_status") == "lossy"
+    aadhaar_invalid &= ~aadhaar_lossy
+
+    bits = [name_missing, phone_missing, phone_invalid, pan_invalid, aadhaar_invalid, aadhaar_lossy]
+    code = np.zeros(n, dtype=np.int64)
+    for bit, mask in enumerate(bits):
+        code |= mask.astype(np.int64) << bit
+
+    flags = pd.DataFrame({"customer_id": ids, **dict(zip(FLAGS, bits)), "code": code}, index=df.index)
+    flags["missing"] = _texts(_MISSING_LABELS)[code & 0b11]
+    flags["issues"] = _texts(_ISSUE_LABELS)[code >> 2]
+    flags["status"] = np.where(code != 0, "FAIL", "PASS")
+    return flags
+
+
+def run_report(data_csv: str, out_path: str) -> dict:
+    """Write the failing applicants to out_path; returns summary counts."""
+    if not os.path.exists(data_csv):
+        raise FileNotFoundError(data_csv)
+    t0 = time.perf_counter()
+    from identity import normalize_identity  # identity imports this module
+
+    df = pd.read_csv(data_csv, dtype=str, keep_default_na=False, usecols=lambda c: c in IDENTITY_COLUMNS)
+    flags = compute_kyc_flags(normalize_identity(df))
+    failing = flags[flags["code"] != 0]
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    failing[REPORT_COLUMNS].to_csv(out_path, index=False)
+    return {
+        "applicants": len(flags),
+        "failing": len(failing),
+        "counts": {c: int(flags[c].sum()) for c in FLAGS},
+        "seconds": round(time.perf_counter() - t0, 3),
+        "report": out_path,
+    }
+
+
+if __name__ == "__main__":
+    default_data = os.path.join(os.path.dirname(__file__), "..", "data", "applicants.csv")
+    default_out = os.path.join(os.path.dirname(__file__), "reports",
+                               f"kyc_report_{datetime.date.today():%Y%m%d}.csv")
+    ap = argparse.ArgumentParser(description="Nightly KYC validation report for every applicant.")
+    ap.add_argument("--data", default=default_data, help="applicants CSV")
+    ap.add_argument("--out", default=default_out, help="report file (.csv or .csv.gz)")
+    args = ap.parse_args()
+    print(json.dumps(run_report(args.data, args.out), indent=2))
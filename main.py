@@ -1,22 +1,79 @@
 # backend/main.py
-from fastapi import FastAPI, Body, HTTPException,Query
-from fastapi.responses import JSONResponse, FileResponse
-import pandas as pd
+from fastapi import FastAPI, Body, HTTPException,Query, Header, Request
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
 import os
 import datetime
 from pydantic import BaseModel
 import re
 import json
 import io
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
+import hashlib
 import traceback
 from typing import Optional
-from difflib import get_close_matches
+from cache import LRUCache, SingleFlight
+from credit_provider import get_credit_provider
+from nlp_engine import extract_fields, parse_batch, detect_intent
+from sessions import store_from_env
+from pdf_jobs import PdfJobQueue
+from sanction_letter import get_template, render_canvas
+from pdf_store import PdfStore, parse_name
+from app_jobs import queue_from_env, QueueFull
+from fast_responses import FastJSONResponse, CompressionMiddleware
+from file_append import append_lines
+from admission import Admission, AdmissionMiddleware, RouteGate, TokenBuckets, parse_gates
+from profiling import Profiler, ProfilingMiddleware
+from correlation import CorrelationMiddleware, correlated, current_id, elapsed_ms
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+import asyncio
+import functools
+import contextvars
+import csv
 
 app = FastAPI()
 
+# --- response compression (gzip / deflate above COMPRESS_MIN_BYTES; COMPRESS=0 disables) ---
+if os.environ.get("COMPRESS", "1") != "0":
+    app.add_middleware(CompressionMiddleware, min_size=int(os.environ.get("COMPRESS_MIN_BYTES", "1024")),
+                       level=int(os.environ.get("COMPRESS_LEVEL", "6")))
+
+# --- admission control: rate limits per client IP / customer, concurrency caps per route ---
+# Shared by every uvicorn worker on the host (SQLite buckets + flock slot files), so
+# a burst on /nlp_apply cannot take the capacity /orchestrate_apply needs.
+# Over a rate limit -> 429, route slots and wait queue full -> 503, both with Retry-After.
+# Gates are name=slots:queue:max_wait_seconds. ADMISSION=0 turns it all off.
+ADMISSION_DIR = os.environ.get("ADMISSION_DIR") or os.path.join(os.path.dirname(__file__), ".admission")
+ADMISSION_ROUTES = {
+    "/orchestrate_apply": "orchestrate",
+    "/orchestrate_apply/stream": "orchestrate",
+    "/nlp_apply": "nlp",
+    "/nlp_apply/stream": "nlp",
+    "/nlp/parse_batch": "nlp_batch",
+}
+ADMISSION = None
+if os.environ.get("ADMISSION", "1") != "0":
+    os.makedirs(ADMISSION_DIR, exist_ok=True)
+    ADMISSION = Admission(
+        buckets=TokenBuckets(os.environ.get("ADMISSION_DB") or os.path.join(ADMISSION_DIR, "buckets.sqlite")),
+        gates={
+            name: RouteGate(name, slots, queue, wait, ADMISSION_DIR)
+            for name, (slots, queue, wait) in parse_gates(
+                os.environ.get("ADMISSION_GATES", "orchestrate=16:64:10,nlp=8:16:1,nlp_batch=2:2:5")
+            ).items()
+        },
+        routes=ADMISSION_ROUTES,
+        ip_rate=(float(os.environ.get("RATE_IP_PER_SEC", "100")), float(os.environ.get("RATE_IP_BURST", "200"))),
+        customer_rate=(float(os.environ.get("RATE_CUSTOMER_PER_SEC", "5")),
+                       float(os.environ.get("RATE_CUSTOMER_BURST", "30"))),
+        customer_routes={"/orchestrate_apply", "/orchestrate_apply/stream", "/apply", "/applications",
+                         "/nlp_apply", "/nlp_apply/stream", "/crm/update"},
+        customer_paths=re.compile(r"^/(?:crm|kyc|credit|status|offers|pdf/customer)/(?P<cust>[^/]+)$"),
+        exempt={"/health", "/admission/stats"},
+        trust_forwarded=os.environ.get("RATE_TRUST_FORWARDED", "0") == "1",
+    )
+    # added before CORS so CORS wraps it and 429/503 replies still carry its headers
+    app.add_middleware(AdmissionMiddleware, admission=ADMISSION)
+
 # --- enable CORS for demo (paste after app = FastAPI()) ---
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -28,6 +85,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- on-demand profiling of slow requests ---
+# Middleware runs outermost-first in reverse order of adding: CorrelationMiddleware
+# (added below), then this, then CORS and admission. So the timing includes admission
+# waits, and the request's correlation id is already set: profiles are named after
+# it (the X-Correlation-ID echoed in every response), there is no separate request id.
+# Off unless PROFILE=1 or turned on with POST /admin/profiling (all workers follow the
+# last setting stored in PROFILE_DIR/control.json). Requests slower than PROFILE_SLOW_MS
+# and a PROFILE_SAMPLE fraction of the rest leave a stack-sample profile in PROFILE_DIR,
+# listed at /admin/profiles (?correlation_id= finds one action's calls). ADMIN_TOKEN,
+# if set, is required as X-Admin-Token there.
+PROFILER = Profiler(
+    os.environ.get("PROFILE_DIR") or os.path.join(os.path.dirname(__file__), ".profiles"),
+    enabled=os.environ.get("PROFILE", "0") == "1",
+    sample=float(os.environ.get("PROFILE_SAMPLE", "0")),
+    slow_ms=float(os.environ.get("PROFILE_SLOW_MS", "1000")),
+    interval_ms=float(os.environ.get("PROFILE_INTERVAL_MS", "10")),
+    max_files=int(os.environ.get("PROFILE_MAX_FILES", "200")),
+    exempt={"/health"},
+    id_source=current_id,
+)
+app.add_middleware(ProfilingMiddleware, profiler=PROFILER)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# --- correlation ids: one X-Correlation-ID per chat UI action (see correlation.py) ---
+# Every audit / metrics row records the id of the request that wrote it; each call
+# that arrived with an id also gets an "http_call" audit row with its duration. Those
+# rows carry no customer_id (the correlation id ties them to the action), so a customer's
+# latest row in /status stays a decision, not a lookup the UI made.
+def _log_http_call(correlation_id: str, scope, status: int, duration_ms: float):
+    route = getattr(scope.get("route"), "path", None) or scope["path"]
+    entry = {
+        "ts": datetime.datetime.utcnow().isoformat(),
+        "customer_id": "",
+        "action": "http_call",
+        "data": json.dumps({"method": scope.get("method"), "route": route, "status": status,
+                            "duration_ms": duration_ms}),
+        "correlation_id": correlation_id,
+    }
+    try:
+        IO_EXECUTOR.submit(audit_log, entry)  # off the event loop, after the response went out
+    except RuntimeError:  # executor already shut down
+        pass
+
+app.add_middleware(CorrelationMiddleware, on_complete=_log_http_call)
+
+# --- bounded executors for blocking work reached from async endpoints ---
+# CSV reads, bureau calls and audit / metrics / session writes never run on the
+# event loop; orchestration bodies get their own pool so they cannot starve the
+# lookups. Sanction letters render in the PDF_JOBS process pool.
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get("IO_WORKERS", "16")), thread_name_prefix="io")
+ORCH_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get("ORCH_WORKERS", "8")), thread_name_prefix="orch")
+
+async def run_blocking(fn, *args, executor=None, **kwargs):
+    """await fn(*args, **kwargs) on a bounded thread pool (IO_EXECUTOR by default)."""
+    loop = asyncio.get_running_loop()
+    # bound to the current request, so a profile of it includes this thread's stacks
+    call = PROFILER.bind(functools.partial(fn, *args, **kwargs))
+    # run in a copy of this context, so the correlation id reaches audit / metrics rows written there
+    return await loop.run_in_executor(executor or IO_EXECUTOR, contextvars.copy_context().run, call)
+
+def submit_blocking(fn, *args, executor=None, **kwargs):
+    """Future of fn(*args, **kwargs) on a bounded pool, for worker threads (same binding as run_blocking)."""
+    call = PROFILER.bind(functools.partial(fn, *args, **kwargs))
+    return (executor or IO_EXECUTOR).submit(contextvars.copy_context().run, call)
+
 # --- simple frontend event logger (paste with other endpoints) ---
 from fastapi import Body
 
@@ -61,32 +183,54 @@ def log_event(evt: dict = Body(...)):
 # --- paths (repo structure: backend/ and data/ at repo root) ---
 DATA_CSV = os.path.join(os.path.dirname(__file__), "..", "data", "applicants.csv")
 AUDIT_FILE = os.path.join(os.path.dirname(__file__), "audit_log.csv")
+AUDIT_HEADER = "ts,customer_id,action,data,correlation_id"
 PDF_DIR = os.path.join(os.path.dirname(__file__), "pdfs")
 
 os.makedirs(PDF_DIR, exist_ok=True)
+PDF_STORE = PdfStore(PDF_DIR)
 
 # --- helper functions ---
+# pandas (and the side-table modules built on it: preapproval, identity, kyc_report)
+# is imported by the functions that use it, so a worker starts without it and
+# loads it on the first CRM / KYC request.
 def load_applicants_df():
     """Load applicants CSV. Returns empty DataFrame if file missing."""
+    import pandas as pd
     if not os.path.exists(DATA_CSV):
         return pd.DataFrame()
     return pd.read_csv(DATA_CSV, dtype=str)
 
+def crm_version() -> str:
+    """
+    Cheap version stamp of the CRM data file (mtime + size). Changes on every
+    /crm/update, in this process or any other, so it can be part of cache keys.
+    """
+    try:
+        st = os.stat(DATA_CSV)
+    except OSError:
+        return "0"
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+def audit_line(entry: dict) -> str:
+    """One AUDIT_FILE row (ts, customer_id, action, quoted data, correlation_id)."""
+    data_field = '"' + str(entry.get("data", "")).replace('"', '""') + '"'
+    return ",".join([
+        str(entry.get("ts", "")),
+        str(entry.get("customer_id", "")),
+        str(entry.get("action", "")),
+        data_field,
+        str(entry.get("correlation_id") or current_id()).replace(",", "")
+    ])
+
+def audit_log_many(entries: list):
+    """Append several audit rows as one locked write (safe across workers and batch runners)."""
+    if not entries:
+        return
+    append_lines(AUDIT_FILE, [audit_line(e) for e in entries], header=AUDIT_HEADER)
+
 def audit_log(entry: dict):
     """Append one audit row (ts, customer_id, action, data) to AUDIT_FILE."""
-    header = ["ts", "customer_id", "action", "data"]
-    exists = os.path.exists(AUDIT_FILE)
-    with open(AUDIT_FILE, "a", encoding="utf-8") as f:
-        if not exists:
-            f.write(",".join(header) + "\n")
-        data_field = '"' + str(entry.get("data", "")).replace('"', '""') + '"'
-        line = ",".join([
-            str(entry.get("ts", "")),
-            str(entry.get("customer_id", "")),
-            str(entry.get("action", "")),
-            data_field
-        ])
-        f.write(line + "\n")
+    audit_log_many([entry])
 
 class NLPPayload(BaseModel):
     customer_id: str | None = None
@@ -98,146 +242,100 @@ class NLPPayload(BaseModel):
 # ------------------------
 # Local/simple NLP parser
 # ------------------------
-def parse_number_with_units(text: str) -> float | None:
-    if not text:
-        return None
-    # try to find numeric token
-    t = text.lower().replace(" ", "")
-    # remove commas for parsing
-    no_commas = text.replace(",", "")
-    m = re.search(r"([0-9]+(?:\.\d+)?)", no_commas)
-    if not m:
-        return None
-    raw = m.group(1)
-    try:
-        val = float(raw)
-    except:
-        return None
-
-    idx = no_commas.find(raw)
-    tail = no_commas[idx + len(raw): idx + len(raw) + 8].lower()
-    head = no_commas[max(0, idx - 8): idx].lower()
-
-    if "lakh" in tail or "lakh" in head or "lac" in tail or "lacs" in tail or "lac" in head:
-        return val * 100000.0
-    if tail.startswith("k") or head.endswith("k") or "thousand" in tail or "thousand" in head:
-        return val * 1000.0
-    return val
-
-def parse_tenure_months(text: str) -> int | None:
-    if not text:
-        return None
-    text = text.lower()
-    m_months = re.search(r"(\d+)\s*(months|month|mos|m\b)", text)
-    if m_months:
-        return int(m_months.group(1))
-    m_years = re.search(r"(\d+(\.\d+)?)\s*(years|year|yrs|yr|y\b)", text)
-    if m_years:
-        try:
-            years = float(m_years.group(1))
-            return int(round(years * 12))
-        except:
-            return None
-    m_num = re.search(r"\b(\d{1,3})\b", text)
-    if m_num:
-        return int(m_num.group(1))
-    return None
-
 def extract_fields_from_text_local(user_text: str) -> dict:
-    text = (user_text or "").strip()
-    result = {
-        "customer_id": None,
-        "loan_amount": None,
-        "tenure_months": None,
-        "existing_monthly_debt": 0.0,
-        "income_monthly": None
+    """Structured fields for NLPPayload; same engine as nlp_apply (see nlp_engine.py)."""
+    fields = extract_fields(user_text)
+    return {
+        "customer_id": fields["customer_id"],
+        "loan_amount": fields["loan_amount"],
+        "tenure_months": fields["tenure_months"],
+        "existing_monthly_debt": fields["existing_monthly_debt"],
+        "income_monthly": fields["income_monthly"]
     }
 
-    m_id = re.search(r"(customer[_\s]?id|id)[:\s]*([A-Za-z0-9\-_]+)", text, flags=re.IGNORECASE)
-    if m_id:
-        result["customer_id"] = m_id.group(2)
-
-    loan_ctx = None
-    m_loan = re.search(r"(?:loan|want|need|applyfor|applyfora)\s*[^\d]{0,3}([0-9][\d,\.]*\s*(?:lakh|lacs|lac|k|thousand|)?)", text, flags=re.IGNORECASE)
-    if m_loan:
-        loan_ctx = m_loan.group(1)
-    else:
-        m_loan2 = re.search(r"([0-9][\d,\.]*)\s*(lakh|lac|lacs|k|thousand)?\s*(?:loan)", text, flags=re.IGNORECASE)
-        if m_loan2:
-            loan_ctx = (m_loan2.group(1) or "") + (m_loan2.group(2) or "")
-    if loan_ctx:
-        parsed = parse_number_with_units(loan_ctx)
-        if parsed is not None:
-            result["loan_amount"] = parsed
-
-    if result["loan_amount"] is None:
-        m_any = re.search(r"([0-9][\d,\.]*(?:\s*(?:lakh|lac|lacs|k|thousand))?)", text, flags=re.IGNORECASE)
-        if m_any:
-            maybe = parse_number_with_units(m_any.group(1))
-            if maybe is not None and maybe >= 1000:
-                result["loan_amount"] = maybe
-
-    t = parse_tenure_months(text)
-    if t is not None:
-        result["tenure_months"] = t
-
-    m_income = re.search(r"(salary|income|earn)\s*(?:is|:|=)?\s*([0-9][\d,\.]*\s*(?:lakh|lac|lacs|k|thousand)?)", text, flags=re.IGNORECASE)
-    if m_income:
-        parsed = parse_number_with_units(m_income.group(2))
-        if parsed is not None:
-            result["income_monthly"] = parsed
-    else:
-        m_inc2 = re.search(r"([0-9][\d,\.]*\s*(?:lakh|lac|lacs|k|thousand)?)\s*(?:/month|permonth|per month|monthly)", text, flags=re.IGNORECASE)
-        if m_inc2:
-            parsed = parse_number_with_units(m_inc2.group(1))
-            if parsed is not None:
-                result["income_monthly"] = parsed
-
-    m_debt = re.search(r"(existing|current)?\s*(debt|emi|payment|payments)\s*(?:is|:|=)?\s*([0-9][\d,\.]*\s*(?:lakh|lac|lacs|k|thousand)?)", text, flags=re.IGNORECASE)
-    if m_debt:
-        parsed = parse_number_with_units(m_debt.group(3))
-        if parsed is not None:
-            result["existing_monthly_debt"] = parsed
-
-    # normalization
-    try:
-        if result["loan_amount"] is not None:
-            result["loan_amount"] = float(result["loan_amount"])
-    except:
-        result["loan_amount"] = None
-    try:
-        if result["income_monthly"] is not None:
-            result["income_monthly"] = float(result["income_monthly"])
-    except:
-        result["income_monthly"] = None
-    try:
-        if result["existing_monthly_debt"] is not None:
-            result["existing_monthly_debt"] = float(result["existing_monthly_debt"])
-    except:
-        result["existing_monthly_debt"] = 0.0
-    try:
-        if result["tenure_months"] is not None:
-            result["tenure_months"] = int(result["tenure_months"])
-    except:
-        result["tenure_months"] = None
-
-    return result
-
 # --- basic endpoints ---
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the in-process caches."""
+    caches = [ORCH_RESULTS, NLP_REPLY_CACHE, SESSIONS.memory, KYC_CACHE]
+    provider_cache = getattr(get_credit_provider(), "cache", None)
+    if provider_cache is not None:
+        caches.append(provider_cache)
+    return {c.name: c.stats() for c in caches}
+
+@app.get("/admission/stats")
+def admission_stats():
+    """Rate-limit rejections and route gate counters (this worker's view)."""
+    if ADMISSION is None:
+        return {"enabled": False}
+    return {"enabled": True, **ADMISSION.stats()}
+
+def _admin_denied(admin_token: Optional[str]):
+    if ADMIN_TOKEN and admin_token != ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "admin token required"})
+    return None
+
+@app.get("/admin/profiling")
+def profiling_status(admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """Profiling settings (shared by all workers) and this worker's counters."""
+    return _admin_denied(admin_token) or PROFILER.stats()
+
+@app.post("/admin/profiling")
+def profiling_configure(body: dict = Body(...), admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """
+    body = {"enabled": true, "sample": 0.01, "slow_ms": 500} (any subset).
+    Every worker picks the new settings up within a second; no restart needed.
+    """
+    denied = _admin_denied(admin_token)
+    if denied:
+        return denied
+    try:
+        return PROFILER.configure(enabled=body.get("enabled"), sample=body.get("sample"), slow_ms=body.get("slow_ms"))
+    except (TypeError, ValueError):
+        return JSONResponse(status_code=400, content={"error": "sample and slow_ms must be numbers"})
+
+@app.get("/admin/profiles")
+def list_profiles(route: Optional[str] = None, limit: int = Query(50, ge=1, le=1000),
+                  correlation_id: Optional[str] = None,
+                  admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """
+    Stored request profiles, newest first. route filters by route template (e.g.
+    /orchestrate_apply), correlation_id by the X-Correlation-ID of the calls.
+    """
+    return _admin_denied(admin_token) or {"profiles": PROFILER.list_profiles(route, limit, correlation_id)}
+
+@app.get("/admin/profiles/{name}")
+def get_profile(name: str, format: str = Query("json", pattern="^(json|folded)$"),
+                admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """One profile: metadata, hottest functions and folded stacks; format=folded for flamegraph tools."""
+    denied = _admin_denied(admin_token)
+    if denied:
+        return denied
+    profile = PROFILER.load_profile(name)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"error": "profile not found"})
+    if format == "folded":
+        return Response("\n".join(profile["folded"]) + "\n", media_type="text/plain")
+    return profile
+
 @app.get("/db")
 def db_list():
     df = load_applicants_df()
     if df.empty:
         return {"error": "applicants CSV not found"}
     ids = df["id"].tolist() if "id" in df.columns else df.iloc[:, 0].tolist()
-    return {"count": len(ids), "ids": ids}
+    return FastJSONResponse({"count": len(ids), "ids": ids})
 
-@app.get("/crm/{customer_id}")
-def get_crm(customer_id: str):
+def find_applicant(customer_id: str):
+    """
+    The raw applicants.csv row (dict) for a CRM or applicant id, identity fields
+    included; JSONResponse 500 / 404 when the file or the customer is missing.
+    """
+    import pandas as pd
     df = load_applicants_df()
     if df.empty:
         return JSONResponse(status_code=500, content={"error": "applicants CSV not found"})
@@ -245,14 +343,53 @@ def get_crm(customer_id: str):
              (df.get("id", pd.Series(dtype=str)) == customer_id)]
     if row.empty:
         return JSONResponse(status_code=404, content={"error": "customer not found"})
-    rec = row.iloc[0].to_dict()
+    return row.iloc[0].to_dict()
+
+@app.get("/crm/{customer_id}")
+def get_crm(customer_id: str):
+    rec = find_applicant(customer_id)
+    if isinstance(rec, JSONResponse):
+        return rec
+    return crm_record(rec)
+
+def crm_record(rec: dict) -> dict:
+    """The /crm response for one applicants.csv row (dict)."""
+    from preapproval import get_offer
+    cid = rec.get("crm_customer_id") or rec.get("id")
+    # join the precomputed offer side table (dict lookup, see preapproval.py)
+    offer = get_offer(cid) or {}
+    limit = offer.get("pre_approved_limit") or rec.get("pre_approved_limit", "")
+    if str(limit).strip() in ("0", "0.0"):
+        limit = ""
     return {
-        "customer_id": rec.get("crm_customer_id") or rec.get("id"),
+        "customer_id": cid,
         "name": rec.get("name"),
         "phone": rec.get("phone"),
         "email": rec.get("email"),
         "income_monthly": rec.get("income_monthly"),
-        "pre_approved_limit": rec.get("pre_approved_limit", "")
+        "pre_approved_limit": limit,
+        "offer_tier": offer.get("offer_tier", "")
+    }
+
+@app.get("/offers/{customer_id}")
+def get_offers(customer_id: str):
+    """
+    Precomputed pre-approved offer for a customer (run preapproval.py to build the table).
+    """
+    from preapproval import get_offer
+    crm_resp = get_crm(customer_id)
+    if isinstance(crm_resp, JSONResponse):
+        return crm_resp
+    offer = get_offer(crm_resp["customer_id"])
+    if not offer:
+        return JSONResponse(status_code=404, content={"error": "no pre-approved offer computed"})
+    return {
+        "customer_id": crm_resp["customer_id"],
+        "pre_approved_limit": int(float(offer.get("pre_approved_limit") or 0)),
+        "offer_tier": offer.get("offer_tier"),
+        "rate": float(offer.get("offer_rate") or 0),
+        "tenure_months": int(float(offer.get("offer_tenure_months") or 0)),
+        "computed_at": offer.get("computed_at")
     }
 
 @app.post("/crm/update")
@@ -261,6 +398,9 @@ def update_crm(update: dict = Body(...)):
     update = {"customer_id": "CUST_001", "phone": "9876543210", "name": "Manish Patra"}
     Updates data/applicants.csv in-place (simple). Requires server to have write access.
     """
+    import pandas as pd
+    from preapproval import recompute_customers
+    from identity import recompute_customers as recompute_identities
     cid = update.get("customer_id")
     if not cid:
         return JSONResponse(status_code=400, content={"error":"customer_id required"})
@@ -290,10 +430,24 @@ def update_crm(update: dict = Body(...)):
     except Exception as e:
         return JSONResponse(status_code=500, content={"error":"failed to save CSV", "detail": str(e)})
 
+    # refresh the pre-approved offer for this customer only (best-effort)
+    if any(k in update for k in ("income_monthly", "existing_emis", "credit_score")):
+        try:
+            recompute_customers(df.loc[[idx]])
+        except Exception:
+            pass
+    # re-normalize identity fields / KYC bits for this customer only (best-effort)
+    if any(k in update for k in ("name", "phone", "pan", "PAN", "aadhaar", "Aadhaar")):
+        try:
+            recompute_identities(df.loc[[idx]])
+        except Exception:
+            pass
+
     return {"status":"ok", "updated": update}
 
 @app.get("/credit/{customer_id}")
 def get_credit(customer_id: str):
+    import pandas as pd
     df = load_applicants_df()
     if df.empty:
         return JSONResponse(status_code=500, content={"error": "applicants CSV not found"})
@@ -302,14 +456,8 @@ def get_credit(customer_id: str):
     if row.empty:
         return JSONResponse(status_code=404, content={"error": "customer not found"})
     rec = row.iloc[0].to_dict()
-    credit = rec.get("credit_score")
-    if not credit or str(credit).strip() == "":
-        try:
-            inc = float(rec.get("income_monthly") or 30000)
-            credit = int(min(900, max(300, (inc / 1000) * 40)))
-        except:
-            credit = 650
-    return {"customer_id": rec.get("crm_customer_id") or rec.get("id"), "credit_score": int(float(credit))}
+    # local CSV/synthetic score or the bureau client (see credit_provider.py)
+    return get_credit_provider().get_credit(rec.get("crm_customer_id") or rec.get("id"), rec)
 
 @app.get("/status/{customer_id}")
 def get_status(customer_id: str):
@@ -320,7 +468,8 @@ def get_status(customer_id: str):
     header, rows = lines[0], lines[1:]
     for line in reversed(rows):
         parts = line.strip().split(",")
-        if len(parts) >= 3 and parts[1] == customer_id:
+        # http_call rows written before they dropped the customer_id are not a status
+        if len(parts) >= 3 and parts[1] == customer_id and parts[2] != "http_call":
             return {
                 "customer_id": customer_id,
                 "ts": parts[0],
@@ -332,10 +481,14 @@ def get_status(customer_id: str):
 # ------------------------
 # PDF generation
 # ------------------------
-def generate_sanction_pdf(decision_result: dict) -> str:
+SANCTION_TEMPLATE = os.environ.get("SANCTION_TEMPLATE", "1") != "0"
+
+def generate_sanction_pdf(decision_result: dict, filename: Optional[str] = None) -> str:
     """
     Generates a PDF sanction letter and returns the filename (not full path).
-    Stores in backend/pdfs/.
+    Stored by content hash under backend/pdfs/objects/ (see pdf_store.py); an
+    identical letter that is already stored is not rendered again. filename is
+    the PDF_STORE.plan() name, passed in when rendered as a background job.
     This version is defensive and raises RuntimeError with details on failure.
     """
     try:
@@ -343,80 +496,25 @@ def generate_sanction_pdf(decision_result: dict) -> str:
         if not isinstance(decision_result, dict):
             raise RuntimeError("generate_sanction_pdf expected dict, got: " + str(type(decision_result)))
 
-        cust_id = str(decision_result.get("customer_id") or (decision_result.get("crm") or {}).get("customer_id") or "UNKNOWN")
-        ts = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-        filename = f"sanction_{cust_id}_{ts}.pdf"
-        filepath = os.path.join(PDF_DIR, filename)
+        planned, digest, stored = PDF_STORE.plan(decision_result)
+        filename = os.path.basename(filename) if filename else planned
 
         # safety: ensure pdf dir exists and is writable
         os.makedirs(PDF_DIR, exist_ok=True)
         if not os.access(PDF_DIR, os.W_OK):
             raise RuntimeError(f"PDF_DIR not writable: {PDF_DIR}")
 
-        # PDF layout using reportlab
-        c = canvas.Canvas(filepath, pagesize=A4)
-        width, height = A4
-        margin = 20 * mm
-        x = margin
-        y = height - margin
-
-        # Header
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(x, y, "Sanction Letter")
-        y -= 12 * mm
-
-        c.setFont("Helvetica", 10)
-        c.drawString(x, y, f"Issue Date (UTC): {datetime.datetime.utcnow().isoformat()}")
-        y -= 8 * mm
-
-        crm = decision_result.get("crm") if isinstance(decision_result.get("crm"), dict) else {}
-        name = crm.get("name") or ""
-        phone = crm.get("phone") or ""
-        email = crm.get("email") or ""
-
-        lines = [
-            f"Customer ID: {cust_id}",
-            f"Name: {name}",
-            f"Phone: {phone}",
-            f"Email: {email}",
-            "",
-            "Loan Details:",
-            f"  - Loan Amount: {decision_result.get('loan_request', {}).get('loan_amount')}",
-            f"  - Tenure (months): {decision_result.get('loan_request', {}).get('tenure_months')}",
-            f"  - EMI: {decision_result.get('emi')}",
-            f"  - Decision: {decision_result.get('decision')}",
-            "",
-            "Notes:",
-        ]
-        reasons = decision_result.get("reasons") or []
-        if isinstance(reasons, list):
-            for r in reasons:
-                lines.append(f"  - {r}")
-        else:
-            lines.append(f"  - {str(reasons)}")
-
-        # Draw lines
-        c.setFont("Helvetica", 11)
-        for ln in lines:
-            if y < margin + 40:
-                c.showPage()
-                y = height - margin
-                c.setFont("Helvetica", 11)
-            # ensure line is a str
-            c.drawString(x, y, str(ln))
-            y -= 7 * mm
-
-        # Signature block
-        if y < margin + 40:
-            c.showPage()
-            y = height - margin
-        y -= 10 * mm
-        c.drawString(x, y, "Authorized Signatory")
-        y -= 5 * mm
-        c.drawString(x, y, "________________________")
-
-        c.showPage()
-        c.save()
+        if not stored:
+            # static layout comes from the cached template; SANCTION_TEMPLATE=0 redraws it with the canvas
+            if SANCTION_TEMPLATE:
+                data = get_template().render_bytes(decision_result)
+            else:
+                buf = io.BytesIO()
+                render_canvas(decision_result, buf)
+                data = buf.getvalue()
+            PDF_STORE.put(digest, data)
+        cust_id = str(decision_result.get("customer_id") or (decision_result.get("crm") or {}).get("customer_id") or "UNKNOWN")
+        PDF_STORE.record(cust_id, digest, filename, decision_result)
 
         return filename
 
@@ -437,60 +535,169 @@ def generate_sanction_pdf(decision_result: dict) -> str:
         raise RuntimeError(f"PDF generation failed: {str(e)}\nTRACE:\n{tb}")
 
 
+# background rendering: bounded process pool + on-disk job markers
+PDF_ASYNC = os.environ.get("PDF_ASYNC", "1") != "0"
+PDF_JOBS = PdfJobQueue(
+    PDF_DIR,
+    max_workers=int(os.environ.get("PDF_WORKERS", "2")),
+    max_pending=int(os.environ.get("PDF_MAX_PENDING", "64")),
+    locate=PDF_STORE.path_for,
+    keep_seconds=float(os.environ.get("PDF_JOB_KEEP_SECONDS", "3600")),
+)
+
+def queue_sanction_pdf(decision_result: dict, filename: str) -> str:
+    """Submit a sanction letter render; completion / failure is written to the audit log."""
+    customer_id = decision_result.get("customer_id")
+    correlation_id = current_id()  # the callbacks run outside the request
+
+    def on_done(job):
+        audit_log({
+            "ts": datetime.datetime.utcnow().isoformat(),
+            "customer_id": customer_id,
+            "action": "sanction_pdf_generated",
+            "data": job["filename"],
+            "correlation_id": correlation_id
+        })
+
+    def on_error(job, exc):
+        audit_log({
+            "ts": datetime.datetime.utcnow().isoformat(),
+            "customer_id": customer_id,
+            "action": "sanction_pdf_failed",
+            "data": f"job {job['job_id']}: {str(exc)[:2000]}",
+            "correlation_id": correlation_id
+        })
+
+    return PDF_JOBS.submit(generate_sanction_pdf, decision_result, filename, on_done=on_done, on_error=on_error)
+
+@app.get("/pdf/jobs/{job_id}")
+def pdf_job_status(job_id: str):
+    """Status of a background sanction letter job (known to the process that queued it)."""
+    job = PDF_JOBS.job(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    return {**job, "pdf_url": f"/pdf/{job['filename']}"}
+
+@app.get("/pdf/customer/{customer_id}")
+def customer_letters(customer_id: str):
+    """Every sanction letter stored for a customer (per-customer index of the PDF store)."""
+    return {"customer_id": customer_id,
+            "letters": [{**e, "pdf_url": f"/pdf/{e['filename']}"} for e in PDF_STORE.letters(customer_id)]}
+
+def _parse_range(range_header: str, size: int):
+    """Single "bytes=a-b" / "bytes=a-" / "bytes=-n" range -> (start, end) inclusive, or None if unsatisfiable."""
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not m or (m.group(1) == "" and m.group(2) == ""):
+        return None
+    if m.group(1) == "":
+        start, end = max(0, size - int(m.group(2))), size - 1
+    else:
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
 @app.get("/pdf/{filename}")
-def serve_pdf(filename: str):
+def serve_pdf(
+    filename: str,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+):
     """
-    Serve a generated PDF by filename. filename must exactly match file in backend/pdfs/.
+    Serve a generated PDF by filename (content-addressed names resolve into the sharded store).
+    Returns 202 + Retry-After while the letter is still being rendered. Content-addressed
+    letters never change, so they carry their digest as ETag with a one-year immutable
+    Cache-Control; If-None-Match answers 304 and single byte ranges answer 206.
     """
     safe_name = os.path.basename(filename)  # prevent path traversal
-    fullpath = os.path.join(PDF_DIR, safe_name)
-    if not os.path.exists(fullpath):
+    state = PDF_JOBS.file_state(safe_name)
+    if state == "pending":
+        return JSONResponse(status_code=202, content={"status": "pending", "pdf_url": f"/pdf/{safe_name}"},
+                            headers={"Retry-After": "1"})
+    if state == "failed":
+        return JSONResponse(status_code=500, content={"error": "pdf generation failed"})
+    fullpath = PDF_STORE.path_for(safe_name)
+    try:
+        st = os.stat(fullpath)
+    except OSError:
         return JSONResponse(status_code=404, content={"error": "file not found"})
-    return FileResponse(fullpath, media_type="application/pdf", filename=safe_name)
+
+    _cust, digest = parse_name(safe_name)
+    etag = f'"{digest}"' if digest else f'W/"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable" if digest else "no-cache",
+    }
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    if range_header and range_header.strip().startswith("bytes=") and (not if_range or if_range.strip() == etag):
+        rng = _parse_range(range_header, st.st_size)
+        if rng is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"})
+        start, end = rng
+        with open(fullpath, "rb") as f:
+            f.seek(start)
+            chunk = f.read(end - start + 1)
+        return Response(content=chunk, status_code=206, media_type="application/pdf",
+                        headers={**headers, "Content-Range": f"bytes {start}-{end}/{st.st_size}"})
+
+    return FileResponse(fullpath, media_type="application/pdf", filename=safe_name, headers=headers)
 
 # ------------------------
 # Simple KYC check (local)
 # ------------------------
-def kyc_check(customer_id: str) -> dict:
+KYC_CACHE = LRUCache(maxsize=int(os.environ.get("KYC_CACHE_SIZE", "10000")), name="kyc")
+
+def kyc_version(customer_id: str, ident: Optional[dict] = None) -> str:
+    """
+    Version of the fields KYC reads for one customer. The identity row (identity.py)
+    is rewritten by /crm/update only when name / phone / PAN / Aadhaar change, in any
+    worker; customers not ingested yet fall back to the whole CRM file version.
+    """
+    from identity import get_identity
+    ident = ident if ident is not None else get_identity(customer_id)
+    return f"identity:{ident['computed_at']}" if ident else f"crm:{crm_version()}"
+
+def kyc_check(customer_id: str, crm_resp=None) -> dict:
     """
     Lightweight KYC: checks presence of name, phone format, and simple PAN/Aadhaar patterns.
+    Ingested customers (identity.py) are a lookup of their precomputed flag bits;
+    others have their raw applicants.csv row run through the same normalization and
+    flag code (identity.normalize_identity + kyc_report.compute_kyc_flags), the one
+    the ingest, kyc_report.py and bulk_orchestrate.py use. Results are cached per
+    (customer, kyc_version), so the chat flow's /kyc and /orchestrate_apply share one.
+    crm_resp: an already fetched get_crm() result; a not-found response short-circuits.
     Returns dict: {"status": "PASS"/"FAIL", "missing": [...], "issues": [...]}
     """
-    res = {"status": "PASS", "missing": [], "issues": []}
-    crm_resp = get_crm(customer_id)
+    from identity import get_identity
     if isinstance(crm_resp, JSONResponse):
-        res["status"] = "FAIL"
-        res["issues"].append("CRM record not found")
-        return res
-    crm = crm_resp if isinstance(crm_resp, dict) else dict(crm_resp)
-
-    name = crm.get("name") or ""
-    phone = crm.get("phone") or ""
-    pan = crm.get("pan") or crm.get("PAN") or ""
-    aadhaar = crm.get("aadhaar") or crm.get("Aadhaar") or ""
-
-    if not name.strip():
-        res["missing"].append("name")
-    # phone: simple 10-digit check
-    if phone:
-        phone_digits = re.sub(r"\D", "", str(phone))
-        if len(phone_digits) != 10:
-            res["issues"].append("phone format invalid")
-    else:
-        res["missing"].append("phone")
-
-    # PAN simple regex (5 letters, 4 digits, 1 letter) - optional
-    if pan:
-        if not re.match(r"^[A-Z]{5}[0-9]{4}[A-Z]$", pan, flags=re.IGNORECASE):
-            res["issues"].append("pan format suspicious")
-    # Aadhaar: 12 digits
-    if aadhaar:
-        if not re.match(r"^\d{12}$", aadhaar):
-            res["issues"].append("aadhaar format suspicious")
-
-    if res["missing"] or res["issues"]:
-        res["status"] = "FAIL"
-    return res
+        return {"status": "FAIL", "missing": [], "issues": ["CRM record not found"]}
+    ident = get_identity(customer_id)
+    key = (str(customer_id), kyc_version(customer_id, ident))
+    res = KYC_CACHE.get(key)
+    if res is None:
+        res = _kyc_fields(customer_id, ident)
+        if "CRM record not found" not in res["issues"]:
+            KYC_CACHE.set(key, res)
+    # callers get their own lists; the cached entry stays untouched
+    return {**res, "missing": list(res["missing"]), "issues": list(res["issues"])}
+
+def _kyc_fields(customer_id: str, ident: Optional[dict] = None) -> dict:
+    import pandas as pd
+    from kyc_report import compute_kyc_flags, kyc_result
+    from identity import normalize_identity
+    if ident is not None:
+        return kyc_result(ident["kyc_code"])
+    # get_crm's /crm record carries no PAN / Aadhaar, so read the raw row
+    rec = find_applicant(customer_id)
+    if isinstance(rec, JSONResponse):
+        return {"status": "FAIL", "missing": [], "issues": ["CRM record not found"]}
+    flags = compute_kyc_flags(normalize_identity(pd.DataFrame([rec])))
+    return kyc_result(flags["code"].iloc[0])
 
 # ------------------------
 # /apply endpoint (same logic as before)
@@ -500,6 +707,14 @@ def apply(payload: dict = Body(...)):
     """
     Defensive /apply: validates inputs and handles missing/invalid CSV fields without raising.
     """
+    return underwrite(payload)
+
+def underwrite(payload: dict, crm_resp=None, credit_resp=None, audit=None):
+    """
+    Body of /apply. crm_resp / credit_resp are already fetched get_crm() / get_credit()
+    results (the async orchestration pulls both concurrently); missing ones are fetched here.
+    audit replaces audit_log for the decision row (batch runners collect rows and write them per chunk).
+    """
     # 1) get id
     customer_id = payload.get("customer_id") or payload.get("applicant_id") or payload.get("id")
     if not customer_id:
@@ -523,12 +738,14 @@ def apply(payload: dict = Body(...)):
         return JSONResponse(status_code=400, content={"error": "loan_amount and tenure_months must be > 0"})
 
     # 3) fetch crm and credit (these functions may return JSONResponse on error)
-    crm_resp = get_crm(customer_id)
+    if crm_resp is None:
+        crm_resp = get_crm(customer_id)
     if isinstance(crm_resp, JSONResponse):
         # pass-through CRM errors (404 or 500)
         return crm_resp
 
-    credit_resp = get_credit(customer_id)
+    if credit_resp is None:
+        credit_resp = get_credit(customer_id)
     if isinstance(credit_resp, JSONResponse):
         return credit_resp
 
@@ -593,7 +810,11 @@ def apply(payload: dict = Body(...)):
     # 8) underwriting decision (same rules)
     reasons = []
     decision = "REJECT"
-    if credit_score >= 700 and (dti is not None and dti <= 0.50):
+    if credit.get("degraded"):
+        # bureau unavailable: never auto-approve/reject without a score
+        decision = "REFER"
+        reasons.append("Credit bureau unavailable — manual review")
+    elif credit_score >= 700 and (dti is not None and dti <= 0.50):
         decision = "APPROVE"
         reasons.append("Good credit score and acceptable DTI")
     elif (credit_score >= 650 and (dti is not None and dti <= 0.65)) or (credit_score >= 600 and (dti is not None and dti <= 0.60)):
@@ -615,7 +836,7 @@ def apply(payload: dict = Body(...)):
 
     # 9) audit (best effort; ignore errors)
     try:
-        audit_log({
+        (audit or audit_log)({
             "ts": datetime.datetime.utcnow().isoformat(),
             "customer_id": customer_id,
             "action": f"apply_{decision.lower()}",
@@ -645,10 +866,118 @@ class NLPApplyReq(BaseModel):
     msg: str
     cust_id: Optional[str] = None
 
+# memoized replies: quick replies and marketing prefills repeat constantly
+NLP_REPLY_CACHE = LRUCache(maxsize=int(os.environ.get("NLP_CACHE_SIZE", "2048")), name="nlp_replies")
+
+SESSIONS = store_from_env()
+
+def nlp_cache_key(msg: str, cust_id: Optional[str]) -> tuple:
+    """Normalized message; CRM-dependent replies also key on the customer and CRM version."""
+    norm = " ".join((msg or "").lower().split())
+    if cust_id:
+        return (norm, str(cust_id), crm_version())
+    return (norm, None, None)
+
 @app.post("/nlp_apply")
 # >>> CHANGED / ADDED: updated nlp_apply to return EMI options for multiple tenures
 
 async def nlp_apply(body: dict = Body(...)):
+    """
+    Memoizing front of _nlp_apply: a repeated message (same customer and CRM version)
+    returns the stored reply without parsing, CRM lookup or EMI math.
+    With a "session_id" in the body, slots filled on earlier turns (amount, tenure,
+    purpose, ...) and the CRM record are kept server-side; each turn only parses the
+    new message and merges it in. The response then carries session_id and slots.
+    """
+    return await nlp_reply(body)
+
+async def nlp_reply(body: dict, on_stage=None):
+    """/nlp_apply; on_stage(stage, info) is passed on to _nlp_apply (not called for memoized replies)."""
+    try:
+        msg = body.get("message") if isinstance(body, dict) else getattr(body, "message", "") or ""
+        cust_id = body.get("cust_id") if isinstance(body, dict) else getattr(body, "cust_id", None)
+        session_id = body.get("session_id") if isinstance(body, dict) else getattr(body, "session_id", None)
+    except Exception:
+        msg, cust_id, session_id = "", None, None
+
+    session = None
+    if session_id:
+        # persisted sessions mean a SQLite read: keep it off the event loop
+        stored = await run_blocking(SESSIONS.get, session_id) if SESSIONS.db_path else SESSIONS.get(session_id)
+        session = stored or {"slots": {}, "turns": 0}
+        if cust_id:
+            session["cust_id"] = cust_id
+        cust_id = cust_id or session.get("cust_id")
+
+    # session replies depend on the slots filled so far, so they are part of the key
+    slots_before = tuple(sorted(session["slots"].items())) if session is not None else None
+    key = nlp_cache_key(msg, cust_id) + (slots_before,)
+    cached = NLP_REPLY_CACHE.get(key)
+    if cached is not None:
+        res, slots_after = cached
+    else:
+        res = await _nlp_apply({**body, "message": msg, "cust_id": cust_id}, session, on_stage)
+        slots_after = dict(session["slots"]) if session is not None else None
+        if isinstance(res, dict):
+            NLP_REPLY_CACHE.set(key, (res, slots_after))
+
+    if session is None or not isinstance(res, dict):
+        return res
+    session["slots"] = dict(slots_after)
+    session["turns"] = session.get("turns", 0) + 1
+    if SESSIONS.db_path:
+        await run_blocking(SESSIONS.save, session_id, session)
+    else:
+        SESSIONS.save(session_id, session)
+    return {**res, "session_id": session_id, "slots": session["slots"]}
+
+@app.post("/nlp_apply/stream")
+async def nlp_apply_stream(body: dict = Body(...)):
+    """
+    Streaming variant of /nlp_apply (text/event-stream), each event sent as its stage completes:
+      event: parsed   data: {"intent": ..., "fields": {...}}  right after parsing, while the CRM lookup runs
+      event: reply    data: {"reply": ...}
+      event: options  data: {"emi_options": [...], "quick_replies": [...]}
+      event: done     data: <the /nlp_apply response>
+      event: error    data: {"status_code": ..., "error": ...}
+    A memoized reply has no "parsed" event.
+    """
+    events = asyncio.Queue()
+    done = object()
+
+    def on_stage(stage, info):
+        # called on the event loop by _nlp_apply
+        events.put_nowait(sse_event(stage, info))
+
+    async def worker():
+        try:
+            res = await nlp_reply(body, on_stage)
+            if isinstance(res, dict):
+                events.put_nowait(sse_event("reply", {"reply": res.get("reply", "")}))
+                events.put_nowait(sse_event("options", {"emi_options": res.get("emi_options", []),
+                                                        "quick_replies": res.get("quick_replies", [])}))
+                events.put_nowait(sse_event("done", res))
+            else:
+                events.put_nowait(sse_event("error", {"status_code": getattr(res, "status_code", 500)}))
+        except Exception as e:
+            events.put_nowait(sse_event("error", {"status_code": 500, "error": "nlp_internal_error", "detail": str(e)}))
+        finally:
+            events.put_nowait(done)
+
+    task = asyncio.ensure_future(worker())
+
+    async def generate():
+        while True:
+            item = await events.get()
+            if item is done:
+                await task
+                return
+            yield item
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _nlp_apply(body: dict, session: Optional[dict] = None, on_stage=None):
     """
     Expects body to contain:
       - message (str)
@@ -658,7 +987,16 @@ async def nlp_apply(body: dict = Body(...)):
       - quick_replies (list)
       - decision (dict)
       - emi_options (list of {tenure_months, emi})
+    on_stage("parsed", {"intent", "fields"}) is called once the message is parsed,
+    before the CRM lookup (started concurrently) is awaited.
     """
+    def emit(stage, **info):
+        if on_stage is not None:
+            try:
+                on_stage(stage, info)
+            except Exception:
+                pass
+
     # read inputs (support both pydantic model or raw dict)
     try:
         msg = body.get("message") if isinstance(body, dict) else getattr(body, "message", "") or ""
@@ -689,94 +1027,51 @@ async def nlp_apply(body: dict = Body(...)):
             opts.append({"tenure_months": n, "emi": e})
         return opts
 
-    # Try to load CRM if cust_id provided (non-blocking)
+    # Load CRM if cust_id provided: started now, awaited after parsing; sessions reuse
+    # the record until the CRM file changes
     crm = None
-    try:
-        if cust_id:
-            # get_crm should be in your file; keep call but don't crash if absent
-            try:
-                crm = get_crm(cust_id)
-            except Exception:
-                crm = None
-    except Exception:
-        crm = None
+    crm_task = None
+    crm_key = [str(cust_id), crm_version()] if cust_id else None
+    if session is not None and crm_key and session.get("crm_key") == crm_key:
+        crm = session.get("crm")
+    elif cust_id:
+        crm_task = asyncio.ensure_future(run_blocking(get_crm, cust_id))
+
+    async def load_crm():
+        nonlocal crm
+        if crm_task is None:
+            return
+        try:
+            crm = await crm_task
+        except Exception:
+            crm = None
+        if session is not None and isinstance(crm, dict):
+            session["crm"] = crm
+            session["crm_key"] = crm_key
 
     # Simple hesitation recovery (keeps UX friendly)
-    if any(w in (msg or "").lower() for w in ["too high", "too expensive", "expensive", "can't afford", "cant afford", "costly"]):
+    if detect_intent(msg) == "hesitation":
+        emit("parsed", intent="hesitation", fields={})
+        await load_crm()
         friendly = "No worries — we can try a longer tenure or a lower amount to reduce EMI. Want me to show options?"
         return {"reply": friendly, "quick_replies": ["Show lower EMI", "Show longer tenure options", "Keep same plan"]}
 
-        # --- improved amount parsing (supports 'lakh', 'k', commas, ₹ symbol etc.) ---
-        # --- Robust amount + tenure parsing (replace older token-based parser) ---
-        # --- FINAL robust amount + tenure parsing ---
-    import re
-
-    amount = None
-    tenure_months = None
-    purpose = None
-
-    s = (msg or "").strip()
-    s_lower = s.lower()
-    s_clean = s_lower.replace('₹', ' ').replace(',', ' ')
-    s_clean = re.sub(r'\s+', ' ', s_clean).strip()
-
-    # Pattern 1: "4 lakh", "4 lakhs", "4lakh", "4lakhs"
-    match = re.search(r'(\d+(?:\.\d+)?)\s*(lakh|lakhs|lac|lacs|l)\b', s_clean)
-    if match:
-        try:
-            amount = float(match.group(1)) * 100000
-        except:
-            amount = None
-
-    # Pattern 2: "4,00,000" or "400000" or "4 00 000"
-    if amount is None:
-        m = re.search(r'(\d{1,3}(?:[ ,]?\d{2,3}){1,3})', s_clean)
-        if m:
-            try:
-                cleaned = re.sub(r'[ ,]', '', m.group(1))
-                amount = float(cleaned)
-            except:
-                amount = None
-
-    # Pattern 3: "50k" or "50 k" or "50K"
-    if amount is None:
-        m = re.search(r'(\d+(?:\.\d+)?)\s*[kK]\b', s_clean)
-        if m:
-            try:
-                amount = float(m.group(1)) * 1000
-            except:
-                amount = None
-
-    # Pattern 4: any number >= 1000 (fallback)
-    if amount is None:
-        m = re.search(r'\b(\d{4,})\b', s_clean)
-        if m:
-            try:
-                amount = float(m.group(1))
-            except:
-                pass
-
-    # tenure (years / months)
-    m = re.search(r'(\d+(?:\.\d+)?)\s*(year|years|yr|yrs)\b', s_clean)
-    if m:
-        try:
-            tenure_months = int(float(m.group(1)) * 12)
-        except:
-            tenure_months = None
-    else:
-        m2 = re.search(r'(\d+(?:\.\d+)?)\s*(month|months|mo|mos)\b', s_clean)
-        if m2:
-            try:
-                tenure_months = int(float(m2.group(1)))
-            except:
-                tenure_months = None
-
-    # Purpose keywords
-    for word in ["wedding", "marriage", "medical", "education", "business", "home", "car", "travel"]:
-        if word in s_clean:
-            purpose = word
-            break
-
+    # single-pass extraction (amount / tenure / purpose; lakh, k, ₹ and commas handled)
+    fields = extract_fields(msg)
+    if session is not None:
+        # merge this turn's delta into the slots filled so far
+        slots = session.setdefault("slots", {})
+        for k in ("customer_id", "loan_amount", "tenure_months", "income_monthly", "purpose"):
+            if fields.get(k) is not None:
+                slots[k] = fields[k]
+        if fields.get("existing_monthly_debt"):
+            slots["existing_monthly_debt"] = fields["existing_monthly_debt"]
+        fields = {**fields, **slots}
+    emit("parsed", intent="loan_interest" if fields["loan_amount"] else None, fields=fields)
+    await load_crm()
+    amount = fields["loan_amount"]
+    tenure_months = fields["tenure_months"]
+    purpose = fields["purpose"]
 
     # default demo rate and tenure if not provided
     demo_rate = 12.0
@@ -854,10 +1149,393 @@ async def nlp_apply(body: dict = Body(...)):
     }
 # <<< END CHANGED
 
+# ------------------------
+# Batch NLP parsing (offline backfills)
+# ------------------------
+NLP_BATCH_WORKERS = int(os.environ.get("NLP_BATCH_WORKERS", str(os.cpu_count() or 2)))
+NLP_BATCH_CHUNK = 500          # messages per pool task
+NLP_BATCH_INLINE_MAX = 200     # smaller batches are parsed in-process
+NLP_FIELDS = ["customer_id", "loan_amount", "tenure_months", "income_monthly", "existing_monthly_debt", "purpose"]
+_nlp_pool = None
+_nlp_pool_lock = threading.Lock()
+
+def get_nlp_pool() -> ProcessPoolExecutor:
+    """Shared process pool for batch parsing (created on first use)."""
+    global _nlp_pool
+    with _nlp_pool_lock:
+        if _nlp_pool is None:
+            _nlp_pool = ProcessPoolExecutor(max_workers=NLP_BATCH_WORKERS)
+    return _nlp_pool
+
+def _batch_records(body: bytes, content_type: str) -> list:
+    """
+    Normalize the upload into [{"id": ..., "message": ...}].
+    JSON body: list of strings/objects, or {"messages": [...]}.
+    JSONL body (application/x-ndjson, text/plain): one JSON value per line, or raw text lines.
+    Objects may carry the text as "message", "msg" or "prefill" (as logged by /log_event).
+    """
+    def record(i, item):
+        if isinstance(item, dict):
+            data = item.get("data")
+            if isinstance(data, str) and data.startswith("{"):
+                # raw audit row from /log_event: prefill lives inside the JSON data column
+                try:
+                    item = {**json.loads(data), **item}
+                except Exception:
+                    pass
+            text = item.get("message") or item.get("msg") or item.get("prefill") or ""
+            return {"id": item.get("id", i), "message": str(text)}
+        return {"id": i, "message": "" if item is None else str(item)}
+
+    if "json" in content_type and "ndjson" not in content_type and "jsonl" not in content_type:
+        items = json.loads(body or b"[]")
+        if isinstance(items, dict):
+            items = items.get("messages", [])
+        return [record(i, it) for i, it in enumerate(items)]
+
+    out = []
+    for i, line in enumerate(body.decode("utf-8", errors="replace").splitlines()):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = line
+        out.append(record(i, item))
+    return out
+
+@app.post("/nlp/parse_batch")
+async def nlp_parse_batch(request: Request):
+    """
+    Run the chat extraction engine over many messages in one request.
+    Streams JSONL back: one {"id", "message", "fields"} line per message, then a final
+    {"summary": {"count", "hit_rates": {field: share of messages where it was found}}} line.
+    Large batches are split into chunks and parsed in a process pool.
+    """
+    try:
+        records = _batch_records(await request.body(), request.headers.get("content-type", ""))
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": "invalid batch body", "detail": str(e)})
+
+    messages = [r["message"] for r in records]
+    chunks = [messages[i:i + NLP_BATCH_CHUNK] for i in range(0, len(messages), NLP_BATCH_CHUNK)]
+
+    def generate():
+        hits = {f: 0 for f in NLP_FIELDS}
+        if len(messages) <= NLP_BATCH_INLINE_MAX:
+            results = iter([parse_batch(c) for c in chunks])
+        else:
+            results = get_nlp_pool().map(parse_batch, chunks)
+        idx = 0
+        for chunk_result in results:
+            lines = []
+            for fields in chunk_result:
+                for f in NLP_FIELDS:
+                    if fields.get(f) not in (None, 0.0):
+                        hits[f] += 1
+                rec = records[idx]
+                lines.append(json.dumps({"id": rec["id"], "message": rec["message"], "fields": fields}, ensure_ascii=False))
+                idx += 1
+            yield "\n".join(lines) + "\n"
+        n = len(messages)
+        summary = {"count": n, "hit_rates": {f: (round(hits[f] / n, 4) if n else 0.0) for f in NLP_FIELDS}}
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.on_event("shutdown")
+def _shutdown_nlp_pool():
+    if _nlp_pool is not None:
+        _nlp_pool.shutdown(wait=False, cancel_futures=True)
+    PDF_JOBS.shutdown()
+    IO_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    ORCH_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
 # Orchestrator endpoint
 # ------------------------
+# completed orchestration results by idempotency key; duplicates in flight share one run
+ORCH_RESULTS = LRUCache(
+    maxsize=int(os.environ.get("ORCH_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("ORCH_CACHE_TTL", "600")),
+    name="orchestrate_results",
+)
+ORCH_INFLIGHT = SingleFlight()
+
+def _application_parts(payload: dict) -> list:
+    """Customer, amount, tenure and debt of an orchestration request."""
+    def num(x):
+        try:
+            return float(x or 0)
+        except Exception:
+            return str(x)
+    customer_id = payload.get("customer_id") or payload.get("applicant_id") or payload.get("id")
+    return [
+        str(customer_id),
+        num(payload.get("loan_amount")),
+        num(payload.get("tenure_months")),
+        num(payload.get("existing_monthly_debt")),
+    ]
+
+def orchestrate_idempotency_key(payload: dict) -> str:
+    """Derive a key from customer, amount, tenure, debt and the CRM version."""
+    parts = _application_parts(payload) + [crm_version()]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+def orchestrate_fingerprint(payload: dict) -> str:
+    """What an idempotency key is bound to: the same key with another fingerprint is rejected."""
+    return hashlib.sha256(json.dumps(_application_parts(payload)).encode("utf-8")).hexdigest()
+
+def _idempotency_conflict(key: str) -> JSONResponse:
+    return JSONResponse(status_code=422, content={
+        "error": "idempotency_key_reused",
+        "detail": f"Idempotency-Key {key} was already used for a different application (customer, amount, tenure or debt)"
+    })
+
+def cached_orchestration(key: str, fingerprint: str):
+    """(result, True) for a remembered result, a 422 pair if it was for another payload, else None."""
+    hit = ORCH_RESULTS.get(key)
+    if hit is None:
+        return None
+    stored_fingerprint, res = hit
+    if stored_fingerprint != fingerprint:
+        return _idempotency_conflict(key), False
+    return res, True
+
+def run_orchestration(payload: dict, key: str, on_stage=None, prefetch: bool = False):
+    """
+    Cached / coalesced orchestration. Returns (result, replayed).
+    on_stage only fires for the caller that actually runs the stages.
+    A key reused with a different payload gets a 422 response as result.
+    With prefetch, the run starts with prefetch_applicant(); that is inside the
+    coalesced call, so concurrent duplicates share one CRM read and bureau pull.
+    """
+    fingerprint = orchestrate_fingerprint(payload)
+
+    def run():
+        # a duplicate arriving just after the previous run finished finds its result here
+        hit = ORCH_RESULTS.get(key)
+        if hit is not None:
+            return hit, True
+        customer_id = payload.get("customer_id") or payload.get("applicant_id") or payload.get("id")
+        prefetched = prefetch_applicant(customer_id) if prefetch and customer_id else None
+        res = _orchestrate_apply(payload, on_stage, prefetched)
+        # only successful results are remembered; errors and bureau-degraded referrals can be retried
+        dec = res.get("decision") if isinstance(res, dict) else None
+        degraded = isinstance(dec, dict) and (dec.get("credit") or {}).get("degraded")
+        if isinstance(res, dict) and not degraded:
+            ORCH_RESULTS.set(key, (fingerprint, res))
+        return (fingerprint, res), False
+
+    cached = cached_orchestration(key, fingerprint)
+    if cached is not None:
+        return cached
+    ((stored_fingerprint, res), from_cache), shared = ORCH_INFLIGHT.do(key, run)
+    if stored_fingerprint != fingerprint:
+        return _idempotency_conflict(key), False
+    return res, from_cache or shared
+
+def prefetch_applicant(customer_id: str) -> dict:
+    """
+    CRM record and credit pull run concurrently on IO_EXECUTOR while this (ORCH_EXECUTOR)
+    thread runs the KYC field checks as soon as the CRM record arrives; a KYC failure
+    does not wait for the bureau. Anything that failed is left out and fetched again
+    (with full error handling) by _orchestrate_apply.
+    """
+    crm_f = submit_blocking(get_crm, customer_id)
+    credit_f = submit_blocking(get_credit, customer_id)
+    pre = {}
+    try:
+        pre["crm"] = crm_f.result()
+        pre["kyc"] = kyc_check(customer_id, pre["crm"])
+    except Exception:
+        pre.pop("crm", None)
+    if pre.get("kyc", {}).get("status") == "FAIL":
+        credit_f.cancel()
+        return pre
+    try:
+        pre["credit"] = credit_f.result()
+    except Exception:
+        pass
+    return pre
+
+async def run_orchestration_async(payload: dict, key: str, on_stage=None):
+    """run_orchestration on ORCH_EXECUTOR, with the lookups prefetched concurrently; nothing blocks the loop."""
+    cached = cached_orchestration(key, orchestrate_fingerprint(payload))
+    if cached is not None:
+        return cached
+    return await run_blocking(run_orchestration, payload, key, on_stage, True, executor=ORCH_EXECUTOR)
+
 @app.post("/orchestrate_apply")
-def orchestrate_apply(payload: dict = Body(...)):
+async def orchestrate_apply(payload: dict = Body(...), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Idempotent wrapper around the orchestration.
+    Key = Idempotency-Key header, payload["idempotency_key"], or derived from the request.
+    A completed result for the same key is returned without recomputation (no new
+    PDF, audit or metrics rows); concurrent duplicates wait for the first run.
+    Reusing a key for a different customer, amount, tenure or debt returns 422.
+    """
+    key = idempotency_key or payload.get("idempotency_key") or orchestrate_idempotency_key(payload)
+    result, replayed = await run_orchestration_async(payload, key)
+    if isinstance(result, dict):
+        return {**result, "idempotency_key": key, "replayed": replayed}
+    return result
+
+# ------------------------
+# Application jobs (202 Accepted + status polling)
+# ------------------------
+def _run_application_job(payload: dict, key: Optional[str], on_stage=None) -> dict:
+    """
+    Queue worker: the same idempotent orchestration as /orchestrate_apply. Stage
+    events go to on_stage (the job's stages list) as in /orchestrate_apply/stream.
+    """
+    payload = dict(payload)
+    correlation_id = payload.pop("correlation_id", "")
+    key = key or orchestrate_idempotency_key(payload)
+    seen = []
+
+    def report(stage, info):
+        seen.append(stage)
+        if on_stage is not None:
+            on_stage(stage, info)
+
+    with correlated(correlation_id):
+        result, replayed = run_orchestration(payload, key, report)
+    if isinstance(result, dict):
+        # replayed / coalesced runs never called on_stage; record the stages now
+        for stage, info in _stages_from_result(result):
+            if stage not in seen:
+                report(stage, info)
+    if not isinstance(result, dict):
+        try:
+            body = json.loads(result.body)
+        except Exception:
+            body = {}
+        raise RuntimeError(f"{getattr(result, 'status_code', 500)} {body.get('error', 'orchestration failed')}: {body.get('detail', '')}".strip(": "))
+    return {**result, "idempotency_key": key, "replayed": replayed}
+
+APPLICATIONS = queue_from_env(_run_application_job)
+
+@app.on_event("startup")
+def _start_application_workers():
+    APPLICATIONS.start()
+
+@app.on_event("shutdown")
+def _stop_application_workers():
+    APPLICATIONS.stop()
+
+@app.post("/applications")
+def submit_application(payload: dict = Body(...), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Queue an orchestration and return 202 with a job id right away; poll
+    GET /applications/{job_id} for the result. The same idempotency key returns the
+    existing job, or queues it again if it failed. 503 + Retry-After when the queue is full.
+    """
+    customer_id = payload.get("customer_id") or payload.get("applicant_id") or payload.get("id")
+    if not customer_id:
+        return JSONResponse(status_code=400, content={"error": "missing customer_id in payload"})
+    key = idempotency_key or payload.get("idempotency_key") or orchestrate_idempotency_key(payload)
+    try:
+        # the id travels with the job, so the worker's audit / metrics rows carry it too
+        job = APPLICATIONS.submit({**payload, "correlation_id": current_id()}, key)
+    except QueueFull as e:
+        return JSONResponse(status_code=503, content={"error": "application queue full", "detail": str(e)},
+                            headers={"Retry-After": "5"})
+    audit_log({
+        "ts": datetime.datetime.utcnow().isoformat(),
+        "customer_id": customer_id,
+        "action": "application_queued",
+        "data": f"job:{job['job_id']};status:{job['status']}"
+    })
+    status_url = f"/applications/{job['job_id']}"
+    return JSONResponse(status_code=202, content={**job, "status_url": status_url},
+                        headers={"Location": status_url, "Retry-After": "1"})
+
+@app.get("/applications/{job_id}")
+def application_status(job_id: str):
+    """
+    queued (with position) | running | done (with result) | failed (with error);
+    "stages" lists the stage events (kyc, underwriting, pdf, metrics) finished so far.
+    """
+    job = APPLICATIONS.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    if job["status"] in ("queued", "running"):
+        return JSONResponse(status_code=200, content=job, headers={"Retry-After": "1"})
+    return job
+
+# ------------------------
+# Server-Sent Events (streaming replies / orchestration progress)
+# ------------------------
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _stages_from_result(result: dict) -> list:
+    """Stage events reconstructed from a finished (cached or coalesced) result."""
+    kyc = result.get("kyc") or {}
+    dec = result.get("decision")
+    decision = dec.get("decision") if isinstance(dec, dict) else dec
+    stages = [("kyc", {"status": kyc.get("status"), "kyc": kyc})]
+    if kyc.get("status") != "FAIL":
+        stages.append(("underwriting", {"status": decision, "decision": dec}))
+        pdf_status = ("queued" if result.get("pdf_status") == "pending" else "generated") if result.get("pdf_url") else "skipped"
+        stages.append(("pdf", {"status": pdf_status, "pdf_url": result.get("pdf_url"), "pdf_job_id": result.get("pdf_job_id")}))
+    stages.append(("metrics", {"status": "done"}))
+    return stages
+
+@app.post("/orchestrate_apply/stream")
+async def orchestrate_apply_stream(payload: dict = Body(...), idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Same as /orchestrate_apply but streams text/event-stream:
+      event: stage   data: {"stage": "kyc"|"underwriting"|"pdf"|"metrics", "status": ..., ...}
+      event: result  data: <the /orchestrate_apply response>
+      event: error   data: {"status_code": ..., "error": ...}
+    One stage event is sent as each stage finishes.
+    """
+    key = idempotency_key or payload.get("idempotency_key") or orchestrate_idempotency_key(payload)
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    done = object()
+    seen = []
+
+    def on_stage(stage, info):
+        # called on an ORCH_EXECUTOR thread
+        seen.append(stage)
+        loop.call_soon_threadsafe(events.put_nowait, sse_event("stage", {"stage": stage, **info}))
+
+    async def worker():
+        try:
+            result, replayed = await run_orchestration_async(payload, key, on_stage)
+            if isinstance(result, dict):
+                # replayed / coalesced runs never called on_stage; send the stages now
+                for stage, info in _stages_from_result(result):
+                    if stage not in seen:
+                        events.put_nowait(sse_event("stage", {"stage": stage, **info}))
+                events.put_nowait(sse_event("result", {**result, "idempotency_key": key, "replayed": replayed}))
+            else:
+                try:
+                    body = json.loads(result.body)
+                except Exception:
+                    body = {"error": "orchestration failed"}
+                events.put_nowait(sse_event("error", {"status_code": getattr(result, "status_code", 500), **body}))
+        except Exception as e:
+            events.put_nowait(sse_event("error", {"status_code": 500, "error": "orchestrate_internal_error", "detail": str(e)}))
+        finally:
+            events.put_nowait(done)
+
+    task = asyncio.ensure_future(worker())
+
+    async def generate():
+        while True:
+            item = await events.get()
+            if item is done:
+                await task
+                return
+            yield item
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _orchestrate_apply(payload: dict, on_stage=None, prefetched: Optional[dict] = None):
     """
     Runs: KYC -> Underwriting (/apply) -> PDF gen if approved -> audit -> metrics.
     Returns structured response:
@@ -867,15 +1545,26 @@ def orchestrate_apply(payload: dict = Body(...)):
         "pdf_url": "/pdf/...." or None
       }
     Defensive: catches errors, writes audit entries, and returns JSONResponse on failures.
+    on_stage(stage, info) is called as each stage (kyc, underwriting, pdf, metrics) finishes.
+    prefetched may carry "crm", "credit" and "kyc" from prefetch_applicant().
     """
+    def emit(stage, **info):
+        if on_stage is not None:
+            try:
+                on_stage(stage, info)
+            except Exception:
+                pass
+
     try:
         customer_id = payload.get("customer_id") or payload.get("applicant_id") or payload.get("id")
         if not customer_id:
             return JSONResponse(status_code=400, content={"error": "missing customer_id in payload"})
 
+        pre = prefetched or {}
+
         # 1) Run local KYC
         try:
-            kyc_res = kyc_check(customer_id)
+            kyc_res = pre["kyc"] if "kyc" in pre else kyc_check(customer_id, pre.get("crm"))
         except Exception as e:
             # KYC check itself failed unexpectedly
             tb = traceback.format_exc()
@@ -885,7 +1574,9 @@ def orchestrate_apply(payload: dict = Body(...)):
                 "action": "orchestrate_kyc_error",
                 "data": f"{str(e)} | TRACE: {tb[:2000]}"
             })
+            emit("kyc", status="error")
             return JSONResponse(status_code=500, content={"error": "kyc_check_failed", "detail": str(e), "trace": tb})
+        emit("kyc", status=kyc_res.get("status"), kyc=kyc_res)
 
         if kyc_res.get("status") == "FAIL":
             # Log and return a REFER result (no underwriting / pdf)
@@ -905,6 +1596,7 @@ def orchestrate_apply(payload: dict = Body(...)):
                 append_metrics_row(decision_result)
             except Exception:
                 pass
+            emit("metrics", status="done")
             return {
                 "customer_id": customer_id,
                 "kyc": kyc_res,
@@ -921,7 +1613,7 @@ def orchestrate_apply(payload: dict = Body(...)):
             "existing_monthly_debt": payload.get("existing_monthly_debt", 0)
         }
         try:
-            decision_result = apply(apply_req)
+            decision_result = underwrite(apply_req, pre.get("crm"), pre.get("credit"))
             # if apply returned a JSONResponse (error), try to parse
             if isinstance(decision_result, JSONResponse):
                 try:
@@ -939,6 +1631,7 @@ def orchestrate_apply(payload: dict = Body(...)):
                 "action": "orchestrate_underwriting_error",
                 "data": f"{str(e)} | TRACE: {tb[:2000]}"
             })
+            emit("underwriting", status="error")
             return JSONResponse(status_code=502, content={"error": "underwriting_failed", "detail": str(e), "trace": tb})
 
         # Safety: ensure we have a dict
@@ -955,12 +1648,42 @@ def orchestrate_apply(payload: dict = Body(...)):
                 })
                 return JSONResponse(status_code=500, content={"error": "unexpected_underwriting_result_type", "type": str(type(decision_result))})
 
-        # 3) If approved -> generate PDF and return link
+        emit("underwriting", status=decision_result.get("decision"), decision=decision_result)
+
+        # 3) If approved -> reuse an identical stored letter, or queue the PDF render and
+        #    return its link right away (rendered inline when async rendering is off or the queue is full)
         pdf_url = None
+        pdf_job_id = None
+        pdf_status = None
         if decision_result.get("decision") == "APPROVE":
+            filename, _digest, stored = PDF_STORE.plan(decision_result)
+            if stored or PDF_JOBS.file_state(filename) == "pending":
+                pdf_url = f"/pdf/{filename}"
+                pdf_status = "ready" if stored else "pending"
+                audit_log({
+                    "ts": datetime.datetime.utcnow().isoformat(),
+                    "customer_id": customer_id,
+                    "action": "sanction_pdf_reused",
+                    "data": filename
+                })
+            elif PDF_ASYNC:
+                try:
+                    pdf_job_id = queue_sanction_pdf(decision_result, filename)
+                    pdf_url = f"/pdf/{filename}"
+                    pdf_status = "pending"
+                    audit_log({
+                        "ts": datetime.datetime.utcnow().isoformat(),
+                        "customer_id": customer_id,
+                        "action": "sanction_pdf_queued",
+                        "data": f"{filename};job:{pdf_job_id}"
+                    })
+                except Exception:
+                    pdf_job_id = None
+        if decision_result.get("decision") == "APPROVE" and pdf_url is None:
             try:
-                filename = generate_sanction_pdf(decision_result)
+                filename = generate_sanction_pdf(decision_result, filename)
                 pdf_url = f"/pdf/{filename}"
+                pdf_status = "ready"
                 audit_log({
                     "ts": datetime.datetime.utcnow().isoformat(),
                     "customer_id": customer_id,
@@ -976,20 +1699,27 @@ def orchestrate_apply(payload: dict = Body(...)):
                     "data": f"{str(e)} | TRACE: {tb[:2000]}"
                 })
                 # return error but include the decision result so frontend can show it
+                emit("pdf", status="error")
                 return JSONResponse(status_code=500, content={"error": "pdf_generation_failed", "detail": str(e), "trace": tb, "decision": decision_result})
 
+        emit("pdf", status={"pending": "queued", "ready": "generated"}.get(pdf_status, "skipped"),
+             pdf_url=pdf_url, pdf_job_id=pdf_job_id)
+
         # 4) append metrics (best-effort)
         try:
             append_metrics_row(decision_result)
         except Exception:
             # don't fail the request if metrics write fails
             pass
+        emit("metrics", status="done")
 
         # 5) final response
         return {
             "decision": decision_result,
             "kyc": kyc_res,
-            "pdf_url": pdf_url
+            "pdf_url": pdf_url,
+            "pdf_status": pdf_status,
+            "pdf_job_id": pdf_job_id
         }
 
     except Exception as e:
@@ -1009,36 +1739,45 @@ def orchestrate_apply(payload: dict = Body(...)):
 # --- metrics setup ---
 METRICS_FILE = os.path.join(os.path.dirname(__file__), "metrics.csv")
 
+METRICS_HEADER = "ts,customer_id,decision,emi,dti,credit_score,loan_amount,tenure_months,correlation_id,elapsed_ms"
+
 def ensure_metrics_file():
-    if not os.path.exists(METRICS_FILE):
-        # write header
-        with open(METRICS_FILE, "w", encoding="utf-8") as f:
-            f.write("ts,customer_id,decision,emi,dti,credit_score,loan_amount,tenure_months\n")
+    # header is written under the append lock, so concurrent workers cannot write it twice
+    append_lines(METRICS_FILE, [], header=METRICS_HEADER)
+
+def metrics_line(decision_result: dict) -> str:
+    """One METRICS_FILE row for a decision."""
+    ts = datetime.datetime.utcnow().isoformat()
+    cust = decision_result.get("customer_id") if isinstance(decision_result, dict) else "UNKNOWN"
+    decision = decision_result.get("decision") if isinstance(decision_result, dict) else "UNKNOWN"
+    emi = decision_result.get("emi") if isinstance(decision_result, dict) else ""
+    dti = decision_result.get("dti") if isinstance(decision_result, dict) else ""
+    credit = (decision_result.get("credit_score") if isinstance(decision_result, dict) else "") or (decision_result.get("credit",{}).get("credit_score") if isinstance(decision_result.get("credit",{}), dict) else "")
+    loan_amount = (decision_result.get("loan_request", {}) or {}).get("loan_amount", "")
+    tenure = (decision_result.get("loan_request", {}) or {}).get("tenure_months", "")
+
+    # safe formatting: replace commas to avoid CSV break
+    def clean(x):
+        if x is None:
+            return ""
+        s = str(x)
+        return s.replace(",", "")
+    # correlation id of the call that made the decision, and ms into that call when it was recorded
+    return ",".join([clean(ts), clean(cust), clean(decision), clean(emi), clean(dti), clean(credit), clean(loan_amount), clean(tenure),
+                     clean(current_id()), clean(elapsed_ms())])
+
+def append_metrics_lines(lines: list):
+    """Append several metrics_line() rows as one locked write (batch runners)."""
+    if not lines:
+        return
+    append_lines(METRICS_FILE, lines, header=METRICS_HEADER)
 
 def append_metrics_row(decision_result: dict):
     """
     Append one row to metrics CSV with key fields for dashboards/slides.
     """
     try:
-        ensure_metrics_file()
-        ts = datetime.datetime.utcnow().isoformat()
-        cust = decision_result.get("customer_id") if isinstance(decision_result, dict) else "UNKNOWN"
-        decision = decision_result.get("decision") if isinstance(decision_result, dict) else "UNKNOWN"
-        emi = decision_result.get("emi") if isinstance(decision_result, dict) else ""
-        dti = decision_result.get("dti") if isinstance(decision_result, dict) else ""
-        credit = (decision_result.get("credit_score") if isinstance(decision_result, dict) else "") or (decision_result.get("credit",{}).get("credit_score") if isinstance(decision_result.get("credit",{}), dict) else "")
-        loan_amount = (decision_result.get("loan_request", {}) or {}).get("loan_amount", "")
-        tenure = (decision_result.get("loan_request", {}) or {}).get("tenure_months", "")
-
-        # safe formatting: replace commas to avoid CSV break
-        def clean(x):
-            if x is None:
-                return ""
-            s = str(x)
-            return s.replace(",", "")
-        row = ",".join([clean(ts), clean(cust), clean(decision), clean(emi), clean(dti), clean(credit), clean(loan_amount), clean(tenure)])
-        with open(METRICS_FILE, "a", encoding="utf-8") as f:
-            f.write(row + "\n")
+        append_lines(METRICS_FILE, [metrics_line(decision_result)], header=METRICS_HEADER)
     except Exception as e:
         # don't crash the app for metrics errors — write to audit if possible
         try:
@@ -1081,7 +1820,9 @@ def get_metrics(limit: int = Query(100, ge=1, le=1000)):
     rows = []
     for ln in lines[1:]:
         parts = ln.split(",")
-        row = dict(zip(header, parts + [""] * max(0, len(header)-len(parts))))
+        # rows appended before the header upgrade (file_append.append_lines) may be short
+        cols = header if len(parts) <= len(header) else METRICS_HEADER.split(",")
+        row = dict(zip(cols, parts + [""] * max(0, len(cols)-len(parts))))
         rows.append(row)
     # reverse for newest first
     rows = list(reversed(rows))
@@ -1095,7 +1836,7 @@ def get_metrics(limit: int = Query(100, ge=1, le=1000)):
             d = "UNKNOWN"
         summary[d] = summary.get(d, 0) + 1
 
-    return {"count": len(rows), "summary": summary, "rows": limited}
+    return FastJSONResponse({"count": len(rows), "summary": summary, "rows": limited})
 
 @app.get("/metrics/download")
 def download_metrics():
@@ -1112,45 +1853,27 @@ from fastapi import Query
 from typing import Optional
 
 def read_audit_rows():
-    """Return list of audit rows as dicts (ts, customer_id, action, data)."""
+    """Return list of audit rows as dicts (ts, customer_id, action, data, correlation_id)."""
     if not os.path.exists(AUDIT_FILE):
         return []
-    rows = []
-    with open(AUDIT_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    if len(lines) <= 1:
+    with open(AUDIT_FILE, "r", encoding="utf-8", newline="") as f:
+        records = list(csv.reader(f))
+    if len(records) <= 1:
         return []
-    # skip header
-    for line in lines[1:]:
-        # split only first 3 commas, as data may contain commas inside quotes
-        parts = []
-        cur = ""
-        in_quotes = False
-        i = 0
-        while i < len(line):
-            ch = line[i]
-            if ch == '"' and (i == 0 or line[i-1] != "\\"):
-                in_quotes = not in_quotes
-                cur += ch
-            elif ch == "," and not in_quotes and len(parts) < 3:
-                parts.append(cur)
-                cur = ""
-            else:
-                cur += ch
-            i += 1
-        # append remainder
-        if cur:
-            parts.append(cur)
-        # strip newline and quotes from data column
-        if len(parts) >= 4:
-            ts = parts[0].strip()
-            cid = parts[1].strip()
-            action = parts[2].strip()
-            data = parts[3].strip()
-            # remove surrounding quotes if present
-            if data.startswith('"') and data.endswith('"'):
-                data = data[1:-1].replace('""', '"')
-            rows.append({"ts": ts, "customer_id": cid, "action": action, "data": data})
+    # a file not upgraded to AUDIT_HEADER yet: its writers left data unquoted,
+    # so any extra fields are commas inside data
+    legacy = len(records[0]) < len(AUDIT_HEADER.split(","))
+    rows = []
+    for parts in records[1:]:
+        if len(parts) < 4:
+            continue
+        ts, cid, action = (p.strip() for p in parts[:3])
+        if legacy:
+            data, correlation_id = ",".join(parts[3:]), ""
+        else:
+            data, correlation_id = parts[3], (parts[4].strip() if len(parts) > 4 else "")
+        rows.append({"ts": ts, "customer_id": cid, "action": action, "data": data.strip(),
+                     "correlation_id": correlation_id})
     return rows
 
 @app.get("/audit")
@@ -1184,7 +1907,8 @@ def get_audit(limit: int = Query(50, ge=1, le=1000), action: Optional[str] = Non
             elif "reject" in la:
                 decision_counts["REJECT"] += 1
 
-    return {"count": len(rows), "summary_by_action": counts, "decision_counts": decision_counts, "rows": limited}
+    return FastJSONResponse({"count": len(rows), "summary_by_action": counts, "decision_counts": decision_counts,
+                             "rows": limited})
 
 @app.get("/audit/download")
 def download_audit():
@@ -1193,4 +1917,6 @@ def download_audit():
     """
     if not os.path.exists(AUDIT_FILE):
         return JSONResponse(status_code=404, content={"error":"no audit file yet"})
+    # a file from before a schema change is upgraded to AUDIT_HEADER first
+    append_lines(AUDIT_FILE, [], header=AUDIT_HEADER)
     return FileResponse(AUDIT_FILE, media_type="text/csv", filename=os.path.basename(AUDIT_FILE))
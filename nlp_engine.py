@@ -0,0 +1,233 @@
+# backend/nlp_engine.py
+"""
+Single-pass field extraction for chat messages.
+
+The message is normalized once (currency symbols dropped, thousands
+separators removed, space-grouped digits joined) and tokenized once with one precompiled pattern into
+number / customer-id / word tokens. Every field is then read off the token
+list using nearby keywords, so nlp_apply and extract_fields_from_text_local
+share the same unit handling:
+
+    4 lakh / 4lakhs / 2.5L / 4 lac   -> x 100000
+    1 crore / 1cr                    -> x 10000000
+    50k / 50 thousand                -> x 1000
+    ₹4,00,000 / Rs. 400000           -> 400000
+    4 00 000 / 400 000               -> 400000
+    3 years / 3yrs / 1.5 yr          -> months (x 12)
+    18 months / 18 mos / 18m         -> months
+
+extract_fields(text) returns customer_id, loan_amount, tenure_months,
+income_monthly, existing_monthly_debt (0.0 when absent) and purpose. A
+bare number below MIN_LOAN_AMOUNT (no lakh / k / crore unit) is never taken
+as the loan amount ("need 3 for home").
+"""
+import os
+import re
+import json
+
+from fuzzy_index import TrigramIndex, normalize
+
+_CURRENCY = re.compile(r"₹|\brs\b\.?|\binr\b", re.IGNORECASE)
+_THOUSANDS_SEP = re.compile(r"(?<=\d),(?=\d)")
+# "4 00 000" (Indian grouping) / "400 000": leading 1-3 digits, 2- or 3-digit groups, last group of 3
+_SPACE_GROUPED = re.compile(r"(?<![\d.])\d{1,3}(?: \d{2}| \d{3})* \d{3}(?![\d.])")
+_TOKEN = re.compile(
+    r"(?P<num>\d+(?:\.\d+)?)\s*"
+    r"(?P<unit>lakhs?|lacs?|l|crores?|cr|k|thousand|years?|yrs?|y|months?|mos?|m)?\b"
+    r"|(?P<cid>cust[_-]?\d+)\b"
+    r"|(?P<word>[a-z][a-z0-9_\-]*)",
+    re.IGNORECASE,
+)
+
+MONEY_UNITS = {
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5, "l": 1e5,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "k": 1e3, "thousand": 1e3,
+}
+TENURE_UNITS = {
+    "year": 12, "years": 12, "yr": 12, "yrs": 12, "y": 12,
+    "month": 1, "months": 1, "mo": 1, "mos": 1, "m": 1,
+}
+
+LOAN_WORDS = {"loan", "want", "need", "borrow", "apply", "amount", "require", "looking"}
+INCOME_WORDS = {"salary", "income", "earn", "earns", "earning", "earnings", "ctc", "take-home"}
+DEBT_WORDS = {"emi", "emis", "debt", "debts", "payment", "payments", "obligation", "obligations"}
+TENURE_WORDS = {"tenure", "term", "period"}
+MONTHLY_WORDS = {"monthly", "pm", "permonth"}
+ID_WORDS = {"id", "customerid", "customer_id", "cust_id"}
+
+PURPOSES = {
+    "wedding": "wedding", "marriage": "marriage", "medical": "medical", "hospital": "medical",
+    "education": "education", "studies": "education", "college": "education",
+    "business": "business", "home": "home", "house": "home", "renovation": "home",
+    "car": "car", "vehicle": "car", "bike": "car", "travel": "travel", "vacation": "travel",
+}
+
+# hesitation / affordability phrases (nlp_apply offers lower EMI options)
+HESITATION_PHRASES = ["too high", "too expensive", "expensive", "can't afford", "cant afford",
+                      "costly", "not affordable", "emi is high", "out of budget"]
+
+# Intent phrases of two or more words only match exactly: one letter turns "can afford"
+# into "cant afford" and "most affordable" into "not affordable". Typos are only
+# forgiven in single words of at least INTENT_FUZZY_MIN_LEN characters, at a stricter
+# score than purposes, and never for real words that sit that close to a phrase.
+INTENT_FUZZY_MIN_LEN = 6
+INTENT_FUZZY_MIN_SCORE = 0.7
+INTENT_LOOKALIKES = {"extensive", "expansive", "pensive", "mostly"}
+
+MIN_LOAN_AMOUNT = 1000.0
+
+# how far (in tokens) a keyword may sit from the number it describes
+_BACK_WINDOW = 4
+_FWD_WINDOW = 2
+
+
+def build_phrase_index(extra_vocab_file: str | None = None) -> TrigramIndex:
+    """
+    Trigram index over purpose words ("purpose:<name>") and intent phrases
+    ("intent:<name>"). NLP_VOCAB_FILE may point to JSON {label: [phrases]} to extend it.
+    """
+    idx = TrigramIndex()
+    for word, purpose in PURPOSES.items():
+        idx.add(word, f"purpose:{purpose}")
+    idx.add_many(HESITATION_PHRASES, "intent:hesitation")
+    if extra_vocab_file and os.path.exists(extra_vocab_file):
+        with open(extra_vocab_file, "r", encoding="utf-8") as f:
+            for label, phrases in json.load(f).items():
+                idx.add_many(phrases, label)
+    return idx
+
+
+PHRASE_INDEX = build_phrase_index(os.environ.get("NLP_VOCAB_FILE"))
+
+
+def detect_intent(text: str) -> str | None:
+    """Intent ("hesitation", ...) or None: exact phrases first, then typos of single long words."""
+    hit = PHRASE_INDEX.exact(text, prefix="intent:")
+    if hit is None:
+        for word in normalize(text).split():
+            if len(word) >= INTENT_FUZZY_MIN_LEN and word not in INTENT_LOOKALIKES:
+                hit = PHRASE_INDEX.best(word, prefix="intent:", min_score=INTENT_FUZZY_MIN_SCORE)
+                if hit:
+                    break
+    return hit[1].split(":", 1)[1] if hit else None
+
+
+def _tokenize(text: str) -> list:
+    """[(kind, text, unit)] with kind in {"num", "cid", "word"}; words are lower-cased."""
+    out = []
+    for m in _TOKEN.finditer(text):
+        if m.group("num") is not None:
+            unit = m.group("unit")
+            out.append(("num", m.group("num"), unit.lower() if unit else None))
+        elif m.group("cid") is not None:
+            out.append(("cid", m.group("cid"), None))
+        else:
+            out.append(("word", m.group("word").lower(), m.group("word")))
+    return out
+
+
+def _role(tokens: list, i: int) -> str | None:
+    """Classify number i by the closest keyword: back first, then forward."""
+    for j in range(i - 1, max(-1, i - 1 - _BACK_WINDOW), -1):
+        kind, w, _ = tokens[j]
+        if kind != "word":
+            break  # don't look past another number/id
+        if w in INCOME_WORDS:
+            return "income"
+        if w in DEBT_WORDS:
+            return "debt"
+        if w in TENURE_WORDS:
+            return "tenure"
+        if w in LOAN_WORDS:
+            return "amount"
+    for j in range(i + 1, min(len(tokens), i + 1 + _FWD_WINDOW)):
+        kind, w, _ = tokens[j]
+        if kind != "word":
+            break
+        if w == "loan":
+            return "amount"
+        if w in INCOME_WORDS or w in MONTHLY_WORDS or (w == "per" and j + 1 < len(tokens) and tokens[j + 1][1] == "month"):
+            return "income"
+        if w in DEBT_WORDS:
+            return "debt"
+    return None
+
+
+def extract_fields(text: str) -> dict:
+    """Parse one message; missing fields are None (existing_monthly_debt defaults to 0.0)."""
+    s = _THOUSANDS_SEP.sub("", _CURRENCY.sub(" ", text or ""))
+    s = _SPACE_GROUPED.sub(lambda m: m.group(0).replace(" ", ""), s)
+    tokens = _tokenize(s)
+    res = {
+        "customer_id": None,
+        "loan_amount": None,
+        "tenure_months": None,
+        "income_monthly": None,
+        "existing_monthly_debt": 0.0,
+        "purpose": None,
+    }
+    fallback_amount = None
+    debt_seen = False
+
+    for i, (kind, tok, unit) in enumerate(tokens):
+        if kind == "cid":
+            if res["customer_id"] is None:
+                res["customer_id"] = tok.upper().replace("-", "_")
+            continue
+        if kind == "word":
+            if res["purpose"] is None and tok in PURPOSES:
+                res["purpose"] = PURPOSES[tok]
+            # "customer id: X" / "id X"
+            if tok in ID_WORDS and res["customer_id"] is None and i + 1 < len(tokens):
+                nkind, ntok, nraw = tokens[i + 1]
+                if nkind == "cid":
+                    continue
+                if nkind == "word" and any(ch.isdigit() for ch in ntok):
+                    res["customer_id"] = nraw
+                elif nkind == "num" and nraw is None:
+                    res["customer_id"] = ntok
+            continue
+
+        # numbers
+        if i > 0 and tokens[i - 1][0] == "word" and tokens[i - 1][1] in ID_WORDS:
+            continue  # already taken as a customer id
+        val = float(tok)
+        if unit in TENURE_UNITS:
+            if res["tenure_months"] is None:
+                res["tenure_months"] = int(round(val * TENURE_UNITS[unit]))
+            continue
+        if unit is None and len(tok.split(".")[0]) >= 10:
+            continue  # phone / Aadhaar style numbers are never amounts
+        val *= MONEY_UNITS.get(unit, 1.0)
+        role = _role(tokens, i)
+        if role == "tenure":
+            if res["tenure_months"] is None and val < 1000:
+                res["tenure_months"] = int(val)
+        elif role == "income":
+            if res["income_monthly"] is None:
+                res["income_monthly"] = val
+        elif role == "debt":
+            if not debt_seen:
+                res["existing_monthly_debt"] = val
+                debt_seen = True
+        elif role == "amount":
+            if res["loan_amount"] is None and (unit in MONEY_UNITS or val >= MIN_LOAN_AMOUNT):
+                res["loan_amount"] = val
+        elif fallback_amount is None and (unit in MONEY_UNITS or val >= MIN_LOAN_AMOUNT):
+            fallback_amount = val
+
+    if res["loan_amount"] is None:
+        res["loan_amount"] = fallback_amount
+    if res["purpose"] is None:
+        # typo-tolerant second chance ("weding", "educaton") over the words not used as keywords
+        words = " ".join(t[1] for t in tokens if t[0] == "word" and len(t[1]) >= PHRASE_INDEX.min_fuzzy_len)
+        hit = PHRASE_INDEX.best(words, prefix="purpose:") if words else None
+        if hit:
+            res["purpose"] = hit[1].split(":", 1)[1]
+    return res
+
+
+def parse_batch(messages: list) -> list:
+    """extract_fields over a chunk of messages (one task per chunk in a process pool)."""
+    return [extract_fields(m) for m in messages]
@@ -0,0 +1,141 @@
+# backend/pdf_jobs.py
+"""
+Background sanction-letter rendering.
+
+PdfJobQueue runs a render function in a bounded process pool, so ReportLab
+work no longer holds a request thread. The output filename is chosen up
+front, so the caller can hand out the /pdf/... URL immediately. Marker files
+next to the PDF (<name>.pending / <name>.failed) record the job state on
+disk, so every uvicorn worker can answer /pdf/{name} with "not ready yet",
+not only the process that queued the job. A failure (or a .pending marker
+left STALE_PENDING_SECONDS by a dead or cancelled job) only sticks until the
+same name is submitted again: submit clears the .failed marker and a finished
+PDF on disk counts as ready whatever the markers say. Finished job records are
+kept for keep_seconds (for /pdf/job/{id}) and then dropped.
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+PENDING_SUFFIX = ".pending"
+FAILED_SUFFIX = ".failed"
+STALE_PENDING_SECONDS = 300  # a .pending marker older than this is treated as failed
+
+
+class QueueFull(Exception):
+    """All pool slots and queue slots are taken."""
+
+
+class PdfJobQueue:
+    def __init__(self, pdf_dir: str, max_workers: int = 2, max_pending: int = 64, locate=None,
+                 keep_seconds: float = 3600.0):
+        self.pdf_dir = pdf_dir
+        self._locate = locate or (lambda name: os.path.join(pdf_dir, os.path.basename(name)))
+        self.max_workers = max_workers
+        self.keep_seconds = keep_seconds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._jobs = {}  # job_id -> status dict
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _marker(self, filename: str, suffix: str) -> str:
+        return os.path.join(self.pdf_dir, os.path.basename(filename) + suffix)
+
+    def submit(self, fn, decision: dict, filename: str, on_done=None, on_error=None) -> str:
+        """
+        Queue fn(decision, filename) and return a job id.
+        on_done(job) / on_error(job, exc) run in the parent process when the job finishes.
+        Raises QueueFull when max_pending jobs are already queued.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{len(self._jobs)} sanction letters already queued")
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "filename": filename, "status": "pending",
+               "submitted": time.time(), "finished": None, "error": None}
+        with open(self._marker(filename, PENDING_SUFFIX), "w", encoding="utf-8") as f:
+            f.write(job_id)
+        self._unlink(self._marker(filename, FAILED_SUFFIX))  # a retry of an earlier failure
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = job
+        try:
+            future = self._get_pool().submit(fn, decision, filename)
+        except Exception:
+            self._finish(job, error="could not submit job")
+            raise
+
+        def done(fut):
+            # exception() would raise CancelledError for a job cancelled by shutdown
+            exc = RuntimeError("render cancelled") if fut.cancelled() else fut.exception()
+            self._finish(job, error=str(exc) if exc else None)
+            try:
+                if exc is None and on_done is not None:
+                    on_done(job)
+                elif exc is not None and on_error is not None:
+                    on_error(job, exc)
+            except Exception:
+                pass
+
+        future.add_done_callback(done)
+        return job_id
+
+    def _finish(self, job: dict, error: str | None):
+        job["finished"] = time.time()
+        job["status"] = "failed" if error else "ready"
+        job["error"] = error
+        if error:
+            with open(self._marker(job["filename"], FAILED_SUFFIX), "w", encoding="utf-8") as f:
+                f.write(error[:2000])
+        else:
+            self._unlink(self._marker(job["filename"], FAILED_SUFFIX))
+        self._unlink(self._marker(job["filename"], PENDING_SUFFIX))
+        self._slots.release()
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _prune(self):
+        """Drop finished jobs older than keep_seconds (caller holds _lock)."""
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [j["job_id"] for j in self._jobs.values() if j["finished"] and j["finished"] < cutoff]:
+            del self._jobs[job_id]
+
+    def job(self, job_id: str) -> dict | None:
+        return self._jobs.get(job_id)
+
+    def file_state(self, filename: str) -> str:
+        """
+        "ready" | "pending" | "failed" | "missing" for a PDF name (works across processes).
+        "failed" (including a stale .pending) is not final: submitting the name again retries it.
+        """
+        pending = self._marker(filename, PENDING_SUFFIX)
+        stale = False
+        try:
+            stale = time.time() - os.path.getmtime(pending) > STALE_PENDING_SECONDS
+            if not stale:
+                return "pending"
+        except OSError:
+            pass
+        if os.path.exists(self._locate(filename)):
+            return "ready"
+        if stale or os.path.exists(self._marker(filename, FAILED_SUFFIX)):
+            return "failed"
+        return "missing"
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,105 @@
+# backend/pdf_store.py
+"""
+Content-addressed sanction letter store.
+
+A letter's address is the sha256 of its content: the layout version plus the
+canonical variable fields (customer, loan, EMI, decision, reasons). The issue
+timestamp is left out, so re-approving an identical decision resolves to the
+letter that already exists and nothing is rendered again. Files live in a
+sharded tree and each customer has an append-only index of their letters:
+
+    pdfs/objects/3f/a2/3fa2....pdf
+    pdfs/index/CUST_123.jsonl          {"ts", "digest", "filename", ...} per letter
+
+record() checks and appends under the index file's flock (file_append.locked),
+so workers rendering the same letter add it to the index only once.
+
+Public names stay /pdf/sanction_<customer>_<digest>.pdf. Older timestamped
+files in pdfs/ are still resolved by name.
+"""
+import os
+import re
+import json
+import hashlib
+import datetime
+import threading
+
+from file_append import locked, write_all
+from sanction_letter import LAYOUT_VERSION, letter_fields
+
+_NAME = re.compile(r"^sanction_(?P<cust>.+)_(?P<digest>[0-9a-f]{64})\.pdf$")
+_UNSAFE = re.compile(r"[^A-Za-z0-9_\-]")
+
+
+def letter_digest(decision_result: dict) -> str:
+    fields = letter_fields(decision_result)
+    canon = json.dumps({"layout": LAYOUT_VERSION, **fields}, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+
+def parse_name(filename: str) -> tuple:
+    """(customer part, digest) of a content-addressed name, or (None, None) for legacy names."""
+    m = _NAME.match(os.path.basename(filename))
+    return (m.group("cust"), m.group("digest")) if m else (None, None)
+
+
+class PdfStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.index_dir = os.path.join(root, "index")
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], digest[2:4], f"{digest}.pdf")
+
+    def plan(self, decision_result: dict) -> tuple:
+        """(filename, digest, already stored) for a decision, before rendering."""
+        digest = letter_digest(decision_result)
+        cust = str(letter_fields(decision_result)["customer_id"])
+        filename = f"sanction_{_UNSAFE.sub('_', cust)}_{digest}.pdf"
+        return filename, digest, os.path.exists(self.object_path(digest))
+
+    def path_for(self, filename: str) -> str:
+        """Where the named letter lives (sharded object, or a legacy flat file)."""
+        _cust, digest = parse_name(filename)
+        if digest:
+            return self.object_path(digest)
+        return os.path.join(self.root, os.path.basename(filename))
+
+    def put(self, digest: str, data: bytes) -> str:
+        """Write bytes under their address (atomic rename; a no-op if already stored)."""
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def record(self, customer_id: str, digest: str, filename: str, decision_result: dict):
+        """Add a letter to the customer's index (once per digest)."""
+        path = os.path.join(self.index_dir, f"{_UNSAFE.sub('_', str(customer_id))}.jsonl")
+        with locked(path) as fd:
+            if any(e["digest"] == digest for e in self.letters(customer_id)):
+                return
+            entry = {
+                "ts": datetime.datetime.utcnow().isoformat(),
+                "digest": digest,
+                "filename": filename,
+                "decision": decision_result.get("decision"),
+                "loan_amount": (decision_result.get("loan_request") or {}).get("loan_amount"),
+                "emi": decision_result.get("emi"),
+            }
+            write_all(fd, json.dumps(entry, default=str) + "\n")
+
+    def letters(self, customer_id: str) -> list:
+        """Index entries for a customer, oldest first."""
+        path = os.path.join(self.index_dir, f"{_UNSAFE.sub('_', str(customer_id))}.jsonl")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(ln) for ln in f if ln.strip()]
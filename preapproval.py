@@ -0,0 +1,159 @@
+# backend/preapproval.py
+"""
+Pre-approved limits and offer tiers for the CRM.
+
+The batch job computes every applicant in one vectorized pass and writes a
+small side table (PREAPPROVED_FILE) keyed by customer id. get_crm joins it
+through load_preapproved(), which keeps an in-memory dict and only re-reads
+the file when its mtime changes. /crm/update calls recompute_customers() so
+only the touched customers are recomputed.
+
+Run the full batch:
+    python preapproval.py [--data path/to/applicants.csv] [--out preapproved.csv]
+"""
+import os
+import datetime
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+PREAPPROVED_FILE = os.path.join(os.path.dirname(__file__), "preapproved.csv")
+
+COLUMNS = ["customer_id", "pre_approved_limit", "offer_tier", "offer_rate", "offer_tenure_months", "computed_at"]
+
+# tier table: (min credit score, tier, annual rate %, tenure months, max share of income for all EMIs)
+OFFER_TIERS = [
+    (750, "PLATINUM", 11.5, 60, 0.50),
+    (700, "GOLD", 12.0, 48, 0.45),
+    (650, "SILVER", 13.0, 36, 0.40),
+]
+MAX_LIMIT = 2500000.0
+ROUND_TO = 1000.0
+
+
+def _num(df: pd.DataFrame, col: str) -> pd.Series:
+    """Numeric view of a (string) CSV column; missing column / bad values -> NaN."""
+    if col not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[col].astype(str).str.replace(",", "", regex=False).str.strip(), errors="coerce")
+
+
+def compute_preapproved(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute pre-approved limit and offer tier for every row of the applicants frame.
+    Uses the same credit fallback as get_credit (income based synthetic score).
+    Returns a frame with COLUMNS.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    ids = df["crm_customer_id"] if "crm_customer_id" in df.columns else df.iloc[:, 0]
+    if "id" in df.columns:
+        ids = ids.where(ids.notna() & (ids.astype(str).str.strip() != ""), df["id"])
+
+    income = _num(df, "income_monthly")
+    emis = _num(df, "existing_emis").fillna(0.0).clip(lower=0)
+    score = _num(df, "credit_score")
+    # same fallback as get_credit: 40 points per 1000 of income, bounded to [300, 900]
+    synthetic = ((income.fillna(30000.0) / 1000.0) * 40).clip(300, 900).astype(int)
+    score = score.fillna(synthetic)
+    income = income.fillna(0.0).clip(lower=0)
+
+    conds = [score >= t[0] for t in OFFER_TIERS]
+    tier = np.select(conds, [t[1] for t in OFFER_TIERS], default="NONE")
+    rate = np.select(conds, [t[2] for t in OFFER_TIERS], default=0.0)
+    tenure = np.select(conds, [t[3] for t in OFFER_TIERS], default=0)
+    foir = np.select(conds, [t[4] for t in OFFER_TIERS], default=0.0)
+
+    # EMI headroom -> principal via the annuity factor (1 - (1+r)^-n) / r
+    headroom = np.maximum(income.to_numpy() * foir - emis.to_numpy(), 0.0)
+    r = rate / 12.0 / 100.0
+    n = tenure.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(r > 0, (1 - (1 + r) ** -n) / np.where(r > 0, r, 1.0), n)
+    limit = np.minimum(headroom * factor, MAX_LIMIT)
+    limit = np.floor(limit / ROUND_TO) * ROUND_TO
+    tier = np.where(limit > 0, tier, "NONE")
+
+    return pd.DataFrame({
+        "customer_id": ids.astype(str).to_numpy(),
+        "pre_approved_limit": limit.astype(int),
+        "offer_tier": tier,
+        "offer_rate": np.where(limit > 0, rate, 0.0),
+        "offer_tenure_months": np.where(limit > 0, tenure, 0),
+        "computed_at": datetime.datetime.utcnow().isoformat(),
+    }, columns=COLUMNS)
+
+
+def _write_table(table: pd.DataFrame, out_path: str):
+    # write to a temp file and swap in, so readers never see a half-written table
+    tmp = out_path + ".tmp"
+    table.to_csv(tmp, index=False)
+    os.replace(tmp, out_path)
+
+
+def run_batch(data_csv: str, out_path: str = PREAPPROVED_FILE) -> int:
+    """Recompute the whole side table from the applicants CSV. Returns row count."""
+    if not os.path.exists(data_csv):
+        raise FileNotFoundError(data_csv)
+    df = pd.read_csv(data_csv, dtype=str)
+    table = compute_preapproved(df)
+    _write_table(table, out_path)
+    return len(table)
+
+
+def recompute_customers(df: pd.DataFrame, out_path: str = PREAPPROVED_FILE) -> int:
+    """
+    Incremental recompute: df holds only the touched applicant rows.
+    Their entries are replaced in the side table; everything else is kept.
+    """
+    fresh = compute_preapproved(df)
+    if fresh.empty:
+        return 0
+    with _lock:
+        if os.path.exists(out_path):
+            table = pd.read_csv(out_path, dtype=str)
+            table = table[~table["customer_id"].isin(fresh["customer_id"])]
+            table = pd.concat([table, fresh.astype(str)], ignore_index=True)
+        else:
+            table = fresh
+        _write_table(table, out_path)
+    return len(fresh)
+
+
+# --- in-memory side table (reloaded when the file changes) ---
+_lock = threading.Lock()
+_cache = {"mtime": None, "rows": {}}
+
+
+def load_preapproved(path: str = PREAPPROVED_FILE) -> dict:
+    """Return {customer_id: offer dict}; cheap when the file is unchanged."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    if _cache["mtime"] == mtime:
+        return _cache["rows"]
+    with _lock:
+        if _cache["mtime"] != mtime:
+            table = pd.read_csv(path, dtype=str).fillna("")
+            _cache["rows"] = {r["customer_id"]: r for r in table.to_dict(orient="records")}
+            _cache["mtime"] = mtime
+    return _cache["rows"]
+
+
+def get_offer(customer_id: str, path: str = PREAPPROVED_FILE) -> dict | None:
+    """O(1) lookup of one customer's offer row (None if not computed)."""
+    return load_preapproved(path).get(str(customer_id))
+
+
+if __name__ == "__main__":
+    default_data = os.path.join(os.path.dirname(__file__), "..", "data", "applicants.csv")
+    ap = argparse.ArgumentParser(description="Compute pre-approved limits for every applicant.")
+    ap.add_argument("--data", default=default_data, help="applicants CSV")
+    ap.add_argument("--out", default=PREAPPROVED_FILE, help="side table to write")
+    args = ap.parse_args()
+    n = run_batch(args.data, args.out)
+    print(f"wrote {n} pre-approved offers to {args.out}")
@@ -0,0 +1,310 @@
+# backend/profiling.py
+"""
+On-demand profiling of slow requests.
+
+Profiler             a wall-clock stack sampler. While profiling is on and a
+                     request is in flight, a daemon thread records the Python
+                     stack of every thread working for a request each
+                     interval_ms: threads whose stack holds a route endpoint
+                     (async endpoints on the event loop, sync ones in the
+                     threadpool) and threads running work handed off with
+                     bind() (run_blocking in main.py). Being wall-clock, it
+                     also shows where a request waits: bureau calls, locks,
+                     sleeps.
+ProfilingMiddleware  pure ASGI. Times each request and, when it took at least
+                     slow_ms or falls in the sampled fraction, writes the
+                     samples taken during it to
+                     <out_dir>/<route>.<correlation_id>.<seq>.json: metadata, the
+                     hottest functions (self and inclusive) and the stacks in
+                     folded format (one "frame;frame;frame count" line per
+                     stack, for flamegraph.pl / speedscope). Only the newest max_files
+                     profiles are kept. Profiles are named after the id
+                     returned by id_source (main.py passes
+                     correlation.current_id, the X-Correlation-ID already
+                     echoed in the response), or a fresh one without it. One
+                     correlation id covers every call of a user action, so a
+                     short random seq tells its requests apart.
+
+Settings (enabled, sample, slow_ms) start from the constructor. configure()
+stores changes in <out_dir>/control.json, which every worker re-reads within
+a second, so an admin endpoint can turn profiling on and off without a restart.
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import datetime
+import threading
+import contextvars
+from collections import Counter, deque
+
+_request_id = contextvars.ContextVar("profiling_request_id", default=None)
+_TOKEN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_PROFILE_NAME = re.compile(r"^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+(?:\.[0-9a-f]+)?\.json$")  # seq-less: older profiles
+SETTINGS = ("enabled", "sample", "slow_ms")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, out_dir: str, enabled: bool = False, sample: float = 0.0, slow_ms: float = 1000.0,
+                 interval_ms: float = 10.0, max_files: int = 200, max_samples: int = 200000,
+                 exempt: set = frozenset(), id_source=None):
+        self.out_dir = out_dir
+        self.id_source = id_source
+        self.control_file = os.path.join(out_dir, "control.json")
+        self.settings = {"enabled": bool(enabled), "sample": float(sample), "slow_ms": float(slow_ms)}
+        self.interval = interval_ms / 1000.0
+        self.max_files = max_files
+        self.exempt = exempt
+        self._samples = deque(maxlen=max_samples)  # (t, thread id, bound request id, stack of code objects)
+        self._tags = {}                            # thread id -> request id, while running bind()ed work
+        self._codes = frozenset()                  # endpoint code objects
+        self._n_routes = -1
+        self._inflight = 0
+        self._active = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._control_checked = 0.0
+        self._control_mtime = None
+        self.requests = 0
+        self.captured = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    # --- settings shared by every worker ---
+    def configure(self, **changes) -> dict:
+        """Update enabled / sample / slow_ms for all workers (None leaves a setting as it is)."""
+        self._refresh(force=True)
+        settings = dict(self.settings)
+        for k in SETTINGS:
+            if changes.get(k) is not None:
+                settings[k] = bool(changes[k]) if k == "enabled" else float(changes[k])
+        tmp = f"{self.control_file}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+        os.replace(tmp, self.control_file)
+        self.settings = settings
+        return settings
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._control_checked < 1.0:
+            return
+        self._control_checked = now
+        try:
+            mtime = os.stat(self.control_file).st_mtime_ns
+            if mtime == self._control_mtime:
+                return
+            with open(self.control_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._control_mtime = mtime
+        self.settings = {**self.settings, **{k: data[k] for k in SETTINGS if k in data}}
+
+    # --- sampling ---
+    def bind(self, fn):
+        """fn wrapped so that, run on another thread, its stacks count for the current request."""
+        rid = _request_id.get()
+        if rid is None:
+            return fn
+
+        def bound():
+            tid = threading.get_ident()
+            prev = self._tags.get(tid)
+            self._tags[tid] = rid
+            try:
+                return fn()
+            finally:
+                if prev is None:
+                    self._tags.pop(tid, None)
+                else:
+                    self._tags[tid] = prev
+        return bound
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        last = {}  # thread id -> (top frame, f_lasti, stack, holds an endpoint) from the previous tick
+        while True:
+            self._active.wait()
+            now = time.monotonic()
+            codes, tags = self._codes, self._tags
+            seen = {}
+            for tid, top in sys._current_frames().items():
+                if tid == me:
+                    continue
+                prev = last.get(tid)
+                if prev is not None and prev[0] is top and prev[1] == top.f_lasti:
+                    # still at the same instruction of the same frame (idle pool threads): same stack
+                    stack, in_endpoint = prev[2], prev[3]
+                else:
+                    stack, frame = [], top
+                    while frame is not None:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    stack = tuple(stack)
+                    in_endpoint = not codes.isdisjoint(stack)
+                seen[tid] = (top, top.f_lasti, stack, in_endpoint)
+                if in_endpoint or tid in tags:
+                    self._samples.append((now, tid, tags.get(tid), stack))
+            last = seen
+            time.sleep(self.interval)
+
+    def _load_routes(self, scope):
+        routes = getattr(scope.get("app"), "routes", None) or []
+        if len(routes) != self._n_routes:
+            self._codes = frozenset(r.endpoint.__code__ for r in routes if hasattr(getattr(r, "endpoint", None), "__code__"))
+            self._n_routes = len(routes)
+
+    # --- per request ---
+    async def handle(self, app, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await app(scope, receive, send)
+        self._refresh()
+        if not self.settings["enabled"]:
+            return await app(scope, receive, send)
+
+        self._load_routes(scope)
+        cid = self.id_source() if self.id_source is not None else ""
+        cid = cid if _TOKEN.match(cid) else uuid.uuid4().hex
+        rid = f"{cid}.{uuid.uuid4().hex[:8]}"  # this request's samples and profile file
+        status = 0
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        if self._thread is None:
+            self._start_sampler()
+        with self._lock:
+            self._inflight += 1
+            self._active.set()
+        token = _request_id.set(rid)
+        t0 = time.monotonic()
+        try:
+            await app(scope, receive, send_wrapper)
+        finally:
+            t1 = time.monotonic()
+            _request_id.reset(token)
+            with self._lock:
+                self._inflight -= 1
+                if not self._inflight:
+                    self._active.clear()
+            self.requests += 1
+            slow_ms, sample = self.settings["slow_ms"], self.settings["sample"]
+            reason = ("slow" if slow_ms and (t1 - t0) * 1000 >= slow_ms
+                      else "sampled" if sample and random.random() < sample else None)
+            if reason:
+                # after the response went out; the sample scan and the write stay off the event loop
+                await asyncio.to_thread(self._capture, scope, cid, rid, status, t0, t1, reason)
+
+    def _capture(self, scope, cid: str, rid: str, status: int, t0: float, t1: float, reason: str):
+        endpoint = getattr(scope.get("endpoint"), "__code__", None)
+        stacks = [s[3] for s in list(self._samples)
+                  if t0 <= s[0] <= t1 and (s[2] == rid or (s[2] is None and endpoint is not None and endpoint in s[3]))]
+        folded, inclusive, own = Counter(), Counter(), Counter()
+        for stack in stacks:
+            labels = [_frame_label(c) for c in reversed(stack)]
+            folded[";".join(labels)] += 1
+            inclusive.update(set(labels))
+            own[labels[-1]] += 1
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        profile = {
+            "correlation_id": cid,
+            "route": route,
+            "method": scope.get("method"),
+            "path": scope["path"],
+            "status": status,
+            "reason": reason,
+            "ts": datetime.datetime.utcnow().isoformat(),
+            "pid": os.getpid(),
+            "duration_ms": round((t1 - t0) * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": len(stacks),
+            # where the time went (top of stack) and what it was spent under (anywhere on the stack)
+            "top_self": [{"function": f, "samples": n} for f, n in own.most_common(20)],
+            "top_inclusive": [{"function": f, "samples": n} for f, n in inclusive.most_common(30)],
+            "folded": [f"{stack} {n}" for stack, n in folded.most_common()],
+        }
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(self.out_dir, f"{slug}.{rid}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+        os.replace(tmp, path)
+        self.captured += 1
+        self._prune()
+
+    def _prune(self):
+        files = []
+        for name in os.listdir(self.out_dir):
+            if _PROFILE_NAME.match(name):
+                try:
+                    files.append((os.stat(os.path.join(self.out_dir, name)).st_mtime_ns, name))
+                except OSError:
+                    pass
+        files.sort()
+        for _, name in files[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.out_dir, name))
+            except OSError:
+                pass
+
+    # --- viewing ---
+    def list_profiles(self, route: str | None = None, limit: int = 50, correlation_id: str | None = None) -> list:
+        """Newest first: name, route slug, correlation id, size and time of each stored profile."""
+        out = []
+        for name in os.listdir(self.out_dir):
+            if not _PROFILE_NAME.match(name):
+                continue
+            slug, cid = name.split(".")[:2]
+            if route and slug != re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_"):
+                continue
+            if correlation_id and cid != correlation_id:
+                continue
+            try:
+                st = os.stat(os.path.join(self.out_dir, name))
+            except OSError:
+                continue
+            out.append({"name": name, "route": slug, "correlation_id": cid, "bytes": st.st_size,
+                        "ts": datetime.datetime.utcfromtimestamp(st.st_mtime).isoformat()})
+        out.sort(key=lambda p: p["ts"], reverse=True)
+        return out[:limit]
+
+    def load_profile(self, name: str) -> dict | None:
+        if not _PROFILE_NAME.match(name):
+            return None
+        try:
+            with open(os.path.join(self.out_dir, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> dict:
+        self._refresh()
+        return {**self.settings, "interval_ms": self.interval * 1000, "max_files": self.max_files,
+                "requests_seen": self.requests, "captured": self.captured,
+                "buffered_samples": len(self._samples), "in_flight": self._inflight}
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        await self.profiler.handle(self.app, scope, receive, send)
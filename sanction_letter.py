@@ -0,0 +1,245 @@
+# backend/sanction_letter.py
+"""
+Sanction letter layout.
+
+render_canvas() draws the letter with the ReportLab canvas, redrawing every
+label and the signature block each time. SanctionTemplate produces the same
+page. The static layout (title, field labels, signature block, fonts) is
+serialized once into PDF form XObjects and kept as bytes. Each letter then
+only writes its variable text (dates, customer and loan values, reasons) into
+a small content stream that is painted over those forms. Helvetica is a
+standard PDF font, so nothing is embedded and a letter is a few string joins.
+ReportLab is imported on first use, so importing this module (main.py,
+pdf_store.py) does not load it.
+
+    tpl = get_template()
+    tpl.render(decision_result, "pdfs/sanction_CUST_1_....pdf")
+"""
+import zlib
+import datetime
+
+LAYOUT_VERSION = 1  # bump when the letter layout changes (part of the pdf_store address)
+
+# reportlab.lib.units.mm and reportlab.lib.pagesizes.A4, computed the same way
+mm = 72.0 / 2.54 * 0.1
+WIDTH, HEIGHT = 210 * mm, 297 * mm
+MARGIN = 20 * mm
+LINE_STEP = 7 * mm
+PAGE_BOTTOM = MARGIN + 40  # start a new page below this y (same rule as the canvas layout)
+
+# (label, key) for the fixed rows; key None = heading / blank row
+FIELD_ROWS = [
+    ("Customer ID: ", "customer_id"),
+    ("Name: ", "name"),
+    ("Phone: ", "phone"),
+    ("Email: ", "email"),
+    ("", None),
+    ("Loan Details:", None),
+    ("  - Loan Amount: ", "loan_amount"),
+    ("  - Tenure (months): ", "tenure_months"),
+    ("  - EMI: ", "emi"),
+    ("  - Decision: ", "decision"),
+    ("", None),
+    ("Notes:", None),
+]
+
+
+def letter_fields(decision_result: dict) -> dict:
+    """Variable values of one letter, as the canvas layout formats them."""
+    crm = decision_result.get("crm") if isinstance(decision_result.get("crm"), dict) else {}
+    cust_id = str(decision_result.get("customer_id") or crm.get("customer_id") or "UNKNOWN")
+    loan = decision_result.get("loan_request", {})
+    reasons = decision_result.get("reasons") or []
+    return {
+        "customer_id": cust_id,
+        "name": crm.get("name") or "",
+        "phone": crm.get("phone") or "",
+        "email": crm.get("email") or "",
+        "loan_amount": loan.get("loan_amount"),
+        "tenure_months": loan.get("tenure_months"),
+        "emi": decision_result.get("emi"),
+        "decision": decision_result.get("decision"),
+        "reasons": [f"  - {r}" for r in reasons] if isinstance(reasons, list) else [f"  - {str(reasons)}"],
+    }
+
+
+def render_canvas(decision_result: dict, filepath: str):
+    """Full ReportLab render of one letter (filepath may also be a binary file object)."""
+    from reportlab.pdfgen import canvas
+
+    f = letter_fields(decision_result)
+    c = canvas.Canvas(filepath, pagesize=(WIDTH, HEIGHT))
+    x = MARGIN
+    y = HEIGHT - MARGIN
+
+    # Header
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(x, y, "Sanction Letter")
+    y -= 12 * mm
+
+    c.setFont("Helvetica", 10)
+    c.drawString(x, y, f"Issue Date (UTC): {datetime.datetime.utcnow().isoformat()}")
+    y -= 8 * mm
+
+    lines = [label + (str(f[key]) if key else "") for label, key in FIELD_ROWS] + f["reasons"]
+
+    # Draw lines
+    c.setFont("Helvetica", 11)
+    for ln in lines:
+        if y < PAGE_BOTTOM:
+            c.showPage()
+            y = HEIGHT - MARGIN
+            c.setFont("Helvetica", 11)
+        c.drawString(x, y, str(ln))
+        y -= LINE_STEP
+
+    # Signature block
+    if y < PAGE_BOTTOM:
+        c.showPage()
+        y = HEIGHT - MARGIN
+    y -= 10 * mm
+    c.drawString(x, y, "Authorized Signatory")
+    y -= 5 * mm
+    c.drawString(x, y, "________________________")
+
+    c.showPage()
+    c.save()
+
+
+def _pdf_text(s) -> bytes:
+    """PDF literal string in WinAnsi encoding."""
+    b = str(s).encode("cp1252", errors="replace")
+    return b"(" + b.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _num(v: float) -> bytes:
+    return (b"%.2f" % v).rstrip(b"0").rstrip(b".")
+
+
+def _text_op(font: bytes, size: int, x: float, y: float, s) -> bytes:
+    return b"BT /%s %d Tf 1 0 0 1 %s %s Tm %s Tj ET\n" % (font, size, _num(x), _num(y), _pdf_text(s))
+
+
+def _stream_obj(num: int, body: bytes, extra: bytes = b"", compress: bool = False) -> bytes:
+    if compress:
+        body = zlib.compress(body)
+        extra += b" /Filter /FlateDecode"
+    return b"%d 0 obj\n<< /Length %d%s >>\nstream\n%s\nendstream\nendobj\n" % (num, len(body), extra, body)
+
+
+class SanctionTemplate:
+    """
+    Objects 1-5 (catalog, two fonts, header form, signature form) never change,
+    so they are built once together with their byte offsets. Object 6 is the
+    page tree and 7.. are per-page (page, content) pairs.
+    """
+
+    _HEADER = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    _RESOURCES = b"/Resources << /Font << /F1 2 0 R /F2 3 0 R >> /XObject << /Head 4 0 R /Sig 5 0 R >> >>"
+
+    def __init__(self):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        x0 = MARGIN
+        top = HEIGHT - MARGIN
+        font_res = b" /Resources << /Font << /F1 2 0 R /F2 3 0 R >> >>"
+        form = b" /Type /XObject /Subtype /Form /BBox [0 0 %s %s]" % (_num(WIDTH), _num(HEIGHT))
+
+        # header form: title, issue-date label and all fixed row labels (always on page 1)
+        head = [_text_op(b"F2", 16, x0, top, "Sanction Letter")]
+        y = top - 12 * mm
+        head.append(_text_op(b"F1", 10, x0, y, "Issue Date (UTC): "))
+        self._date_pos = (x0 + stringWidth("Issue Date (UTC): ", "Helvetica", 10), y)
+        y -= 8 * mm
+        self._value_pos = {}
+        for label, key in FIELD_ROWS:
+            if label.strip():
+                head.append(_text_op(b"F1", 11, x0, y, label))
+            if key:
+                self._value_pos[key] = (x0 + stringWidth(label, "Helvetica", 11), y)
+            y -= LINE_STEP
+        self._first_free_y = y
+
+        # signature form, drawn relative to y = 0 and moved with a cm transform
+        sig = (_text_op(b"F1", 11, x0, -10 * mm, "Authorized Signatory")
+               + _text_op(b"F1", 11, x0, -15 * mm, "________________________"))
+
+        objs = [
+            b"1 0 obj\n<< /Type /Catalog /Pages 6 0 R >>\nendobj\n",
+            b"2 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>\nendobj\n",
+            b"3 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>\nendobj\n",
+            _stream_obj(4, b"".join(head), form + font_res, compress=True),
+            _stream_obj(5, sig, b" /Type /XObject /Subtype /Form /BBox [0 %s %s 0]" % (_num(-20 * mm), _num(WIDTH)) + font_res,
+                        compress=True),
+        ]
+        self._offsets = []
+        pos = len(self._HEADER)
+        for o in objs:
+            self._offsets.append(pos)
+            pos += len(o)
+        self._prefix = self._HEADER + b"".join(objs)
+
+    def render_bytes(self, decision_result: dict, issued: str | None = None) -> bytes:
+        f = letter_fields(decision_result)
+        x0 = MARGIN
+        issued = issued or datetime.datetime.utcnow().isoformat()
+
+        page = [b"/Head Do\n", _text_op(b"F1", 10, *self._date_pos, issued)]
+        for key, (vx, vy) in self._value_pos.items():
+            page.append(_text_op(b"F1", 11, vx, vy, f[key]))
+        pages = [page]
+        y = self._first_free_y
+        for ln in f["reasons"]:
+            if y < PAGE_BOTTOM:
+                page = []
+                pages.append(page)
+                y = HEIGHT - MARGIN
+            page.append(_text_op(b"F1", 11, x0, y, ln))
+            y -= LINE_STEP
+        if y < PAGE_BOTTOM:
+            page = []
+            pages.append(page)
+            y = HEIGHT - MARGIN
+        page.append(b"q 1 0 0 1 0 %s cm /Sig Do Q\n" % _num(y))
+
+        # page tree (6) then (page, content) pairs from 7
+        chunks = [self._prefix]
+        offsets = list(self._offsets)
+        pos = len(self._prefix)
+        kids = b" ".join(b"%d 0 R" % (7 + 2 * i) for i in range(len(pages)))
+        tree = b"6 0 obj\n<< /Type /Pages /Kids [%s] /Count %d >>\nendobj\n" % (kids, len(pages))
+        offsets.append(pos)
+        chunks.append(tree)
+        pos += len(tree)
+        media = b"/MediaBox [0 0 %s %s]" % (_num(WIDTH), _num(HEIGHT))
+        for i, ops in enumerate(pages):
+            pnum = 7 + 2 * i
+            pobj = b"%d 0 obj\n<< /Type /Page /Parent 6 0 R %s %s /Contents %d 0 R >>\nendobj\n" % (
+                pnum, media, self._RESOURCES, pnum + 1)
+            cobj = _stream_obj(pnum + 1, b"".join(ops))
+            offsets.extend([pos, pos + len(pobj)])
+            chunks.extend([pobj, cobj])
+            pos += len(pobj) + len(cobj)
+
+        n = len(offsets) + 1
+        xref = [b"xref\n0 %d\n0000000000 65535 f \n" % n]
+        xref.extend(b"%010d 00000 n \n" % off for off in offsets)
+        chunks.append(b"".join(xref))
+        chunks.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (n, pos))
+        return b"".join(chunks)
+
+    def render(self, decision_result: dict, filepath: str):
+        data = self.render_bytes(decision_result)
+        with open(filepath, "wb") as fh:
+            fh.write(data)
+
+
+_template = None
+
+
+def get_template() -> SanctionTemplate:
+    """Process-wide template, built on first use (once per pool worker)."""
+    global _template
+    if _template is None:
+        _template = SanctionTemplate()
+    return _template
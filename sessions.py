@@ -0,0 +1,103 @@
+# backend/sessions.py
+"""
+Conversation session store for nlp_apply.
+
+Each session is a small JSON-able dict (filled slots, cached CRM record,
+turn count) keyed by a client-chosen session id. Sessions live in a bounded
+in-memory LRU with a sliding TTL; set SESSION_DB=/path/sessions.sqlite to
+also persist them, so they survive restarts and are shared by workers.
+
+With SQLite, SQLite is the source of truth: get() compares the row's
+`updated` stamp with the one kept next to the in-memory copy and only
+reuses that copy if no other worker has saved the session since. The
+memory tier then only saves re-parsing the JSON. Expired rows are purged
+from save() at most once per purge_interval seconds.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from cache import LRUCache
+
+
+class SessionStore:
+    def __init__(self, ttl: float = 1800.0, maxsize: int = 10000, db_path: str | None = None,
+                 purge_interval: float = 3600.0):
+        self.ttl = ttl
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl, name="sessions")  # id -> (updated, state)
+        self.db_path = db_path
+        self.purge_interval = purge_interval
+        self._last_purge = time.time()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, session_id: str) -> dict | None:
+        """Session state, or None if unknown/expired."""
+        cached = self.memory.get(session_id)
+        if self._conn is None:
+            return cached[1] if cached is not None else None
+        # the state column is only sent when the in-memory copy is stale (another worker saved since)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT CASE WHEN updated = ? THEN NULL ELSE state END, updated FROM sessions WHERE id = ?",
+                (cached[0] if cached is not None else None, session_id),
+            ).fetchone()
+        if not row or time.time() - row[1] > self.ttl:
+            self.memory.pop(session_id)
+            return None
+        if row[0] is None:
+            return cached[1]
+        state = json.loads(row[0])
+        self.memory.set(session_id, (row[1], state))
+        return state
+
+    def save(self, session_id: str, state: dict):
+        """Store state and restart its TTL."""
+        updated = time.time()
+        self.memory.set(session_id, (updated, state))
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (id, state, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                (session_id, json.dumps(state, default=str), updated),
+            )
+            self._conn.commit()
+        if updated - self._last_purge > self.purge_interval:
+            self._last_purge = updated
+            self.purge_expired()
+
+    def delete(self, session_id: str):
+        self.memory.pop(session_id)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._conn.commit()
+
+    def purge_expired(self) -> int:
+        """Drop persisted sessions past their TTL. Returns rows removed."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+            self._conn.commit()
+        return cur.rowcount
+
+
+def store_from_env() -> SessionStore:
+    return SessionStore(
+        ttl=float(os.environ.get("SESSION_TTL", "1800")),
+        maxsize=int(os.environ.get("SESSION_MAX", "10000")),
+        db_path=os.environ.get("SESSION_DB") or None,
+        purge_interval=float(os.environ.get("SESSION_PURGE_INTERVAL", "3600")),
+    )